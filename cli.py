@@ -2,7 +2,7 @@ import argparse
 import logging
 import pathlib
 import shutil
-import tempfile
+from datetime import timedelta
 
 import ytmusicapi
 from dotenv import load_dotenv
@@ -10,9 +10,13 @@ from uuid_extensions import uuid7str
 
 from ytldl2 import crypto
 from ytldl2.cancellation_tokens import GracefulKiller
+from ytldl2.daemon import Daemon
 from ytldl2.music_library import MusicLibrary
 from ytldl2.music_library_config import MusicLibraryConfig
+from ytldl2.postprocessing_stage import PostprocessStage
+from ytldl2.proxy_pool import ProxyPool
 from ytldl2.sqlite_cache import SqliteCache
+from ytldl2.sqlite_coordinator import SqliteCoordinator
 from ytldl2.terminal.ui import TerminalUi
 
 logger = logging.getLogger()
@@ -29,12 +33,85 @@ def parse_args() -> argparse.Namespace:
         "-p", "--password", help="password for oauth data", required=True
     )
     parser.add_argument("--proxy", help="proxy:port", required=False)
+    parser.add_argument(
+        "--proxies",
+        help="path to json list of proxies, used instead of --proxy, "
+        "each download and api request picks the healthiest one",
+        required=False,
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="amount of songs, downloaded concurrently",
+        required=False,
+    )
+    parser.add_argument(
+        "-P",
+        "--processes",
+        type=int,
+        default=None,
+        help="amount of processes for ffmpeg and tagging, "
+        "by default amount of CPUs, 0 runs them in download workers",
+        required=False,
+    )
+    parser.add_argument(
+        "-l",
+        "--lookahead",
+        type=int,
+        default=4,
+        help="amount of next songs, which info is extracted in background",
+        required=False,
+    )
+    parser.add_argument(
+        "-s",
+        "--stream",
+        action="store_true",
+        default=False,
+        help="start downloading as soon as first playlist is fetched",
+        required=False,
+    )
+    parser.add_argument(
+        "--no-api-cache",
+        action="store_true",
+        default=False,
+        help="don't cache youtube music api responses",
+        required=False,
+    )
+    parser.add_argument(
+        "--coordinator",
+        help="path to sqlite db, shared by machines, which fill one library",
+        required=False,
+    )
+    parser.add_argument(
+        "--worker-only",
+        action="store_true",
+        default=False,
+        help="only download songs, submitted to coordinator by other machine",
+        required=False,
+    )
     parser.add_argument(
         "-e",
         "--endless",
         action="store_true",
         default=False,
-        help="endless mode",
+        help="endless mode: runs as daemon, which updates library periodically",
+        required=False,
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=60,
+        help="minutes between updates in endless mode",
+        required=False,
+    )
+    parser.add_argument(
+        "--check-interval",
+        type=float,
+        default=15,
+        help="minutes between checks of home page in endless mode, "
+        "if it changed, next update starts early; 0 disables checks",
         required=False,
     )
     parser.add_argument(
@@ -85,11 +162,12 @@ def main():
     dot_dir.mkdir(parents=True, exist_ok=True)
 
     config = MusicLibraryConfig.load(dot_dir / "config.json")
-    cache = SqliteCache(dot_dir / "cache.db")
+    cache = SqliteCache(dot_dir / "cache.db", write_behind=True, thread_safe=True)
 
     cancellation_token = GracefulKiller()
 
     proxy = args.proxy
+    proxy_pool = ProxyPool.load(pathlib.Path(args.proxies)) if args.proxies else None
     password = args.password
 
     salt_path = dot_dir / "salt"
@@ -104,23 +182,67 @@ def main():
 
     ui = TerminalUi()
 
-    tmp_dir = pathlib.Path(tempfile.mkdtemp(suffix=".ytldl2_"))
-    while not cancellation_token.kill_requested:
-        lib = MusicLibrary(
-            home_dir=home_dir,
-            tmp_dir=tmp_dir,
-            config=config,
-            cache=cache,
-            auth=headers,
-            proxy=proxy,
-            cancellation_token=cancellation_token,
-            ui=ui,
-        )
-        logger.info("Music library initiated.")
-
-        lib.update(each_playlist_limit=100)
+    # tmp dir is persistent, so interrupted downloads can be resumed
+    tmp_dir = dot_dir / "tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    if args.worker_only and not args.coordinator:
+        raise ValueError("--worker-only needs --coordinator")
+    coordinator = (
+        SqliteCoordinator(pathlib.Path(args.coordinator)) if args.coordinator else None
+    )
+    postprocess_stage = (
+        PostprocessStage(max_workers=args.processes) if args.processes != 0 else None
+    )
+    # library is reused by endless mode, so api pool and adapted limits persist
+    lib = MusicLibrary(
+        home_dir=home_dir,
+        tmp_dir=tmp_dir,
+        config=config,
+        cache=cache,
+        auth=headers,
+        proxy=proxy,
+        cancellation_token=cancellation_token,
+        ui=ui,
+        postprocess_stage=postprocess_stage,
+        api_cache=not args.no_api_cache,
+        coordinator=coordinator,
+        proxy_pool=proxy_pool,
+    )
+    logger.info("Music library initiated.")
+
+    def cycle():
+        if args.worker_only:
+            lib.work(workers=args.workers, lookahead=args.lookahead)
+        else:
+            lib.update(
+                each_playlist_limit=100,
+                workers=args.workers,
+                stream=args.stream,
+                lookahead=args.lookahead,
+            )
+
+    try:
         if not args.endless:
-            break
+            cycle()
+        elif args.worker_only:
+            # waiting for songs, submitted by other machine
+            Daemon(cycle, cancellation_token, interval=timedelta(seconds=60)).run()
+        else:
+            # session, api pool, headers and adapted limits are kept warm
+            Daemon(
+                cycle,
+                cancellation_token,
+                interval=timedelta(minutes=args.interval),
+                check=lib.home_changed if args.check_interval > 0 else None,
+                check_interval=timedelta(minutes=args.check_interval or 1),
+            ).run()
+    finally:
+        lib.close()
+        if postprocess_stage is not None:
+            postprocess_stage.close()
+        if coordinator is not None:
+            coordinator.close()
+        cache.close()
 
 
 if __name__ == "__main__":
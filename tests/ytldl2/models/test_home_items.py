@@ -105,3 +105,31 @@ class TestHomeItems:
         assert home_items.videos == filtered.videos
         assert home_items.playlists == filtered.playlists
         assert home_items.channels == filtered.channels
+
+    def test_fingerprint(self, home_items: HomeItems):
+        same = HomeItems(
+            videos=list(home_items.videos),
+            playlists=list(home_items.playlists),
+            channels=list(home_items.channels),
+        )
+        assert home_items.fingerprint() == same.fingerprint()
+
+        # reordered home page and suggested videos aren't a change
+        same.playlists.reverse()
+        same.channels.reverse()
+        same.videos.append(Video(video_id=VideoId("new"), title=Title("new")))
+        assert home_items.fingerprint() == same.fingerprint()
+
+        same.playlists.append(
+            Playlist(playlist_id=PlaylistId("new"), title=Title("new"))
+        )
+        assert home_items.fingerprint() != same.fingerprint()
+        # playlist and channel with same id are different items
+        assert (
+            HomeItems(
+                playlists=[Playlist(playlist_id=PlaylistId("1"), title=Title("t"))]
+            ).fingerprint()
+            != HomeItems(
+                channels=[Channel(browse_id=BrowseId("1"), title=Title("t"))]
+            ).fingerprint()
+        )
@@ -0,0 +1,101 @@
+import json
+from time import perf_counter
+from typing import List, Optional
+
+import pytest
+from pydantic import BaseModel, Field
+from ytldl2.extractor import Extractor
+from ytldl2.models.raw_home import Home, HomeItem
+
+from tests.ytldl2 import DATA
+
+
+class _FullContent(BaseModel):
+    """Full schema of home content, which was validated before."""
+
+    class Thumbnail(BaseModel):
+        url: str
+        width: int
+        height: int
+
+    class Artist(BaseModel):
+        name: str
+        id: Optional[str]
+
+    class Album(BaseModel):
+        name: str
+        id: str
+
+    title: str
+    playlist_id: Optional[str] = Field(None, alias="playlistId")
+    thumbnails: List[Thumbnail]
+    description: Optional[str] = None
+    browse_id: Optional[str] = Field(None, alias="browseId")
+    subscribers: Optional[str] = None
+    video_id: Optional[str] = Field(None, alias="videoId")
+    artists: Optional[List[Artist]] = None
+    views: Optional[str] = None
+    year: Optional[str] = None
+    is_explicit: Optional[bool] = Field(None, alias="isExplicit")
+    count: Optional[str] = None
+    album: Optional[Album] = None
+
+
+class _FullHomeItem(BaseModel):
+    title: str
+    contents: List[_FullContent]
+
+
+class TestHome:
+    @pytest.fixture(scope="class")
+    def raw_home(self) -> list:
+        return json.loads((DATA / "home.json").read_bytes())
+
+    @pytest.fixture(scope="class")
+    def big_raw_home(self, raw_home: list) -> list:
+        """Home feed of 1000 items, made of real ones."""
+        contents = [content for item in raw_home for content in item["contents"]]
+        return [
+            {
+                "title": f"shelf {i}",
+                "contents": [contents[(i * 10 + j) % len(contents)] for j in range(10)],
+            }
+            for i in range(100)
+        ]
+
+    def test_parse_obj(self, raw_home: list):
+        home = Home.parse_obj(raw_home)
+        assert len(home.root) == len(raw_home)
+        items = Extractor().parse_home(home)
+        assert items.videos and items.playlists and items.channels
+
+    def test_parse_obj__broken_item(self, raw_home: list):
+        home = Home.parse_obj([{"contents": []}] + raw_home)
+        # broken item is skipped, the rest are parsed
+        assert [item.title for item in home] == [item["title"] for item in raw_home]
+
+    @pytest.mark.slow
+    def test_benchmark(self, big_raw_home: list):
+        def measure(parse) -> float:
+            """Best time of one parse, in seconds."""
+            parse()
+            times = []
+            for _ in range(20):
+                started = perf_counter()
+                parse()
+                times.append(perf_counter() - started)
+            return min(times)
+
+        def parse_full() -> None:
+            for item in big_raw_home:
+                _FullHomeItem.model_validate(item)
+
+        def parse_lean() -> None:
+            Home.parse_obj(big_raw_home)
+
+        full, lean = measure(parse_full), measure(parse_lean)
+        print(f"1000 items: full={full * 1000:.2f}ms, lean={lean * 1000:.2f}ms")
+        assert lean < full
+        assert [item.title for item in Home.parse_obj(big_raw_home)] == [
+            HomeItem.model_validate(item).title for item in big_raw_home
+        ]
@@ -1,8 +1,19 @@
+import json
+import threading
+from datetime import timedelta
+
 import pytest
+import requests
+from ytmusicapi.exceptions import YTMusicServerError
 
 from ytldl2.api import YtMusicApi
 from ytldl2.models.home_items import HomeItems
-from ytldl2.models.types import ChannelId, PlaylistId
+from ytldl2.models.playlist import Playlist
+from ytldl2.models.types import Artist, ChannelId, PlaylistId, Title, VideoId
+from ytldl2.models.video import Video
+from ytldl2.sqlite_cache import SqliteCache
+
+from tests.ytldl2 import DATA
 
 
 class TestYtMusicApi:
@@ -36,3 +47,253 @@ class TestYtMusicApi:
             ChannelId("UCpFgEr3XUXk_8wK8H9Dn6Cg")
         )
         assert videos
+
+
+class TestYtMusicApiOffline:
+    PLAYLISTS = {
+        PlaylistId("slow"): [
+            Video(title=Title("s"), video_id=VideoId("slow_video"), artist=Artist("a"))
+        ],
+        PlaylistId("fast"): [
+            Video(title=Title("f"), video_id=VideoId("fast_video"), artist=Artist("a"))
+        ],
+    }
+
+    @pytest.fixture()
+    def yt_music_api(self, monkeypatch: pytest.MonkeyPatch) -> YtMusicApi:
+        slow_released = threading.Event()
+
+        def get_videos_from_playlist(self, playlist_id: PlaylistId, /, limit=200):
+            if playlist_id == "broken":
+                raise ValueError(playlist_id)
+            if playlist_id == "slow":
+                assert slow_released.wait(timeout=5)
+            return TestYtMusicApiOffline.PLAYLISTS[playlist_id]
+
+        monkeypatch.setattr(
+            YtMusicApi, "get_videos_from_playlist", get_videos_from_playlist
+        )
+        api = YtMusicApi(ytm=None)  # type: ignore
+        api.slow_released = slow_released  # type: ignore
+        return api
+
+    @pytest.fixture()
+    def home_items(self) -> HomeItems:
+        return HomeItems(
+            videos=[
+                Video(title=Title("home"), video_id=VideoId("home_video"), artist=None)
+            ],
+            playlists=[
+                Playlist(title=Title(id), playlist_id=PlaylistId(id))
+                for id in ["slow", "broken", "fast"]
+            ],
+        )
+
+    def test_iter_videos(self, yt_music_api: YtMusicApi, home_items: HomeItems):
+        batches = yt_music_api.iter_videos(home_items, each_playlist_limit=1)
+
+        assert [v.video_id for v in next(batches)] == ["home_video"]
+        # fast playlist is yielded while slow one is still being fetched
+        assert [v.video_id for v in next(batches)] == ["fast_video"]
+        yt_music_api.slow_released.set()  # type: ignore
+        assert [v.video_id for v in next(batches)] == ["slow_video"]
+        assert next(batches, None) is None
+
+    def test_get_videos(self, yt_music_api: YtMusicApi, home_items: HomeItems):
+        yt_music_api.slow_released.set()  # type: ignore
+        videos = yt_music_api.get_videos(home_items, each_playlist_limit=1)
+        assert {v.video_id for v in videos} == {
+            "home_video",
+            "fast_video",
+            "slow_video",
+        }
+
+    def test_iter_videos__timeout(self, yt_music_api: YtMusicApi, home_items):
+        yt_music_api._task_timeout = 0.2
+        videos = yt_music_api.get_videos(home_items, each_playlist_limit=1)
+        # hung playlist is skipped instead of stalling iteration
+        assert {v.video_id for v in videos} == {"home_video", "fast_video"}
+        yt_music_api.slow_released.set()  # type: ignore
+
+
+class FakePlaylistYTMusic:
+    def __init__(self, video_ids: list[str]) -> None:
+        self.video_ids = video_ids
+        self.limits: list[int] = []
+
+    def get_playlist(self, playlistId: str, limit: int) -> dict:
+        self.limits.append(limit)
+        return {
+            "id": playlistId,
+            "title": "playlist",
+            "trackCount": len(self.video_ids),
+            "tracks": [
+                {"videoId": id, "title": id, "artists": [{"name": "a", "id": None}]}
+                for id in self.video_ids[:limit]
+            ],
+        }
+
+
+class TestYtMusicApiSnapshots:
+    PLAYLIST = PlaylistId("likes")
+
+    @pytest.fixture()
+    def yt(self) -> FakePlaylistYTMusic:
+        return FakePlaylistYTMusic([f"old{i}" for i in range(150)])
+
+    @pytest.fixture()
+    def api(self, yt: FakePlaylistYTMusic) -> YtMusicApi:
+        api = YtMusicApi(ytm=yt, snapshots=SqliteCache())  # type: ignore
+        # first sync fetches whole playlist and takes snapshot
+        assert len(api.get_videos_from_playlist(self.PLAYLIST, limit=200)) == 150
+        api.commit_snapshots()
+        yt.limits.clear()
+        return api
+
+    def ids(self, videos: list[Video]) -> list[str]:
+        return [v.video_id for v in videos]
+
+    def test_sync__unchanged(self, api: YtMusicApi, yt: FakePlaylistYTMusic):
+        assert api.get_videos_from_playlist(self.PLAYLIST, limit=200) == []
+        assert yt.limits == [YtMusicApi.FIRST_PAGE_SIZE]
+
+    def test_sync__prepended(self, api: YtMusicApi, yt: FakePlaylistYTMusic):
+        yt.video_ids = ["new0", "new1"] + yt.video_ids
+        videos = api.get_videos_from_playlist(self.PLAYLIST, limit=200)
+        assert self.ids(videos) == ["new0", "new1"]
+        assert yt.limits == [YtMusicApi.FIRST_PAGE_SIZE]
+
+        # snapshot includes new videos, when it's committed
+        api.commit_snapshots()
+        assert api.get_videos_from_playlist(self.PLAYLIST, limit=200) == []
+
+    def test_sync__not_committed(self, api: YtMusicApi, yt: FakePlaylistYTMusic):
+        yt.video_ids = ["new0"] + yt.video_ids
+        assert self.ids(api.get_videos_from_playlist(self.PLAYLIST, limit=200)) == [
+            "new0"
+        ]
+        # e.g. download was cancelled
+        api.discard_snapshots()
+        assert self.ids(api.get_videos_from_playlist(self.PLAYLIST, limit=200)) == [
+            "new0"
+        ]
+
+    def test_sync__keeps_last_full_sync(self, yt: FakePlaylistYTMusic):
+        snapshots = SqliteCache()
+        api = YtMusicApi(ytm=yt, snapshots=snapshots)  # type: ignore
+        api.get_videos_from_playlist(self.PLAYLIST, limit=200)
+        api.commit_snapshots()
+        full = snapshots.get_playlist_snapshot(self.PLAYLIST)
+        assert full is not None
+
+        yt.video_ids = ["new0"] + yt.video_ids
+        api.get_videos_from_playlist(self.PLAYLIST, limit=200)
+        api.commit_snapshots()
+
+        # incremental syncs don't postpone full sync
+        synced = snapshots.get_playlist_snapshot(self.PLAYLIST)
+        assert synced is not None
+        assert synced.video_ids[0] == "new0"
+        assert synced.last_full_sync == full.last_full_sync
+
+    def test_sync__reordered(self, api: YtMusicApi, yt: FakePlaylistYTMusic):
+        yt.video_ids = list(reversed(yt.video_ids))
+        videos = api.get_videos_from_playlist(self.PLAYLIST, limit=200)
+        assert len(videos) == 150
+        assert yt.limits == [YtMusicApi.FIRST_PAGE_SIZE, 200]
+
+    def test_sync__appended_after_first_page(
+        self, api: YtMusicApi, yt: FakePlaylistYTMusic
+    ):
+        yt.video_ids = yt.video_ids + ["new"]
+        videos = api.get_videos_from_playlist(self.PLAYLIST, limit=200)
+        assert "new" in self.ids(videos)
+        assert yt.limits == [YtMusicApi.FIRST_PAGE_SIZE, 200]
+
+    def test_sync__complete_page(self, yt: FakePlaylistYTMusic):
+        yt.video_ids = ["a", "b"]
+        api = YtMusicApi(ytm=yt, snapshots=SqliteCache())  # type: ignore
+        api.get_videos_from_playlist(self.PLAYLIST, limit=200)
+        api.commit_snapshots()
+        yt.video_ids = ["a", "c", "b"]
+        videos = api.get_videos_from_playlist(self.PLAYLIST, limit=200)
+        assert self.ids(videos) == ["c"]
+
+    def test_sync__snapshot_expired(self, yt: FakePlaylistYTMusic):
+        api = YtMusicApi(
+            ytm=yt,  # type: ignore
+            snapshots=SqliteCache(),
+            full_sync_interval=timedelta(0),
+        )
+        api.get_videos_from_playlist(self.PLAYLIST, limit=200)
+        api.commit_snapshots()
+        assert len(api.get_videos_from_playlist(self.PLAYLIST, limit=200)) == 150
+
+
+class FakeLookupsYTMusic:
+    def __init__(self) -> None:
+        self.calls: list[str] = []
+        self.error: Exception | None = None
+
+    def get_playlist(self, playlistId: str, limit: int) -> dict:
+        self.calls.append(f"get_playlist:{playlistId}")
+        if self.error is not None:
+            raise self.error
+        if playlistId.startswith("RD"):
+            raise KeyError("contents")
+        return {"id": playlistId, "title": "playlist", "tracks": []}
+
+    def get_watch_playlist(self, playlistId: str, limit: int) -> dict:
+        self.calls.append(f"get_watch_playlist:{playlistId}")
+        return {"playlistId": playlistId, "tracks": []}
+
+    def get_artist(self, channelId: str) -> dict:
+        self.calls.append(f"get_artist:{channelId}")
+        return json.loads((DATA / "artist.json").read_bytes())
+
+
+class TestYtMusicApiLookups:
+    SONGS_PLAYLIST = "VLOLAK5uy_k3MhpJYfxJH099ZbTqgGF9fpPCE_QXSVQ"
+
+    @pytest.fixture()
+    def yt(self) -> FakeLookupsYTMusic:
+        return FakeLookupsYTMusic()
+
+    @pytest.fixture()
+    def api(self, yt: FakeLookupsYTMusic) -> YtMusicApi:
+        return YtMusicApi(ytm=yt, lookups=SqliteCache())  # type: ignore
+
+    def test_watch_playlist(self, api: YtMusicApi, yt: FakeLookupsYTMusic):
+        api.get_videos_from_playlist(PlaylistId("RDmix"))
+        api.get_videos_from_playlist(PlaylistId("RDmix"))
+        assert yt.calls == [
+            "get_playlist:RDmix",
+            "get_watch_playlist:RDmix",
+            "get_watch_playlist:RDmix",
+        ]
+
+    def test_playlist__transient_error(self, api: YtMusicApi, yt: FakeLookupsYTMusic):
+        api.get_videos_from_playlist(PlaylistId("playlist"))
+        yt.error = requests.ConnectionError("connection reset")
+        with pytest.raises(requests.ConnectionError):
+            api.get_videos_from_playlist(PlaylistId("playlist"))
+        yt.error = None
+        api.get_videos_from_playlist(PlaylistId("playlist"))
+
+        # playlist isn't taken for watch playlist
+        assert "get_watch_playlist:playlist" not in yt.calls
+        assert yt.calls.count("get_playlist:playlist") == 3
+
+    def test_playlist__unknown_transient_error(
+        self, api: YtMusicApi, yt: FakeLookupsYTMusic
+    ):
+        yt.error = YTMusicServerError("Server returned HTTP 503: Service Unavailable.")
+        with pytest.raises(YTMusicServerError):
+            api.get_videos_from_playlist(PlaylistId("playlist"))
+        assert yt.calls == ["get_playlist:playlist"]
+
+    def test_channel(self, api: YtMusicApi, yt: FakeLookupsYTMusic):
+        api.get_videos_from_channel(ChannelId("channel"))
+        api.get_videos_from_channel(ChannelId("channel"))
+        assert yt.calls.count("get_artist:channel") == 1
+        assert yt.calls.count(f"get_playlist:{self.SONGS_PLAYLIST}") == 2
@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+import pytest
+from ytldl2.cached_ytmusic import CachedYTMusic
+from ytldl2.sqlite_cache import SqliteCache
+
+
+class FakeYTMusic:
+    def __init__(self) -> None:
+        self.calls: list[str] = []
+
+    def get_playlist(self, playlistId: str, limit: int) -> dict:
+        self.calls.append(playlistId)
+        if playlistId == "broken":
+            raise ValueError(playlistId)
+        return {"id": playlistId, "tracks": [{"videoId": "id"}] * limit}
+
+    def get_home(self, limit: int) -> list:
+        self.calls.append("home")
+        return [{"title": "home"}]
+
+    def get_song(self, videoId: str) -> dict:
+        self.calls.append(videoId)
+        return {}
+
+
+class TestCachedYTMusic:
+    @pytest.fixture
+    def yt(self) -> FakeYTMusic:
+        return FakeYTMusic()
+
+    @pytest.fixture
+    def cached(self, yt: FakeYTMusic) -> CachedYTMusic:
+        return CachedYTMusic(yt, SqliteCache())  # type: ignore
+
+    def test_cached(self, cached: CachedYTMusic, yt: FakeYTMusic):
+        first = cached.get_playlist(playlistId="p", limit=2)
+        assert cached.get_playlist(playlistId="p", limit=2) == first
+        cached.get_playlist(playlistId="p", limit=3)
+        assert yt.calls == ["p", "p"]
+        assert (cached.stats.hits, cached.stats.misses) == (1, 2)
+
+    def test_ttl(self, yt: FakeYTMusic):
+        cached = CachedYTMusic(
+            yt, SqliteCache(), ttls={"get_home": timedelta(0)}  # type: ignore
+        )
+        cached.get_home(limit=1)
+        cached.get_home(limit=1)
+        assert yt.calls == ["home", "home"]
+
+    def test_error_not_cached(self, cached: CachedYTMusic, yt: FakeYTMusic):
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                cached.get_playlist(playlistId="broken", limit=1)
+        assert yt.calls == ["broken", "broken"]
+
+    def test_not_cached_endpoint(self, cached: CachedYTMusic, yt: FakeYTMusic):
+        cached.get_song(videoId="id")
+        cached.get_song(videoId="id")
+        assert yt.calls == ["id", "id"]
+
+    def test_refresh(self, cached: CachedYTMusic, yt: FakeYTMusic):
+        cached.get_home(limit=1)
+        cached.refresh("get_home", limit=1)
+        # refreshed response is cached
+        cached.get_home(limit=1)
+        assert yt.calls == ["home", "home"]
@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+import requests
+from ytldl2.concurrency_limiter import AimdConcurrencyLimiter
+
+
+class TestAimdConcurrencyLimiter:
+    def test_init_invalid(self):
+        with pytest.raises(ValueError):
+            AimdConcurrencyLimiter(initial_limit=10, max_limit=8)
+
+    def test_increases_on_success(self):
+        limiter = AimdConcurrencyLimiter(initial_limit=2, max_limit=3, increase=0.5)
+        for _ in range(10):
+            with limiter.request("get_playlist"):
+                pass
+        assert limiter.limit == 3
+
+    @pytest.mark.parametrize(
+        "error",
+        [ValueError("HTTP Error 429: Too Many Requests"), requests.Timeout()],
+    )
+    def test_decreases_on_overload(self, error: Exception):
+        limiter = AimdConcurrencyLimiter(initial_limit=8, max_limit=8)
+        with pytest.raises(type(error)):
+            with limiter.request("get_playlist"):
+                raise error
+        assert limiter.limit == 4
+
+    def test_decreases_on_slow_request(self):
+        limiter = AimdConcurrencyLimiter(initial_limit=4, slow_latency=0)
+        with limiter.request("get_playlist"):
+            pass
+        assert limiter.limit == 2
+
+    def test_other_errors_keep_limit(self):
+        limiter = AimdConcurrencyLimiter(initial_limit=4)
+        with pytest.raises(KeyError):
+            with limiter.request("get_playlist"):
+                raise KeyError()
+        assert limiter.limit == 4
+
+    def test_limits_concurrency(self):
+        limiter = AimdConcurrencyLimiter(
+            initial_limit=3, max_limit=3, endpoint_limits={"get_artist": 1}
+        )
+        lock = threading.Lock()
+        in_flight = {"get_playlist": 0, "get_artist": 0, "max": 0, "max_artist": 0}
+        released = threading.Event()
+
+        def request(endpoint: str):
+            with limiter.request(endpoint):
+                with lock:
+                    in_flight[endpoint] += 1
+                    total = in_flight["get_playlist"] + in_flight["get_artist"]
+                    in_flight["max"] = max(in_flight["max"], total)
+                    in_flight["max_artist"] = max(
+                        in_flight["max_artist"], in_flight["get_artist"]
+                    )
+                released.wait(timeout=1)
+                with lock:
+                    in_flight[endpoint] -= 1
+
+        threads = [
+            threading.Thread(target=request, args=(endpoint,))
+            for endpoint in ["get_playlist"] * 4 + ["get_artist"] * 3
+        ]
+        for thread in threads:
+            thread.start()
+        released.set()
+        for thread in threads:
+            thread.join()
+        assert in_flight["max"] <= 3
+        assert in_flight["max_artist"] == 1
@@ -0,0 +1,86 @@
+from datetime import timedelta
+from time import monotonic
+
+from ytldl2.cancellation_tokens import CancellationToken
+from ytldl2.daemon import Daemon
+
+
+def test_run__stops_on_cancel():
+    token = CancellationToken()
+    daemon = Daemon(
+        cycle=token.request_kill,
+        cancellation_token=token,
+        interval=timedelta(hours=1),
+        step=0.01,
+    )
+    started = monotonic()
+    daemon.run()
+    assert daemon.cycles == 1
+    assert monotonic() - started < 1
+
+
+def test_run__waits_interval():
+    token = CancellationToken()
+    starts: list[float] = []
+
+    def cycle():
+        starts.append(monotonic())
+        if len(starts) == 3:
+            token.request_kill()
+
+    Daemon(
+        cycle=cycle,
+        cancellation_token=token,
+        interval=timedelta(seconds=0.1),
+        step=0.01,
+    ).run()
+    assert len(starts) == 3
+    assert all(b - a >= 0.1 for a, b in zip(starts, starts[1:]))
+
+
+def test_run__check_starts_cycle_early():
+    token = CancellationToken()
+    checks = 0
+
+    def check() -> bool:
+        nonlocal checks
+        checks += 1
+        return checks % 2 == 0
+
+    daemon = Daemon(
+        cycle=lambda: token.request_kill() if daemon.cycles == 2 else None,
+        cancellation_token=token,
+        interval=timedelta(hours=1),
+        check=check,
+        check_interval=timedelta(seconds=0.01),
+        step=0.01,
+    )
+    started = monotonic()
+    daemon.run()
+    assert daemon.cycles == 2
+    assert checks == 2
+    assert monotonic() - started < 1
+
+
+def test_run__failures_are_logged():
+    token = CancellationToken()
+    daemon: Daemon
+
+    def cycle():
+        if daemon.cycles == 2:
+            token.request_kill()
+        raise RuntimeError("network is down")
+
+    def check() -> bool:
+        raise RuntimeError("network is down")
+
+    daemon = Daemon(
+        cycle=cycle,
+        cancellation_token=token,
+        interval=timedelta(seconds=0.05),
+        check=check,
+        check_interval=timedelta(seconds=0.01),
+        step=0.01,
+    )
+    daemon.run()
+    assert daemon.cycles == 2
@@ -0,0 +1,72 @@
+import os
+import pathlib
+import time
+from datetime import timedelta
+
+import pytest
+from ytldl2.download_journal import DownloadJournal
+
+
+class TestDownloadJournal:
+    @pytest.fixture
+    def journal_path(self, tmp_path: pathlib.Path) -> pathlib.Path:
+        return tmp_path / "journal.json"
+
+    @pytest.fixture
+    def journal(self, journal_path: pathlib.Path) -> DownloadJournal:
+        return DownloadJournal(journal_path)
+
+    def test_pending__persisted(
+        self, journal: DownloadJournal, journal_path: pathlib.Path
+    ):
+        journal.start("first")
+        journal.start("second")
+        journal.add_file("second", "second.m4a.part")
+        journal.add_file("second", "second.m4a.part")
+
+        reopened = DownloadJournal(journal_path)
+        assert reopened.pending() == ["first", "second"]
+        assert reopened.files("second") == ["second.m4a.part"]
+
+    def test_finish(self, journal: DownloadJournal, journal_path: pathlib.Path):
+        journal.start("id")
+        journal.finish("id")
+        journal.finish("unknown")
+
+        assert journal.pending() == []
+        assert DownloadJournal(journal_path).pending() == []
+
+    def test_load__corrupted(self, journal_path: pathlib.Path):
+        journal_path.write_text("not a json")
+        assert DownloadJournal(journal_path).pending() == []
+
+    def test_collect_garbage(self, tmp_path: pathlib.Path):
+        journal = DownloadJournal(tmp_path / "journal.json", max_age=timedelta(hours=1))
+        journal.start("id")
+
+        fresh = tmp_path / "fresh.m4a.part"
+        stale = tmp_path / "stale.m4a.part"
+        song = tmp_path / "song.m4a"
+        for path in (fresh, stale, song):
+            path.touch()
+        two_hours_ago = time.time() - 2 * 60 * 60
+        os.utime(stale, (two_hours_ago, two_hours_ago))
+        os.utime(song, (two_hours_ago, two_hours_ago))
+
+        journal.collect_garbage([tmp_path])
+
+        assert fresh.exists()
+        assert not stale.exists()
+        assert song.exists()
+        assert journal.pending() == ["id"]
+
+    def test_collect_garbage__expired_entries(self, tmp_path: pathlib.Path):
+        journal = DownloadJournal(tmp_path / "journal.json", max_age=timedelta(0))
+        journal.start("id")
+        journal.collect_garbage([tmp_path])
+        assert journal.pending() == []
+
+    def test_collect_garbage__unchanged_not_saved(self, journal_path: pathlib.Path):
+        journal = DownloadJournal(journal_path)
+        journal.collect_garbage([journal_path.parent])
+        assert not journal_path.exists()
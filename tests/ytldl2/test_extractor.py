@@ -43,6 +43,11 @@ class TestExtractor:
     ):
         videos = extractor.extract_videos_from_playlist(get_playlist)
         assert videos
+        assert {v.video_type for v in videos} == {
+            "MUSIC_VIDEO_TYPE_ATV",
+            "MUSIC_VIDEO_TYPE_OMV",
+            "MUSIC_VIDEO_TYPE_UGC",
+        }
 
     def test_extract_videos_from_playlist__get_watch_playlist(
         self, extractor: Extractor, get_watch_playlist
@@ -0,0 +1,89 @@
+import threading
+import time
+from datetime import timedelta
+
+import pytest
+from ytldl2.info_prefetcher import InfoPrefetcher, urls_expire_at
+from ytldl2.postprocessors import SongFiltered
+
+
+class FakeYoutubeDL:
+    def __init__(self, expire: float | None = None) -> None:
+        self.params: dict = {"proxy": "socks5://proxy"}
+        self.extracted: list[str] = []
+        self._expire = expire
+        self._lock = threading.Lock()
+
+    def extract_info(self, video_id: str, download: bool) -> dict:
+        assert not download
+        with self._lock:
+            self.extracted.append(video_id)
+        info = dict(id=video_id, title="title", duration=1)
+        if video_id == "video":
+            raise SongFiltered("not a song", info)
+        if self._expire is not None:
+            info["url"] = f"https://googlevideo.com/videoplayback?expire={self._expire}"
+        return info
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+def test_urls_expire_at():
+    info = {
+        "url": "https://a/?expire=200&id=1",
+        "formats": [{"url": "https://a/?expire=100"}, {"url": "https://a/"}],
+    }
+    assert urls_expire_at(info) == 100
+    assert urls_expire_at({"url": "https://a/"}) is None
+
+
+class TestInfoPrefetcher:
+    def test_next__lookahead(self):
+        ydl = FakeYoutubeDL()
+        prefetcher = InfoPrefetcher(
+            ["id1", "id2", "id3", "id4"], lambda: ydl, lookahead=2  # type: ignore
+        )
+
+        video_id, future = next(prefetcher)
+        assert video_id == "id1"
+        assert prefetcher.get(future) == dict(id="id1", title="title", duration=1)
+        prefetched = prefetcher.get_prefetched(future)
+        # stream urls are bound to proxy, via which info was extracted
+        assert prefetched is not None and prefetched.proxy == "socks5://proxy"
+        # next two ids are being extracted in background
+        time.sleep(0.1)
+        assert sorted(ydl.extracted) == ["id1", "id2", "id3"]
+
+        assert [video_id for video_id, _ in prefetcher] == ["id2", "id3", "id4"]
+        assert prefetcher.stats.hits == 2
+        prefetcher.close()
+
+    def test_get__filtered(self):
+        prefetcher = InfoPrefetcher(
+            ["video"], lambda: FakeYoutubeDL(), lookahead=1  # type: ignore
+        )
+        _, future = next(prefetcher)
+        with pytest.raises(SongFiltered):
+            prefetcher.get(future)
+        prefetcher.close()
+
+    def test_get__urls_expire_soon(self):
+        ydl = FakeYoutubeDL(expire=time.time() + 60)
+        prefetcher = InfoPrefetcher(
+            ["id"],
+            lambda: ydl,  # type: ignore
+            lookahead=1,
+            expire_margin=timedelta(minutes=5),
+        )
+        _, future = next(prefetcher)
+        assert prefetcher.get(future) is None
+        assert prefetcher.stats.misses == 1
+        prefetcher.close()
+
+    def test_init__invalid_lookahead(self):
+        with pytest.raises(ValueError):
+            InfoPrefetcher([], lambda: FakeYoutubeDL(), lookahead=0)  # type: ignore
@@ -0,0 +1,100 @@
+import threading
+import time
+
+import pytest
+from ytldl2.metadata_prefetcher import MetadataPrefetcher
+from ytldl2.postprocessors import PrefetchMetadataPP
+from ytldl2.thumbnail_cache import ThumbnailCache
+
+
+class FakeThumbnails:
+    def __init__(self) -> None:
+        self.urls: list[str] = []
+
+    def get(self, url: str) -> bytes:
+        self.urls.append(url)
+        return url.encode()
+
+
+class TestMetadataPrefetcher:
+    @pytest.fixture
+    def lyrics_released(self) -> threading.Event:
+        return threading.Event()
+
+    @pytest.fixture
+    def fetched_lyrics(self) -> list[str]:
+        return []
+
+    @pytest.fixture
+    def prefetcher(
+        self, lyrics_released: threading.Event, fetched_lyrics: list[str]
+    ) -> MetadataPrefetcher:
+        def get_lyrics(video_id: str) -> str | None:
+            assert lyrics_released.wait(timeout=5)
+            fetched_lyrics.append(video_id)
+            return f"lyrics of {video_id}"
+
+        return MetadataPrefetcher(
+            get_lyrics=get_lyrics,
+            thumbnails=FakeThumbnails(),  # type: ignore
+        )
+
+    def test_prefetch(
+        self,
+        prefetcher: MetadataPrefetcher,
+        lyrics_released: threading.Event,
+        fetched_lyrics: list[str],
+    ):
+        prefetcher.prefetch("id", "url")
+        prefetcher.prefetch("id", "url")
+        # prefetch doesn't wait for fetch
+        assert fetched_lyrics == []
+
+        lyrics_released.set()
+        assert prefetcher.lyrics("id") == "lyrics of id"
+        assert fetched_lyrics == ["id"]
+        assert prefetcher.thumbnail("url") == b"url"
+
+    def test_lyrics__not_prefetched(
+        self,
+        prefetcher: MetadataPrefetcher,
+        lyrics_released: threading.Event,
+        fetched_lyrics: list[str],
+    ):
+        lyrics_released.set()
+        assert prefetcher.lyrics("id") == "lyrics of id"
+        assert prefetcher.lyrics("id") == "lyrics of id"
+        assert fetched_lyrics == ["id", "id"]
+
+    def test_discard(
+        self,
+        prefetcher: MetadataPrefetcher,
+        lyrics_released: threading.Event,
+        fetched_lyrics: list[str],
+    ):
+        lyrics_released.set()
+        prefetcher.prefetch("id", None)
+        while not fetched_lyrics:
+            time.sleep(0.01)
+
+        prefetcher.discard("id")
+        assert prefetcher.lyrics("id") == "lyrics of id"
+        assert fetched_lyrics == ["id", "id"]
+
+    def test_prefetch_thumbnail__error(self):
+        thumbnails = ThumbnailCache(session=None)  # type: ignore
+        prefetcher = MetadataPrefetcher(lambda _: None, thumbnails)
+        prefetcher.prefetch("id", "url")
+        prefetcher.close()
+
+
+class TestPrefetchMetadataPP:
+    def test_run(self, monkeypatch: pytest.MonkeyPatch):
+        prefetched = []
+        monkeypatch.setattr(
+            MetadataPrefetcher, "prefetch", lambda _, *args: prefetched.append(args)
+        )
+        pp = PrefetchMetadataPP(MetadataPrefetcher(lambda _: None, None))  # type: ignore
+        info = {"id": "id", "thumbnail": "url"}
+        assert pp.run(info) == ([], info)
+        assert prefetched == [("id", "url")]
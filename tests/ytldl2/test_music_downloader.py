@@ -1,37 +1,59 @@
 import pathlib
+import threading
+import time
+from typing import Iterator
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 from yt_dlp.postprocessor.ffmpeg import FFmpegExtractAudioPP
-from ytldl2.models.download_result import Downloaded, Error, Filtered
+from ytldl2 import postprocessing_stage
+from ytldl2.cancellation_tokens import CancellationToken
+from ytldl2.models.download_result import (
+    Downloaded,
+    DownloadResult,
+    Error,
+    Filtered,
+)
+from ytldl2.models.info import SongInfo
 from ytldl2.models.types import VideoId
-from ytldl2.music_downloader import (
-    MusicDownloader,
-    MusicYoutubeDlBuilder,
-    YoutubeDlParams,
+from ytldl2.info_prefetcher import InfoPrefetcher, PrefetchedInfo
+from ytldl2.music_downloader import MusicDownloader
+from ytldl2.postprocessing_stage import (
+    PostprocessJob,
+    PostprocessResult,
+    PostprocessStage,
+)
+from ytldl2.postprocessors import (
+    FilterSongPP,
+    LyricsPP,
+    MetadataPP,
+    PrefetchMetadataPP,
+    RetainMainArtistPP,
+    SongFiltered,
 )
-from ytldl2.postprocessors import FilterSongPP, LyricsPP, MetadataPP, RetainMainArtistPP
+from ytldl2.rate_limiter import AimdRateLimiter
+from ytldl2.youtube_dl_builder import YoutubeDlBuilder
 
 
 class TestMusicYoutubeDlBuilder:
     @pytest.mark.slow
     def test_build(self):
-        params = YoutubeDlParams(
+        builder = YoutubeDlBuilder(
             home_dir=pathlib.Path("~"),
             tmp_dir=pathlib.Path("f:/"),
         )
 
-        builder = MusicYoutubeDlBuilder(params)
-
         ydl = builder.build()
 
         ydl_params = ydl.params
-        assert str(params.home_dir) == ydl_params["paths"]["home"]
-        assert str(params.tmp_dir) == ydl_params["paths"]["tmp"]
+        assert str(builder.home_dir) == ydl_params["paths"]["home"]
+        assert str(builder.tmp_dir) == ydl_params["paths"]["tmp"]
 
         pre_processes = ydl._pps["pre_process"]
-        assert len(pre_processes) == 2
+        assert len(pre_processes) == 3
         assert isinstance(pre_processes[0], FilterSongPP)
         assert isinstance(pre_processes[1], RetainMainArtistPP)
+        assert isinstance(pre_processes[2], PrefetchMetadataPP)
 
         post_processes = ydl._pps["post_process"]
         assert len(post_processes) == 3
@@ -39,8 +61,191 @@ class TestMusicYoutubeDlBuilder:
         assert isinstance(post_processes[1], LyricsPP)
         assert isinstance(post_processes[2], MetadataPP)
 
+    def test_close(self, tmp_path: pathlib.Path):
+        builder = YoutubeDlBuilder(home_dir=tmp_path, tmp_dir=tmp_path)
+        assert builder.metadata_prefetcher is not None
+
+        builder.close()
+
+        with pytest.raises(RuntimeError):
+            builder.metadata_prefetcher.prefetch("id", "url")
+
 
 class TestMusicDownloader:
+    @pytest.fixture
+    def downloader(self, tmp_path: pathlib.Path) -> MusicDownloader:
+        return MusicDownloader(
+            YoutubeDlBuilder(home_dir=tmp_path, tmp_dir=tmp_path),
+            rate_limiter=AimdRateLimiter(initial_rate=1000, max_rate=1000, burst=1000),
+        )
+
+    @pytest.fixture
+    def fake_download(self, monkeypatch: pytest.MonkeyPatch) -> set[str]:
+        """Replaces network download, returns names of threads, that downloaded."""
+        thread_names: set[str] = set()
+        barrier = threading.Barrier(2, timeout=5)
+
+        def download_video(self, ydl, video_id: VideoId, info=None) -> SongInfo:
+            thread_names.add(threading.current_thread().name)
+            time.sleep(0.01)
+            if video_id == "error":
+                raise ValueError(video_id)
+            if video_id.startswith("parallel"):
+                # passes only if two downloads are run at the same time
+                barrier.wait()
+            return SongInfo(
+                id=video_id, title="title", duration=1, channel=None, artist="a"
+            )
+
+        monkeypatch.setattr(MusicDownloader, "_build_ydl", lambda *_: None)
+        monkeypatch.setattr(MusicDownloader, "_download_video", download_video)
+        return thread_names
+
+    def test_download__workers(self, downloader: MusicDownloader, fake_download):
+        videos = [VideoId(id) for id in ["parallel1", "parallel2", "error", "ok"]]
+        results = list(downloader.download(videos, workers=2))
+
+        assert {r.video_id for r in results} == set(videos)
+        assert [r.video_id for r in results if isinstance(r, Error)] == ["error"]
+        assert len(fake_download) == 2
+
+    def test_download__stop_iteration(self, downloader: MusicDownloader, fake_download):
+        videos = (VideoId(f"id{i}") for i in range(100))
+        for _ in downloader.download(videos, workers=3):
+            break
+        assert len(list(videos)) > 0
+
+    def test_download__stop_iteration_abandoned(
+        self, downloader: MusicDownloader, fake_download
+    ):
+        consumed: list[VideoId] = []
+
+        def videos():
+            for i in range(100):
+                consumed.append(VideoId(f"id{i}"))
+                yield consumed[-1]
+
+        abandoned: list[VideoId] = []
+        results = downloader.download(
+            videos(), workers=3, on_abandoned=lambda r: abandoned.append(r.video_id)
+        )
+        yielded = [next(results).video_id]
+        results.close()
+
+        # results of downloads, which were in flight, aren't lost
+        assert sorted(yielded + abandoned) == sorted(consumed)
+
+    def test_download__cancelled(self, downloader: MusicDownloader, fake_download):
+        token = CancellationToken()
+        token.request_kill()
+        videos = [VideoId("id")]
+        assert not list(downloader.download(videos, cancellation_token=token))
+
+    def test_download__lookahead(
+        self,
+        downloader: MusicDownloader,
+        fake_download: set[str],
+        monkeypatch: pytest.MonkeyPatch,
+    ):
+        downloaded: dict[str, dict | None] = {}
+
+        def extract(self, video_id: VideoId) -> PrefetchedInfo:
+            info = dict(id=video_id, title="t", duration=1)
+            if video_id == "video":
+                raise SongFiltered("not a song", info)
+            return PrefetchedInfo(info=info, expires_at=time.time() + 60)
+
+        def download_video(self, ydl, video_id: VideoId, info=None) -> SongInfo:
+            downloaded[video_id] = info
+            return SongInfo(
+                id=video_id, title="t", duration=1, channel=None, artist="a"
+            )
+
+        monkeypatch.setattr(InfoPrefetcher, "_extract", extract)
+        monkeypatch.setattr(MusicDownloader, "_download_video", download_video)
+        videos = [VideoId(id) for id in ["id1", "video", "id2"]]
+
+        results = list(downloader.download(videos, lookahead=2))
+
+        assert [r.video_id for r in results if isinstance(r, Filtered)] == ["video"]
+        assert set(downloaded) == {"id1", "id2"}
+        assert all(info is not None for info in downloaded.values())
+
+    @pytest.fixture
+    def postprocess_downloader(
+        self, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+    ) -> Iterator[MusicDownloader]:
+        def download_raw_info(self, ydl, video_id: VideoId, info=None) -> dict:
+            return dict(id=video_id, title="t", duration=1, channel=None, artist="a")
+
+        def make_postprocess_job(self, info: dict) -> PostprocessJob:
+            return PostprocessJob(info={"id": info["id"]}, metadata={})
+
+        def postprocess(job: PostprocessJob) -> PostprocessResult:
+            time.sleep(0.01)
+            if job.info["id"] == "error":
+                raise ValueError(job.info["id"])
+            return PostprocessResult(
+                filepath=f"{job.info['id']}.m4a",
+                ext="m4a",
+                converted=False,
+                cpu_seconds=0,
+            )
+
+        monkeypatch.setattr(MusicDownloader, "_build_ydl", lambda *_: None)
+        monkeypatch.setattr(MusicDownloader, "_download_raw_info", download_raw_info)
+        monkeypatch.setattr(
+            YoutubeDlBuilder, "make_postprocess_job", make_postprocess_job
+        )
+        monkeypatch.setattr(postprocessing_stage, "postprocess", postprocess)
+
+        builder = YoutubeDlBuilder(home_dir=tmp_path, tmp_dir=tmp_path)
+        with PostprocessStage(max_workers=2, executor=ThreadPoolExecutor(2)) as stage:
+            yield MusicDownloader(
+                builder,
+                rate_limiter=AimdRateLimiter(
+                    initial_rate=1000, max_rate=1000, burst=1000
+                ),
+                postprocess_stage=stage,
+            )
+
+    def test_download__postprocess_stage(self, postprocess_downloader: MusicDownloader):
+        downloader = postprocess_downloader
+        videos = [VideoId(id) for id in ["id1", "error", "id2", "id3"]]
+        results = list(downloader.download(videos, workers=2))
+
+        assert {r.video_id for r in results} == set(videos)
+        assert [r.video_id for r in results if isinstance(r, Error)] == ["error"]
+        assert downloader._ydlb.ffmpeg_stats.skipped == 3
+        assert downloader._ydlb.ffmpeg_stats.songs == {"id1": 0, "id2": 0, "id3": 0}
+        assert downloader.journal.pending() == []
+
+    def test_download__postprocess_stage_abandoned(
+        self, postprocess_downloader: MusicDownloader
+    ):
+        downloader = postprocess_downloader
+        consumed: list[VideoId] = []
+
+        def videos():
+            for i in range(100):
+                consumed.append(VideoId(f"id{i}"))
+                yield consumed[-1]
+
+        abandoned: list[DownloadResult] = []
+        results = downloader.download(
+            videos(), workers=3, on_abandoned=abandoned.append
+        )
+        yielded = [next(results)]
+        results.close()
+
+        # songs, which were waiting for post processing, aren't lost
+        assert sorted(r.video_id for r in yielded + abandoned) == sorted(consumed)
+        assert all(isinstance(r, Downloaded) for r in abandoned)
+
+    def test_download__invalid_workers(self, downloader: MusicDownloader):
+        with pytest.raises(ValueError):
+            list(downloader.download([], workers=0))
+
     INVALID_VIDEO = VideoId("NOT_VALID")
     SONG_WITH_LYRICS = VideoId("OCYdICRobEo")
     SONG_WITHOUT_LYRICS = VideoId("rVryEboMof8")
@@ -55,7 +260,9 @@ class TestMusicDownloader:
             self.SONG_WITHOUT_LYRICS,
         }
 
-        downloader = MusicDownloader(tmp_path)
+        downloader = MusicDownloader(
+            YoutubeDlBuilder(home_dir=tmp_path, tmp_dir=tmp_path)
+        )
 
         got_downloaded: set[VideoId] = set()
         got_filtered: set[VideoId] = set()
@@ -1,4 +1,5 @@
 import pathlib
+from types import SimpleNamespace
 
 import pytest
 
@@ -28,3 +29,13 @@ class TestMusicLibrary:
 
     def test_init(self, library: MusicLibrary):
         assert library is not None
+
+    def test_while_leased(self):
+        heartbeat = SimpleNamespace(lost=False)
+        songs = [object() for _ in range(3)]
+        leased = MusicLibrary._while_leased(songs, heartbeat)  # type: ignore
+
+        assert next(leased) is songs[0]
+        heartbeat.lost = True
+        # remaining songs are left to worker, which leased them after loss
+        assert list(leased) == []
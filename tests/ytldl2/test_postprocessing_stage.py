@@ -0,0 +1,91 @@
+import pathlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from mutagen.mp4 import MP4
+from ytldl2 import postprocessing_stage
+from ytldl2.postprocessing_stage import (
+    PostprocessJob,
+    PostprocessResult,
+    PostprocessStage,
+    postprocess,
+)
+
+from tests.ytldl2 import DATA
+
+
+@pytest.fixture
+def audio_file(tmp_path: pathlib.Path) -> pathlib.Path:
+    copy_to = tmp_path / "audio.m4a"
+    copy_to.write_bytes((DATA / "test_audio_no_tags.m4a").read_bytes())
+    return copy_to
+
+
+def test_postprocess__m4a(audio_file: pathlib.Path):
+    job = PostprocessJob(
+        info={
+            "id": "id",
+            "filepath": str(audio_file),
+            "ext": "m4a",
+            "acodec": "mp4a.40.2",
+            "duration": 3,
+        },
+        metadata={"artist": "artist", "title": "title"},
+    )
+
+    result = postprocess(job)
+
+    assert result.filepath == str(audio_file)
+    assert not result.converted
+    tags = MP4(str(audio_file)).tags
+    assert tags
+    assert tags["©ART"] == ["artist"]
+
+
+class TestPostprocessStage:
+    def test_submit__backpressure(self, monkeypatch: pytest.MonkeyPatch):
+        released = threading.Event()
+
+        def postprocess(job: PostprocessJob) -> PostprocessResult:
+            assert released.wait(timeout=5)
+            return PostprocessResult("f", "m4a", False, 0)
+
+        monkeypatch.setattr(postprocessing_stage, "postprocess", postprocess)
+        job = PostprocessJob(info={}, metadata={})
+
+        with PostprocessStage(
+            max_workers=1, max_pending=1, executor=ThreadPoolExecutor(1)
+        ) as stage:
+            first = stage.submit(job)
+            submitted = threading.Event()
+
+            def submit():
+                stage.submit(job)
+                submitted.set()
+
+            thread = threading.Thread(target=submit)
+            thread.start()
+            # second job waits for a free slot
+            assert not submitted.wait(timeout=0.1)
+
+            released.set()
+            assert first.result(timeout=5).filepath == "f"
+            assert submitted.wait(timeout=5)
+            thread.join()
+
+    @pytest.mark.slow
+    def test_submit__process_pool(self, audio_file: pathlib.Path):
+        job = PostprocessJob(
+            info={
+                "id": "id",
+                "filepath": str(audio_file),
+                "ext": "m4a",
+                "acodec": "mp4a.40.2",
+            },
+            metadata={"title": "title"},
+        )
+        with PostprocessStage(max_workers=1) as stage:
+            result = stage.submit(job).result(timeout=60)
+        assert result.filepath == str(audio_file)
+        assert MP4(str(audio_file)).tags["©nam"] == ["title"]  # type: ignore
@@ -1,12 +1,19 @@
+import pathlib
+from datetime import timedelta
+
 import pytest
 import requests
+from yt_dlp.postprocessor.ffmpeg import FFmpegExtractAudioPP
+from yt_dlp.utils import PostProcessingError
 from ytldl2.postprocessors import (
+    ExtractAudioPP,
     FilterSongPP,
     LyricsPP,
     MetadataPP,
     RetainMainArtistPP,
     SongFiltered,
 )
+from ytldl2.sqlite_cache import SqliteCache
 
 from tests.ytldl2 import DATA
 
@@ -48,6 +55,76 @@ class TestLyricsPP:
         assert info["lyrics"] == ""
 
 
+class FakeYTMusic:
+    def __init__(self, browse_ids: dict[str, str | None], lyrics: dict[str, str]):
+        self.browse_ids = browse_ids
+        self.lyrics = lyrics
+        self.calls: list[str] = []
+
+    def get_watch_playlist(self, video_id: str) -> dict:
+        self.calls.append("get_watch_playlist")
+        return {"lyrics": self.browse_ids[video_id]}
+
+    def get_lyrics(self, browse_id: str) -> dict:
+        self.calls.append("get_lyrics")
+        return {"lyrics": self.lyrics.get(browse_id)}
+
+
+class TestLyricsPPCache:
+    @pytest.fixture
+    def fake_yt(self) -> FakeYTMusic:
+        return FakeYTMusic(
+            browse_ids={"song": "browse", "same_song": "browse", "no_lyrics": None},
+            lyrics={"browse": "lyrics"},
+        )
+
+    @pytest.fixture
+    def lyrics_pp(self, fake_yt: FakeYTMusic) -> LyricsPP:
+        lyrics_pp = LyricsPP(cache=SqliteCache())
+        lyrics_pp.yt = fake_yt  # type: ignore
+        return lyrics_pp
+
+    def test_get_lyrics__cached(self, lyrics_pp: LyricsPP, fake_yt: FakeYTMusic):
+        assert lyrics_pp.get_lyrics("song") == "lyrics"
+        assert lyrics_pp.get_lyrics("song") == "lyrics"
+        assert fake_yt.calls == ["get_watch_playlist", "get_lyrics"]
+        assert (lyrics_pp.stats.hits, lyrics_pp.stats.misses) == (1, 1)
+
+    def test_get_lyrics__cached_by_browse_id(
+        self, lyrics_pp: LyricsPP, fake_yt: FakeYTMusic
+    ):
+        assert lyrics_pp.get_lyrics("song") == "lyrics"
+        assert lyrics_pp.get_lyrics("same_song") == "lyrics"
+        assert fake_yt.calls == [
+            "get_watch_playlist",
+            "get_lyrics",
+            "get_watch_playlist",
+        ]
+
+    def test_get_lyrics__no_lyrics_cached(
+        self, lyrics_pp: LyricsPP, fake_yt: FakeYTMusic
+    ):
+        assert lyrics_pp.get_lyrics("no_lyrics") is None
+        assert lyrics_pp.get_lyrics("no_lyrics") is None
+        assert fake_yt.calls == ["get_watch_playlist"]
+
+    def test_get_lyrics__no_lyrics_expired(
+        self, lyrics_pp: LyricsPP, fake_yt: FakeYTMusic
+    ):
+        lyrics_pp._no_lyrics_ttl = timedelta(0)
+        assert lyrics_pp.get_lyrics("no_lyrics") is None
+        assert lyrics_pp.get_lyrics("no_lyrics") is None
+        assert fake_yt.calls == ["get_watch_playlist", "get_watch_playlist"]
+        assert lyrics_pp.stats.misses == 2
+
+    def test_get_lyrics__broken_cache(self, fake_yt: FakeYTMusic):
+        cache = SqliteCache()
+        cache.close()
+        lyrics_pp = LyricsPP(cache=cache)
+        lyrics_pp.yt = fake_yt  # type: ignore
+        assert lyrics_pp.get_lyrics("song") == "lyrics"
+
+
 class TestMetadataPP:
     info = {
         "artist": "artist",
@@ -78,12 +155,85 @@ class TestMetadataPP:
 
     def test_get_image_bytes(self, monkeypatch: pytest.MonkeyPatch):
         res = requests.Response()
+        res.status_code = 200
         res._content = (DATA / "img.jpg").read_bytes()
 
-        monkeypatch.setattr("ytldl2.postprocessors.requests.get", lambda *_: res)
+        monkeypatch.setattr(requests.Session, "get", lambda *_, **__: res)
         assert MetadataPP().get_image_bytes("url")
 
 
+class TestExtractAudioPP:
+    @pytest.fixture
+    def extract_audio_pp(self, monkeypatch: pytest.MonkeyPatch) -> ExtractAudioPP:
+        pp = ExtractAudioPP()
+        monkeypatch.setattr(pp, "to_screen", lambda *args, **kwargs: None)
+        return pp
+
+    def test_run__m4a_aac(
+        self, extract_audio_pp: ExtractAudioPP, monkeypatch: pytest.MonkeyPatch
+    ):
+        def fail(*args, **kwargs):
+            raise AssertionError("ffmpeg shouldn't be run")
+
+        monkeypatch.setattr(FFmpegExtractAudioPP, "get_audio_codec", fail)
+        monkeypatch.setattr(extract_audio_pp, "run_ffmpeg", fail)
+        info = {
+            "id": "id",
+            "filepath": "song.m4a",
+            "ext": "m4a",
+            "acodec": "mp4a.40.2",
+            "duration": 180,
+        }
+        assert extract_audio_pp.run(info) == ([], info)
+        assert extract_audio_pp.stats.skipped == 1
+        assert extract_audio_pp.stats.converted == 0
+        assert extract_audio_pp.stats.songs == {"id": 0}
+
+    def test_run__aac_in_other_container(
+        self,
+        extract_audio_pp: ExtractAudioPP,
+        monkeypatch: pytest.MonkeyPatch,
+        tmp_path: pathlib.Path,
+    ):
+        def fail(*args, **kwargs):
+            raise AssertionError("ffprobe shouldn't be run")
+
+        ffmpeg_calls = []
+
+        def run_ffmpeg(path, out_path, codec, more_opts):
+            ffmpeg_calls.append(codec)
+            pathlib.Path(out_path).touch()
+
+        monkeypatch.setattr(FFmpegExtractAudioPP, "get_audio_codec", fail)
+        monkeypatch.setattr(extract_audio_pp, "run_ffmpeg", run_ffmpeg)
+        path = tmp_path / "song.mp4"
+        path.touch()
+        info = {
+            "id": "id",
+            "filepath": str(path),
+            "ext": "mp4",
+            "acodec": "mp4a.40.2",
+        }
+
+        extract_audio_pp.run(info)
+
+        assert ffmpeg_calls == ["copy"]
+        assert info["ext"] == "m4a"
+        assert extract_audio_pp.stats.converted == 1
+        assert list(extract_audio_pp.stats.songs) == ["id"]
+
+    def test_run__not_aac(
+        self, extract_audio_pp: ExtractAudioPP, monkeypatch: pytest.MonkeyPatch
+    ):
+        monkeypatch.setattr(
+            FFmpegExtractAudioPP, "get_audio_codec", lambda self, path: None
+        )
+        info = {"id": "id", "filepath": "song.webm", "ext": "webm", "acodec": "opus"}
+        with pytest.raises(PostProcessingError):
+            extract_audio_pp.run(info)
+        assert extract_audio_pp.stats.converted == 0
+
+
 class TestFilterSongPP:
     @pytest.fixture
     def filter_song_pp(self) -> FilterSongPP:
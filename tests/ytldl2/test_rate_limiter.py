@@ -0,0 +1,73 @@
+from time import monotonic
+
+import pytest
+from yt_dlp.utils import DownloadError
+from ytldl2.cancellation_tokens import CancellationToken
+from ytldl2.rate_limiter import AimdRateLimiter, is_throttling_error
+
+
+class TestIsThrottlingError:
+    @pytest.mark.parametrize(
+        "error",
+        [
+            DownloadError(
+                "ERROR: unable to download: HTTP Error 429: Too Many Requests"
+            ),
+            DownloadError("ERROR: HTTP Error 403: Forbidden"),
+        ],
+    )
+    def test_throttling(self, error: Exception):
+        assert is_throttling_error(error)
+
+    def test_throttling_cause(self):
+        try:
+            try:
+                raise ValueError("HTTP Error 429")
+            except ValueError as e:
+                raise RuntimeError("wrapped") from e
+        except RuntimeError as e:
+            assert is_throttling_error(e)
+
+    def test_not_throttling(self):
+        assert not is_throttling_error(DownloadError("Video unavailable"))
+
+
+class TestAimdRateLimiter:
+    def test_init_invalid(self):
+        with pytest.raises(ValueError):
+            AimdRateLimiter(initial_rate=1, max_rate=0.5)
+
+    def test_on_success(self):
+        limiter = AimdRateLimiter(initial_rate=0.1, max_rate=0.15, increase=0.1)
+        limiter.on_success()
+        assert limiter.rate == 0.15
+
+    def test_on_error__throttling(self):
+        limiter = AimdRateLimiter(initial_rate=0.1, min_rate=0.01, decrease=0.5)
+        limiter.on_error(DownloadError("HTTP Error 429"))
+        assert limiter.rate == 0.05
+        for _ in range(10):
+            limiter.on_error(DownloadError("HTTP Error 429"))
+        assert limiter.rate == 0.01
+
+    def test_on_error__not_throttling(self):
+        limiter = AimdRateLimiter(initial_rate=0.1)
+        limiter.on_error(DownloadError("Video unavailable"))
+        assert limiter.rate == 0.1
+
+    def test_acquire(self):
+        limiter = AimdRateLimiter(initial_rate=20, max_rate=20, burst=1)
+        token = CancellationToken()
+        now = monotonic()
+        for _ in range(3):
+            assert limiter.acquire(token)
+        assert monotonic() - now >= 0.09
+
+    def test_acquire__cancelled(self):
+        limiter = AimdRateLimiter(initial_rate=0.01, burst=1)
+        token = CancellationToken()
+        assert limiter.acquire(token)
+        token.request_kill()
+        now = monotonic()
+        assert not limiter.acquire(token)
+        assert monotonic() - now < 1
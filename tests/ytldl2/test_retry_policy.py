@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+import pytest
+from yt_dlp.utils import DownloadError, ExtractorError, GeoRestrictedError
+from ytldl2.models.types import VideoId
+from ytldl2.retry_policy import RetryPolicy, classify_error
+
+NOW = datetime(2024, 1, 1)
+
+
+class TestClassifyError:
+    @pytest.mark.parametrize(
+        "error, kind",
+        [
+            (DownloadError("ERROR: HTTP Error 429: Too Many Requests"), "rate_limited"),
+            (DownloadError("ERROR: [youtube] id: Video unavailable"), "permanent"),
+            (
+                DownloadError(
+                    "ERROR: wrapped",
+                    exc_info=(GeoRestrictedError, GeoRestrictedError("geo"), None),
+                ),
+                "permanent",
+            ),
+            (ExtractorError("Private video. Sign in"), "permanent"),
+            (DownloadError("ERROR: Read timed out"), "transient"),
+            (ConnectionResetError(), "transient"),
+        ],
+    )
+    def test_classify(self, error: Exception, kind: str):
+        assert classify_error(error) == kind
+
+
+class TestRetryPolicy:
+    @pytest.fixture
+    def policy(self) -> RetryPolicy:
+        return RetryPolicy(
+            base_delay=timedelta(hours=1),
+            max_delay=timedelta(hours=3),
+            max_attempts=4,
+            max_permanent_attempts=2,
+        )
+
+    def test_backoff(self, policy: RetryPolicy):
+        state = None
+        delays = []
+        for _ in range(3):
+            state = policy.on_error(VideoId("id"), TimeoutError(), state, NOW)
+            assert state.next_attempt is not None
+            delays.append(state.next_attempt - NOW)
+        assert delays == [timedelta(hours=1), timedelta(hours=2), timedelta(hours=3)]
+
+        state = policy.on_error(VideoId("id"), TimeoutError(), state, NOW)
+        assert state.attempts == 4
+        assert state.quarantined
+
+    def test_permanent(self, policy: RetryPolicy):
+        error = DownloadError("Video unavailable")
+        state = policy.on_error(VideoId("id"), error, None, NOW)
+        assert (state.kind, state.attempts) == ("permanent", 1)
+        state = policy.on_error(VideoId("id"), error, state, NOW)
+        assert state.quarantined
+
+    def test_rate_limited_isnt_counted(self, policy: RetryPolicy):
+        error = DownloadError("HTTP Error 429")
+        state = policy.on_error(VideoId("id"), error, None, NOW)
+        state = policy.on_error(VideoId("id"), error, state, NOW)
+        assert (state.kind, state.attempts) == ("rate_limited", 0)
+        assert not state.quarantined
@@ -0,0 +1,43 @@
+import socket
+import threading
+import time
+
+import pytest
+import requests
+from ytldl2.session import session_build
+
+
+@pytest.fixture
+def hung_server():
+    """Accepts connections, but never responds."""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    connections: list[socket.socket] = []
+
+    def accept():
+        try:
+            while True:
+                connections.append(server.accept()[0])
+        except OSError:
+            pass
+
+    threading.Thread(target=accept, daemon=True).start()
+    yield f"http://127.0.0.1:{server.getsockname()[1]}"
+    server.close()
+    for connection in connections:
+        connection.close()
+
+
+def test_session_build__timeout(hung_server: str):
+    session = session_build(proxy=None, timeout=0.2)
+    started = time.monotonic()
+    with pytest.raises(requests.Timeout):
+        session.get(hung_server)
+    assert time.monotonic() - started < 5
+
+
+def test_session_build__own_timeout(hung_server: str):
+    session = session_build(proxy=None, timeout=60)
+    with pytest.raises(requests.Timeout):
+        session.get(hung_server, timeout=0.2)
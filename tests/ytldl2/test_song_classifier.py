@@ -0,0 +1,43 @@
+import pytest
+from ytldl2.models.types import Artist, Title, VideoId
+from ytldl2.models.video import Video
+from ytldl2.song_classifier import SongClassifier
+
+
+def video(artist: str | None = "artist", video_type: str | None = None) -> Video:
+    return Video(
+        video_id=VideoId("id"),
+        title=Title("title"),
+        artist=Artist(artist) if artist else None,
+        video_type=video_type,
+    )
+
+
+class TestSongClassifier:
+    @pytest.fixture
+    def classifier(self) -> SongClassifier:
+        return SongClassifier()
+
+    @pytest.mark.parametrize(
+        "video_type", [None, "MUSIC_VIDEO_TYPE_ATV", "MUSIC_VIDEO_TYPE_OMV"]
+    )
+    def test_filtered_reason__song(self, classifier: SongClassifier, video_type):
+        assert classifier.filtered_reason(video(video_type=video_type)) is None
+        assert classifier.avoided_calls == 0
+
+    def test_filtered_reason__no_artist(self, classifier: SongClassifier):
+        # is dropped by library anyway, it isn't an avoided call
+        assert classifier.filtered_reason(video(artist=None)) is None
+        assert classifier.avoided_calls == 0
+
+    @pytest.mark.parametrize(
+        "video_type", ["MUSIC_VIDEO_TYPE_UGC", "MUSIC_VIDEO_TYPE_PODCAST_EPISODE"]
+    )
+    def test_filtered_reason__not_song_type(
+        self, classifier: SongClassifier, video_type
+    ):
+        assert classifier.filtered_reason(video(video_type=video_type))
+        assert classifier.avoided_calls == 1
+
+    def test_video_type__not_compared(self):
+        assert video(video_type="MUSIC_VIDEO_TYPE_ATV") == video()
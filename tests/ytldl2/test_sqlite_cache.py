@@ -1,12 +1,20 @@
+import json
 import pathlib
 import sqlite3
+import threading
+import zlib
 from copy import copy
-from time import sleep
+from datetime import datetime, timedelta
+from time import perf_counter, sleep
 
 import pytest
 from ytldl2.models.info import SongInfo
-from ytldl2.models.types import VideoId
+from ytldl2.models.song import Song
+from ytldl2.models.types import Artist, BrowseId, PlaylistId, Title, VideoId
+from ytldl2.models.video import Video
 from ytldl2.protocols.cache import CachedVideo
+from ytldl2.protocols.playlist_snapshot_cache import PlaylistSnapshot
+from ytldl2.protocols.retry_cache import RetryState
 from ytldl2.sqlite_cache import SqliteCache
 
 from tests.ytldl2 import DATA
@@ -131,3 +139,312 @@ class TestSqliteCache:
         cache.set_info(info)
         cached_info = cache.get_info(info.id)
         assert info == cached_info
+
+    def test_contains(self, cache: SqliteCache):
+        assert MOCK_VIDEO.video_id not in cache
+        cache.set(MOCK_VIDEO)
+        assert MOCK_VIDEO.video_id in cache
+
+    def test_filter_cached(self, cache: SqliteCache, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(SqliteCache, "MAX_SQL_VARIABLES", 3)
+        for i in range(0, 10, 2):
+            cache.set(CachedVideo(video_id=VideoId(f"id{i}"), filtered_reason=None))
+        videos = [
+            Song(VideoId(f"id{i}"), Title("title"), Artist("a")) for i in range(10)
+        ]
+
+        filtered = cache.filter_cached(videos + videos)
+
+        assert [v.video_id for v in filtered] == [f"id{i}" for i in range(1, 10, 2)] * 2
+
+    @pytest.mark.slow
+    def test_filter_cached__benchmark(self, cache: SqliteCache):
+        ROWS = 1_000_000
+        CANDIDATES = 5_000
+        cache.conn.executemany(
+            "INSERT INTO cache (video_id, filtered_reason, last_modified) "
+            "VALUES (?, NULL, '');",
+            ((f"id{i}",) for i in range(ROWS)),
+        )
+        cache.conn.commit()
+        # half of candidates are cached
+        videos = [
+            Song(VideoId(f"id{i}"), Title("title"), Artist("a"))
+            for i in range(ROWS - CANDIDATES // 2, ROWS + CANDIDATES // 2)
+        ]
+
+        start = perf_counter()
+        filtered = cache.filter_cached(videos)
+        filter_elapsed = perf_counter() - start
+
+        start = perf_counter()
+        assert len(cache) == ROWS
+        len_elapsed = perf_counter() - start
+
+        print(f"\nfilter_cached: {filter_elapsed:.3f}s, len: {len_elapsed:.3f}s")
+        assert len(filtered) == CANDIDATES // 2
+        assert filter_elapsed < 1
+        assert len_elapsed < 1
+
+    def test_wal_mode(self, cache: SqliteCache):
+        journal_mode = cache.conn.execute("PRAGMA journal_mode;").fetchone()[0]
+        assert journal_mode == "wal"
+
+    def test_write_behind(self, tmp_path: pathlib.Path):
+        cache = SqliteCache(
+            tmp_path / "cache.db", write_behind=True, flush_every=3, flush_interval=60
+        )
+        reader = SqliteCache(tmp_path / "cache.db")
+
+        cache.set(MOCK_VIDEO)
+        cache.set_info(self.SONG_INFO)
+        # pending writes are visible for writer only
+        assert MOCK_VIDEO.video_id in cache
+        assert MOCK_VIDEO.video_id not in reader
+        assert reader.get_info(self.SONG_INFO.id) is None
+
+        cache.set(CachedVideo(video_id=VideoId("third"), filtered_reason=None))
+        assert len(reader) == 2
+
+        cache.set(CachedVideo(video_id=VideoId("fourth"), filtered_reason=None))
+        assert len(reader) == 2
+        cache.close()
+        assert len(reader) == 3
+
+    def test_write_behind__flush_interval(self, tmp_path: pathlib.Path):
+        cache = SqliteCache(tmp_path / "cache.db", write_behind=True, flush_interval=0)
+        reader = SqliteCache(tmp_path / "cache.db")
+        cache.set(MOCK_VIDEO)
+        assert MOCK_VIDEO.video_id in reader
+
+    def test_set_many(self, cache: SqliteCache):
+        videos = [
+            CachedVideo(video_id=VideoId(f"id{i}"), filtered_reason=None)
+            for i in range(5)
+        ]
+        cache.set_many(videos)
+        assert set(cache) == {v.video_id for v in videos}
+
+    def test_set_infos(self, cache: SqliteCache):
+        infos = [self.SONG_INFO.model_copy(update={"id": f"id{i}"}) for i in range(5)]
+        cache.set_infos(infos)
+        assert cache.get_infos([info.id for info in infos]) == {
+            info.id: info for info in infos
+        }
+
+    def test_get_infos(self, cache: SqliteCache, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(SqliteCache, "MAX_SQL_VARIABLES", 2)
+        infos = [self.SONG_INFO.model_copy(update={"id": f"id{i}"}) for i in range(5)]
+        cache.set_infos(infos)
+
+        ids = [VideoId("unknown"), *(info.id for info in infos)]
+        got = cache.get_infos(ids)
+
+        assert list(got) == ids
+        assert got["unknown"] is None
+        assert [got[info.id] for info in infos] == infos
+
+    def test_iter_infos(self, cache: SqliteCache):
+        infos = [self.SONG_INFO.model_copy(update={"id": f"id{i}"}) for i in range(7)]
+        cache.set_infos(reversed(infos))
+
+        for page_size in [1, 3, 7, 100]:
+            assert list(cache.iter_infos(page_size=page_size)) == infos
+
+    def test_iter_infos__empty(self, cache: SqliteCache):
+        assert list(cache.iter_infos()) == []
+
+    @pytest.mark.parametrize("write_behind", [False, True])
+    @pytest.mark.parametrize("in_memory", [False, True])
+    def test_thread_safe__stress(
+        self, tmp_path: pathlib.Path, write_behind: bool, in_memory: bool
+    ):
+        THREADS = 16
+        ITEMS = 50
+        cache = SqliteCache(
+            ":memory:" if in_memory else tmp_path / "cache.db",
+            write_behind=write_behind,
+            flush_every=7,
+            thread_safe=True,
+        )
+        errors: list[Exception] = []
+        barrier = threading.Barrier(THREADS)
+
+        def work(thread: int):
+            try:
+                barrier.wait()
+                for i in range(ITEMS):
+                    video_id = VideoId(f"{thread}-{i}")
+                    cache.set(CachedVideo(video_id=video_id, filtered_reason=None))
+                    cache.set_info(self.SONG_INFO.model_copy(update={"id": video_id}))
+                    # other threads' writes are being read meanwhile
+                    VideoId(f"{(thread + 1) % THREADS}-{i}") in cache
+                    if not write_behind:
+                        assert video_id in cache
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        cache.flush()
+
+        assert not errors
+        assert len(cache) == THREADS * ITEMS
+        assert len(list(cache.iter_infos())) == THREADS * ITEMS
+        cache.close()
+
+    def test_not_thread_safe(self, cache: SqliteCache):
+        errors: list[Exception] = []
+
+        def work():
+            try:
+                MOCK_VIDEO.video_id in cache
+            except Exception as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+        assert isinstance(errors[0], sqlite3.ProgrammingError)
+
+    def test_lyrics(self, cache: SqliteCache):
+        assert cache.get_lyrics(VideoId("id")) is None
+        cache.set_lyrics(VideoId("id"), BrowseId("browse_id"), "lyrics")
+        cache.set_lyrics(VideoId("no_lyrics"), None, None)
+
+        cached = cache.get_lyrics(VideoId("id"))
+        assert cached is not None
+        assert (cached.browse_id, cached.lyrics) == ("browse_id", "lyrics")
+        cached = cache.get_lyrics(VideoId("no_lyrics"))
+        assert cached is not None
+        assert (cached.browse_id, cached.lyrics) == (None, None)
+
+    def test_lyrics_by_browse_id(self, cache: SqliteCache):
+        assert cache.get_lyrics_by_browse_id(BrowseId("browse_id")) is None
+        cache.set_lyrics(VideoId("id"), BrowseId("browse_id"), "lyrics")
+        cached = cache.get_lyrics_by_browse_id(BrowseId("browse_id"))
+        assert cached is not None
+        assert (cached.video_id, cached.lyrics) == ("id", "lyrics")
+
+    def test_response(self, cache: SqliteCache):
+        response = {"tracks": [{"videoId": "id"}]}
+        assert cache.get_response("key", timedelta(hours=1)) is None
+        cache.set_response("key", response)
+        assert cache.get_response("key", timedelta(hours=1)) == response
+        assert cache.get_response("key", timedelta(0)) is None
+
+    def test_response__lru_eviction(self):
+        response = {"data": "x" * 1000}
+        size = len(zlib.compress(json.dumps(response).encode()))
+        cache = SqliteCache(
+            max_responses_size=2 * size, response_access_resolution=timedelta(0)
+        )
+        cache.set_response("first", response)
+        cache.set_response("second", response)
+        sleep(0.01)
+        # first becomes recently used
+        assert cache.get_response("first", timedelta(hours=1))
+        cache.set_response("third", response)
+
+        assert cache.get_response("second", timedelta(hours=1)) is None
+        assert cache.get_response("first", timedelta(hours=1)) == response
+        assert cache.get_response("third", timedelta(hours=1)) == response
+
+    def test_response__read_doesnt_write(self, cache: SqliteCache):
+        cache.set_response("key", {"data": "x"})
+        changes = cache.conn.total_changes
+        assert cache.get_response("key", timedelta(hours=1))
+        assert cache.conn.total_changes == changes
+
+    def test_response__replaced_size(self):
+        response = {"data": "x" * 1000}
+        size = len(zlib.compress(json.dumps(response).encode()))
+        cache = SqliteCache(max_responses_size=2 * size)
+        # replaced response isn't counted twice
+        for _ in range(3):
+            cache.set_response("first", response)
+        cache.set_response("second", response)
+
+        assert cache.get_response("first", timedelta(hours=1)) == response
+        assert cache.get_response("second", timedelta(hours=1)) == response
+
+    def test_playlist_snapshot(self, cache: SqliteCache):
+        playlist_id = PlaylistId("playlist")
+        assert cache.get_playlist_snapshot(playlist_id) is None
+        video_ids = [VideoId("a"), VideoId("b")]
+        cache.set_playlist_snapshot(PlaylistSnapshot.of(playlist_id, video_ids, 10))
+        cache.set_playlist_snapshot(PlaylistSnapshot.of(playlist_id, video_ids, 2))
+
+        snapshot = cache.get_playlist_snapshot(playlist_id)
+        assert snapshot is not None
+        assert (snapshot.video_ids, snapshot.track_count) == (video_ids, 2)
+        assert snapshot.hash == PlaylistSnapshot.hash_of(video_ids)
+
+    @staticmethod
+    def _songs(*ids: str) -> list[Song]:
+        return [
+            Song(video_id=VideoId(id), title=Title(id), artist=Artist("a"))
+            for id in ids
+        ]
+
+    def test_job_queue(self, cache: SqliteCache):
+        assert cache.enqueue(self._songs("a", "b", "c")) == 3
+        # queued songs aren't duplicated
+        assert cache.enqueue(self._songs("a")) == 0
+
+        assert cache.claim(limit=2) == self._songs("a", "b")
+        assert cache.count_jobs("in_progress") == 2
+        cache.finish(VideoId("a"), "done")
+        cache.finish(VideoId("b"), "failed")
+        # done jobs are removed
+        assert cache.count_jobs("done") == 0
+        assert cache.count_jobs("failed") == 1
+        assert cache.claim() == self._songs("c")
+        assert cache.claim() == []
+
+        # finished songs can be queued again
+        assert cache.enqueue(self._songs("a", "b")) == 2
+        assert cache.count_jobs("pending") == 2
+
+    def test_job_queue__reclaim_after_restart(self, tmp_path: pathlib.Path):
+        cache = SqliteCache(tmp_path / "cache.db", write_behind=True)
+        cache.enqueue(self._songs("a", "b"))
+        assert cache.claim(limit=1) == self._songs("a")
+        cache.close()
+
+        cache = SqliteCache(tmp_path / "cache.db")
+        assert cache.reclaim() == 1
+        assert cache.claim() == self._songs("a", "b")
+
+    def test_retries(self, cache: SqliteCache):
+        now = datetime.now()
+        states = [
+            RetryState(
+                video_id=VideoId(id),
+                kind="transient",
+                error="error",
+                attempts=1,
+                next_attempt=next_attempt,
+            )
+            for id, next_attempt in [
+                ("due", now - timedelta(minutes=1)),
+                ("not_due", now + timedelta(hours=1)),
+                ("quarantined", None),
+            ]
+        ]
+        for state in states:
+            cache.set_retry(state)
+        assert cache.get_retry(VideoId("quarantined")) == states[2]
+
+        videos = [
+            Video(video_id=VideoId(id), title=Title(id), artist=None)
+            for id in ["due", "not_due", "quarantined", "never_failed"]
+        ]
+        due = cache.filter_not_due(videos, now)
+        assert [v.video_id for v in due] == ["due", "never_failed"]
+
+        cache.remove_retry(VideoId("not_due"))
+        assert cache.get_retry(VideoId("not_due")) is None
@@ -0,0 +1,121 @@
+import pathlib
+import threading
+from datetime import timedelta
+from time import sleep
+
+import pytest
+from ytldl2.lease_heartbeat import LeaseHeartbeat
+from ytldl2.models.download_result import Error
+from ytldl2.models.song import Song
+from ytldl2.models.types import Artist, Title, VideoId
+from ytldl2.sqlite_coordinator import SqliteCoordinator
+
+LEASE = timedelta(minutes=10)
+
+
+def songs(*ids: str) -> list[Song]:
+    return [
+        Song(video_id=VideoId(id), title=Title(id), artist=Artist("a")) for id in ids
+    ]
+
+
+class TestSqliteCoordinator:
+    @pytest.fixture
+    def db_path(self, tmp_path: pathlib.Path) -> pathlib.Path:
+        return tmp_path / "coordinator.db"
+
+    @pytest.fixture
+    def coordinator(self, db_path: pathlib.Path) -> SqliteCoordinator:
+        return SqliteCoordinator(db_path)
+
+    def test_submit(self, coordinator: SqliteCoordinator):
+        assert coordinator.submit(songs("a", "b")) == 2
+        assert coordinator.submit(songs("a", "c")) == 1
+
+    def test_lease(self, coordinator: SqliteCoordinator, db_path: pathlib.Path):
+        coordinator.submit(songs("a", "b", "c"))
+        # other machine shares db
+        other = SqliteCoordinator(db_path)
+
+        first = coordinator.lease("first", 2, LEASE)
+        second = other.lease("second", 2, LEASE)
+        assert first is not None and second is not None
+        assert first.songs == songs("a", "b")
+        assert second.songs == songs("c")
+        assert coordinator.lease("first", 2, LEASE) is None
+
+    def test_report_and_release(self, coordinator: SqliteCoordinator):
+        coordinator.submit(songs("a", "b"))
+        lease = coordinator.lease("worker", 2, LEASE)
+        assert lease is not None
+        coordinator.report(lease, Error(VideoId("a"), ValueError("failed")))
+        coordinator.release(lease)
+
+        # unreported song is leased again
+        lease = coordinator.lease("worker", 2, LEASE)
+        assert lease is not None and lease.songs == songs("b")
+        # failed song can be submitted again
+        assert coordinator.submit(songs("a")) == 1
+
+    def test_expired_lease(self, coordinator: SqliteCoordinator):
+        coordinator.submit(songs("a"))
+        lost = coordinator.lease("dead", 1, timedelta(0))
+        assert lost is not None
+        sleep(0.01)
+
+        lease = coordinator.lease("alive", 1, LEASE)
+        assert lease is not None and lease.songs == songs("a")
+        assert not coordinator.heartbeat(lost, LEASE)
+        assert coordinator.heartbeat(lease, LEASE)
+
+    def test_partly_reported_lease_lost(self, coordinator: SqliteCoordinator):
+        coordinator.submit(songs("a", "b", "c"))
+        lost = coordinator.lease("dead", 3, timedelta(0))
+        assert lost is not None
+        coordinator.report(lost, Error(VideoId("a"), ValueError("failed")))
+        sleep(0.01)
+
+        lease = coordinator.lease("alive", 3, LEASE)
+        assert lease is not None and lease.songs == songs("b", "c")
+        assert not coordinator.heartbeat(lost, LEASE)
+
+    def test_reported_lease_kept(self, coordinator: SqliteCoordinator):
+        coordinator.submit(songs("a", "b"))
+        lease = coordinator.lease("worker", 2, LEASE)
+        assert lease is not None
+        for video_id in ("a", "b"):
+            coordinator.report(lease, Error(VideoId(video_id), ValueError("failed")))
+            assert coordinator.heartbeat(lease, LEASE)
+
+    def test_concurrent_leases(self, db_path: pathlib.Path):
+        SqliteCoordinator(db_path).submit(songs(*map(str, range(30))))
+        leased: list[VideoId] = []
+        lock = threading.Lock()
+
+        def work(worker_id: str):
+            coordinator = SqliteCoordinator(db_path)
+            while (lease := coordinator.lease(worker_id, 3, LEASE)) is not None:
+                with lock:
+                    leased.extend(song.video_id for song in lease.songs)
+
+        threads = [threading.Thread(target=work, args=(str(i),)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(leased) == sorted(map(str, range(30)))
+
+
+class TestLeaseHeartbeat:
+    def test_extends_lease(self, tmp_path: pathlib.Path):
+        coordinator = SqliteCoordinator(tmp_path / "coordinator.db")
+        coordinator.submit(songs("a"))
+        duration = timedelta(seconds=0.2)
+        lease = coordinator.lease("worker", 1, duration)
+        assert lease is not None
+
+        with LeaseHeartbeat(coordinator, lease, duration) as heartbeat:
+            sleep(0.5)
+            # lease is kept alive, though its duration passed
+            assert coordinator.lease("other", 1, duration) is None
+        assert not heartbeat.lost
@@ -0,0 +1,119 @@
+import os
+import pathlib
+import threading
+import time
+from datetime import timedelta
+from io import BytesIO
+
+import pytest
+import requests
+from PIL import Image
+from ytldl2.thumbnail_cache import ThumbnailCache
+
+from tests.ytldl2 import DATA
+
+
+class FakeSession:
+    def __init__(self, image: bytes) -> None:
+        self.image = image
+        self.urls: list[str] = []
+        self._lock = threading.Lock()
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        with self._lock:
+            self.urls.append(url)
+        res = requests.Response()
+        res.status_code = 200
+        res._content = self.image
+        return res
+
+
+def make_image(width: int, height: int, format: str = "PNG") -> bytes:
+    res = BytesIO()
+    Image.new("RGBA", (width, height), "red").save(res, format=format)
+    return res.getvalue()
+
+
+class TestThumbnailCache:
+    @pytest.fixture
+    def session(self) -> FakeSession:
+        return FakeSession(make_image(1200, 600))
+
+    @pytest.fixture
+    def cache(self, tmp_path: pathlib.Path, session: FakeSession) -> ThumbnailCache:
+        return ThumbnailCache(cache_dir=tmp_path, session=session)  # type: ignore
+
+    def test_get__normalized(self, cache: ThumbnailCache):
+        img = Image.open(BytesIO(cache.get("url")))
+        assert img.format == "JPEG"
+        assert img.size == (544, 272)
+
+    def test_get__png_no_resize(self, session: FakeSession):
+        cache = ThumbnailCache(
+            session=session, format="png", max_size=None  # type: ignore
+        )
+        img = Image.open(BytesIO(cache.get("url")))
+        assert img.format == "PNG"
+        assert img.size == (1200, 600)
+
+    def test_get__jpg(self, cache: ThumbnailCache, session: FakeSession):
+        session.image = (DATA / "img.jpg").read_bytes()
+        assert Image.open(BytesIO(cache.get("url"))).size == (10, 8)
+
+    def test_get__cached(self, cache: ThumbnailCache, session: FakeSession):
+        assert cache.get("url") == cache.get("url")
+        assert session.urls == ["url"]
+        assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+
+    def test_get__content_addressed(
+        self, tmp_path: pathlib.Path, cache: ThumbnailCache
+    ):
+        cache.get("url1")
+        cache.get("url2")
+        assert len(list(tmp_path.glob("*.jpg"))) == 1
+
+    def test_get__persistent(
+        self, tmp_path: pathlib.Path, cache: ThumbnailCache, session: FakeSession
+    ):
+        image = cache.get("url")
+        new_cache = ThumbnailCache(cache_dir=tmp_path, session=session)  # type: ignore
+        assert new_cache.get("url") == image
+        assert session.urls == ["url"]
+
+    def test_get__concurrent(self, cache: ThumbnailCache, session: FakeSession):
+        threads = [threading.Thread(target=cache.get, args=("url",)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert session.urls == ["url"]
+
+    def test_get__memory_lru(self, session: FakeSession):
+        cache = ThumbnailCache(session=session, memory_entries=1)  # type: ignore
+        cache.get("url1")
+        session.image = make_image(10, 10)
+        cache.get("url2")
+        cache.get("url1")
+        assert session.urls == ["url1", "url2", "url1"]
+
+    def test_collect_garbage(self, tmp_path: pathlib.Path, session: FakeSession):
+        cache = ThumbnailCache(
+            cache_dir=tmp_path, session=session, max_age=timedelta(days=1)  # type: ignore
+        )
+        cache.get("old")
+        session.image = make_image(10, 10)
+        cache.get("fresh")
+        long_ago = time.time() - timedelta(days=2).total_seconds()
+        for path in [*tmp_path.glob("*.jpg"), *(tmp_path / "urls").iterdir()]:
+            os.utime(path, (long_ago, long_ago))
+        # "fresh" is read from disk by new instance, so it's used again
+        new_cache = ThumbnailCache(
+            cache_dir=tmp_path, session=session, max_age=timedelta(days=1)  # type: ignore
+        )
+        new_cache.get("fresh")
+
+        assert new_cache.collect_garbage() == 1
+        assert len(list(tmp_path.glob("*.jpg"))) == 1
+        new_cache.get("fresh")
+        new_cache.get("old")
+        assert session.urls == ["old", "fresh", "old"]
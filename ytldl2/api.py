@@ -1,39 +1,149 @@
 import logging
-from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+import re
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from time import monotonic
+from typing import Any, Callable, Iterator
 
 from ytmusicapi import YTMusic
+from ytmusicapi.exceptions import YTMusicServerError
 
+from ytldl2.cached_ytmusic import CachedYTMusic
+from ytldl2.concurrency_limiter import AimdConcurrencyLimiter
 from ytldl2.extractor import ExtractError, Extractor
 from ytldl2.models.home_items import HomeItems
 from ytldl2.models.raw_artist import RawArtist
 from ytldl2.models.raw_home import Home
 from ytldl2.models.raw_playlist import RawPlaylist, RawWatchPlaylist
-from ytldl2.models.types import ChannelId, PlaylistId
+from ytldl2.models.types import ChannelId, PlaylistId, VideoId
 from ytldl2.models.video import Video
+from ytldl2.protocols.playlist_snapshot_cache import (
+    PlaylistSnapshot,
+    PlaylistSnapshotCache,
+)
+from ytldl2.protocols.response_cache import ResponseCache
 
 logger = logging.getLogger(__name__)
 
+_NOT_FOUND_RE = re.compile(r"HTTP (400|404)\b")
+
+
+def _is_not_playlist_error(error: Exception) -> bool:
+    """
+    Checks, if get_playlist failed, because id isn't a regular playlist
+    (e.g. it's a mix), rather than due to network or server error.
+    """
+    if isinstance(error, (KeyError, IndexError, TypeError)):
+        # response is got, but it isn't shaped as playlist
+        return True
+    return isinstance(error, YTMusicServerError) and bool(
+        _NOT_FOUND_RE.search(str(error))
+    )
+
 
 class YtMusicApiError(Exception):
     pass
 
 
 class YtMusicApi:
-    def __init__(self, ytm: YTMusic) -> None:
+    FIRST_PAGE_SIZE = 100
+    """Amount of tracks, that youtube music returns by one request."""
+    _PLAYLIST = "playlist"
+    _WATCH_PLAYLIST = "watch_playlist"
+    """Kinds of playlists, remembered in lookups."""
+    DEFAULT_ENDPOINT_LIMITS = {
+        "get_playlist": 6,
+        "get_watch_playlist": 2,
+        "get_artist": 2,
+    }
+    """Max amount of concurrent requests of each endpoint."""
+
+    def __init__(
+        self,
+        ytm: YTMusic,
+        snapshots: PlaylistSnapshotCache | None = None,
+        full_sync_interval: timedelta = timedelta(days=1),
+        lookups: ResponseCache | None = None,
+        lookups_ttl: timedelta = timedelta(days=30),
+        limiter: AimdConcurrencyLimiter | None = None,
+        task_timeout: timedelta = timedelta(minutes=2),
+    ) -> None:
         """
         :param oauth: oauth file,
+        :param snapshots: If provided, playlists are synced incrementally:
+        only tracks, added since last sync, are returned, if first page of
+        playlist is enough to find them out. Should be thread safe.
+        New snapshots are saved by commit_snapshots().
+        :param full_sync_interval: How often all tracks of playlist are returned,
+        so songs, which failed to download, are retried.
+        :param lookups: If provided, endpoint, that works for each playlist,
+        and songs playlist of each channel are remembered for lookups_ttl,
+        so they cost one request.
+        :param limiter: Limits concurrent requests, by default limit adapts
+        to latencies and errors in range 1..8.
+        :param task_timeout: Playlists and channels, which take longer,
+        are skipped, so one hung request doesn't stall iteration.
         """
         self._yt = ytm
         self._extractor = Extractor()
+        self._snapshots = snapshots
+        self._full_sync_interval = full_sync_interval
+        self._pending_snapshots: dict[PlaylistId, PlaylistSnapshot] = {}
+        self._pending_snapshots_lock = threading.Lock()
+        self._lookups = lookups
+        self._lookups_ttl = lookups_ttl
+        self._limiter = limiter or AimdConcurrencyLimiter(
+            endpoint_limits=self.DEFAULT_ENDPOINT_LIMITS
+        )
+        self._task_timeout = task_timeout.total_seconds()
+        # is reused between calls, requests are limited by limiter
+        self._executor = ThreadPoolExecutor(
+            max_workers=self._limiter.max_limit,
+            thread_name_prefix=self.__class__.__name__,
+        )
+
+    @property
+    def limiter(self) -> AimdConcurrencyLimiter:
+        return self._limiter
 
-    def get_home_items(self, home_limit: int = 1000) -> HomeItems:
+    def close(self) -> None:
+        """Cancels pending requests."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def commit_snapshots(self) -> None:
+        """
+        Saves snapshots of playlists, synced since last commit. Should be called,
+        when their videos are downloaded, otherwise next sync won't return them.
+        """
+        with self._pending_snapshots_lock:
+            pending, self._pending_snapshots = self._pending_snapshots, {}
+        if self._snapshots is None:
+            return
+        for snapshot in pending.values():
+            self._snapshots.set_playlist_snapshot(snapshot)
+
+    def discard_snapshots(self) -> None:
+        """Forgets snapshots, synced since last commit."""
+        with self._pending_snapshots_lock:
+            self._pending_snapshots = {}
+
+    def _call(self, endpoint: str, fresh: bool = False, **kwargs) -> Any:
+        """:param fresh: Whether cached response of endpoint is bypassed."""
+        with self._limiter.request(endpoint):
+            if fresh and isinstance(self._yt, CachedYTMusic):
+                return self._yt.refresh(endpoint, **kwargs)
+            return getattr(self._yt, endpoint)(**kwargs)
+
+    def get_home_items(self, home_limit: int = 1000, fresh: bool = False) -> HomeItems:
         """
         Gets home items from user's youtube music home page.
         :param home_limit: Amount of items, requested from home items.
         Better to leave default.
+        :param fresh: Whether home page is requested, even if it's cached.
         """
         try:
-            home_raw: list = self._yt.get_home(limit=home_limit)
+            home_raw: list = self._call("get_home", fresh=fresh, limit=home_limit)
             home = Home.parse_obj(home_raw)
             home_items = self._extractor.parse_home(home)
             home_items.remove_dublicates()
@@ -60,68 +170,224 @@ class YtMusicApi:
         except Exception as e:
             raise YtMusicApiError() from e
 
+    def iter_videos(
+        self,
+        home_items: HomeItems,
+        each_playlist_limit: int,
+    ) -> Iterator[list[Video]]:
+        """
+        Same as get_videos(), but yields videos by batches: home videos first,
+        then videos of each playlist and channel, as soon as they are got.
+        Videos aren't deduplicated.
+        """
+        try:
+            yield from self._iter_videos(home_items, each_playlist_limit)
+        except ExtractError:
+            raise
+        except Exception as e:
+            raise YtMusicApiError() from e
+
     def _get_videos(
         self, home_items: HomeItems, each_playlist_limit: int
     ) -> list[Video]:
         """Helper method for get_songs()"""
-        videos: list[Video] = [video for video in home_items.videos]
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            futures: list[Future[list[Video]]] = []
-            if playlists := home_items.playlists:
-                for playlist in playlists:
-                    futures.append(
-                        executor.submit(
-                            self.get_videos_from_playlist,
-                            playlist.playlist_id,
-                            limit=each_playlist_limit,
-                        )
-                    )
-            if channels := home_items.channels:
-                for channel in channels:
-                    futures.append(
-                        executor.submit(
-                            self.get_videos_from_channel,
-                            channel.channel_id,
-                            limit=each_playlist_limit,
-                        )
-                    )
-            for future in as_completed(futures):
-                try:
-                    videos += future.result()
-                except Exception as e:
-                    logger.debug(f"skipping playlist, couldn't extract video ids: {e}")
+        videos: list[Video] = [
+            video
+            for batch in self._iter_videos(home_items, each_playlist_limit)
+            for video in batch
+        ]
         logger.debug(f"Extracted {len(videos)} videos")
         return videos
 
+    def _iter_videos(
+        self, home_items: HomeItems, each_playlist_limit: int
+    ) -> Iterator[list[Video]]:
+        """Helper method for get_videos() and iter_videos()"""
+        yield [video for video in home_items.videos]
+        tasks: list[tuple[str, Callable[[], list[Video]]]] = []
+        for playlist in home_items.playlists or []:
+            tasks.append(
+                (
+                    f"playlist {playlist.playlist_id}",
+                    lambda id=playlist.playlist_id: self.get_videos_from_playlist(
+                        id, limit=each_playlist_limit
+                    ),
+                )
+            )
+        for channel in home_items.channels or []:
+            tasks.append(
+                (
+                    f"channel {channel.channel_id}",
+                    lambda id=channel.channel_id: self.get_videos_from_channel(
+                        id, limit=each_playlist_limit
+                    ),
+                )
+            )
+        yield from self._run_tasks(tasks)
+
+    def _run_tasks(
+        self, tasks: list[tuple[str, Callable[[], list[Video]]]]
+    ) -> Iterator[list[Video]]:
+        """
+        Runs named tasks in pool, yields results as soon as they are done.
+        Failed tasks and tasks, running longer than task_timeout, are skipped.
+        """
+        started: dict[int, float] = {}
+
+        def run(i: int, task: Callable[[], list[Video]]) -> list[Video]:
+            started[i] = monotonic()
+            return task()
+
+        futures: dict[Future[list[Video]], int] = {
+            self._executor.submit(run, i, task): i for i, (_, task) in enumerate(tasks)
+        }
+        pending = set(futures)
+        try:
+            while pending:
+                deadlines = [
+                    started[futures[f]] + self._task_timeout
+                    for f in pending
+                    if futures[f] in started
+                ]
+                timeout = (
+                    max(0.0, min(deadlines) - monotonic())
+                    if deadlines
+                    else self._task_timeout
+                )
+                done, pending = wait(pending, timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        videos = future.result()
+                    except Exception as e:
+                        name = tasks[futures[future]][0]
+                        logger.debug(
+                            f"skipping {name}, couldn't extract video ids: {e}"
+                        )
+                        continue
+                    yield videos
+                now = monotonic()
+                for future in list(pending):
+                    i = futures[future]
+                    if i in started and now - started[i] > self._task_timeout:
+                        logger.warning(f"skipping {tasks[i][0]}, it timed out")
+                        pending.remove(future)
+        finally:
+            # consumer can stop iterating before all futures are done
+            for future in pending:
+                future.cancel()
+
     def get_videos_from_playlist(
         self, playlist_id: PlaylistId, /, limit: int = 200
     ) -> list[Video]:
         """
         Extracts videoIds from playlist.
+        If snapshots are provided, returns only new videos of synced playlist.
         """
-        contents = RawPlaylist | RawWatchPlaylist
-        is_watch = False
+        if (videos := self._sync_playlist(playlist_id, limit)) is not None:
+            return videos
+        contents = self._get_playlist(playlist_id, limit)
+        if isinstance(contents, RawPlaylist):
+            self._set_snapshot(playlist_id, contents, limit)
+        return self._extractor.extract_videos_from_playlist(contents)
 
+    def _sync_playlist(self, playlist_id: PlaylistId, limit: int) -> list[Video] | None:
+        """
+        Gets first page of playlist and compares it with snapshot.
+        Returns None, if whole playlist should be fetched.
+        """
+        if self._snapshots is None:
+            return None
+        snapshot = self._snapshots.get_playlist_snapshot(playlist_id)
+        if (
+            snapshot is None
+            or datetime.now() - snapshot.last_full_sync > self._full_sync_interval
+        ):
+            return None
+        page_size = min(limit or self.FIRST_PAGE_SIZE, self.FIRST_PAGE_SIZE)
         try:
-            contents = self._yt.get_playlist(
-                playlistId=playlist_id,
-                limit=limit,  # type: ignore
+            page = RawPlaylist.parse_obj(
+                self._call("get_playlist", playlistId=playlist_id, limit=page_size)
+            )
+        except Exception as e:
+            logger.debug(f"Couldn't sync playlist {playlist_id}: {e}")
+            return None
+        page_ids = [VideoId(track.video_id) for track in page.tracks]
+        complete = len(page_ids) < page_size or (
+            page.track_count is not None and len(page_ids) >= page.track_count
+        )
+        new_ids = snapshot.new_video_ids(page_ids, page.track_count, complete)
+        if new_ids is None:
+            logger.debug(f"Playlist {playlist_id} has changed, fetching it all")
+            return None
+        logger.debug(f"Synced playlist {playlist_id}, {len(new_ids)} new videos")
+        video_ids = page_ids if complete else new_ids + snapshot.video_ids
+        self._set_pending_snapshot(
+            PlaylistSnapshot.of(
+                playlist_id,
+                video_ids[:limit],
+                page.track_count,
+                last_full_sync=snapshot.last_full_sync,
             )
-        except Exception:
+        )
+        new = set(new_ids)
+        return [
+            video
+            for video in self._extractor.extract_videos_from_playlist(page)
+            if video.video_id in new
+        ]
+
+    def _set_snapshot(
+        self, playlist_id: PlaylistId, playlist: RawPlaylist, limit: int
+    ) -> None:
+        if self._snapshots is None:
+            return
+        video_ids = [VideoId(track.video_id) for track in playlist.tracks]
+        self._set_pending_snapshot(
+            PlaylistSnapshot.of(playlist_id, video_ids[:limit], playlist.track_count)
+        )
+
+    def _set_pending_snapshot(self, snapshot: PlaylistSnapshot) -> None:
+        with self._pending_snapshots_lock:
+            self._pending_snapshots[snapshot.playlist_id] = snapshot
+
+    def _get_playlist(
+        self, playlist_id: PlaylistId, limit: int
+    ) -> RawPlaylist | RawWatchPlaylist:
+        """
+        Gets playlist, falls back to watch playlist (e.g. for mixes).
+        Remembers, which one worked, so mixes don't cost failed request.
+        """
+        kind_key = f"playlist_kind:{playlist_id}"
+        kind = self._get_lookup(kind_key)
+
+        if kind != self._WATCH_PLAYLIST:
             try:
-                contents = self._yt.get_watch_playlist(
-                    playlistId=playlist_id,
-                    limit=limit,  # type: ignore
+                contents = self._call(
+                    "get_playlist", playlistId=playlist_id, limit=limit
                 )
-                is_watch = True
-            except Exception:
-                raise
-        contents = (
-            RawWatchPlaylist.parse_obj(contents)
-            if is_watch
-            else RawPlaylist.parse_obj(contents)
-        )
-        return self._extractor.extract_videos_from_playlist(contents)
+            except Exception as e:
+                if kind == self._PLAYLIST or not _is_not_playlist_error(e):
+                    # e.g. network error, watch playlist has other tracks
+                    raise
+                logger.debug(f"Couldn't get playlist {playlist_id}: {e}")
+            else:
+                if kind is None:
+                    self._set_lookup(kind_key, self._PLAYLIST)
+                return RawPlaylist.parse_obj(contents)
+
+        contents = self._call("get_watch_playlist", playlistId=playlist_id, limit=limit)
+        if kind is None:
+            self._set_lookup(kind_key, self._WATCH_PLAYLIST)
+        return RawWatchPlaylist.parse_obj(contents)
+
+    def _get_lookup(self, key: str) -> str | None:
+        if self._lookups is None:
+            return None
+        return self._lookups.get_response(key, self._lookups_ttl)
+
+    def _set_lookup(self, key: str, value: str) -> None:
+        if self._lookups is not None:
+            self._lookups.set_response(key, value)
 
     def get_videos_from_channel(
         self, channel_id: ChannelId, /, limit: int | None = None
@@ -129,8 +395,12 @@ class YtMusicApi:
         """
         Extracts videoIds from channel.
         """
-        raw_artist = self._yt.get_artist(channelId=channel_id)
-        artist = RawArtist.parse_obj(raw_artist)
+        key = f"channel_songs_playlist:{channel_id}"
+        if (playlist_id := self._get_lookup(key)) is None:
+            raw_artist = self._call("get_artist", channelId=channel_id)
+            artist = RawArtist.parse_obj(raw_artist)
+            playlist_id = self._extractor.extract_playlist_id_from_artist(artist)
+            self._set_lookup(key, playlist_id)
         return self.get_videos_from_playlist(
-            self._extractor.extract_playlist_id_from_artist(artist), limit=limit
+            PlaylistId(playlist_id), limit=limit  # type: ignore
         )
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import json
+import logging
+from datetime import timedelta
+from typing import Any, Callable
+
+from ytmusicapi import YTMusic
+
+from ytldl2.protocols.response_cache import ResponseCache
+from ytldl2.util.stats import HitMissStats
+
+logger = logging.getLogger(__name__)
+
+
+class CachedYTMusic:
+    """
+    YTMusic wrapper, that caches responses of endpoints, used by YtMusicApi.
+    Each endpoint has own TTL, errors aren't cached.
+    """
+
+    DEFAULT_TTLS = {
+        "get_home": timedelta(minutes=15),
+        "get_playlist": timedelta(hours=1),
+        "get_watch_playlist": timedelta(hours=1),
+        "get_artist": timedelta(days=1),
+    }
+
+    def __init__(
+        self,
+        ytm: YTMusic,
+        cache: ResponseCache,
+        ttls: dict[str, timedelta] | None = None,
+    ) -> None:
+        """
+        :param cache: Should be thread safe, endpoints are called concurrently.
+        :param ttls: Overrides TTLs of endpoints, see DEFAULT_TTLS.
+        """
+        self._ytm = ytm
+        self._cache = cache
+        self._ttls = self.DEFAULT_TTLS | (ttls or {})
+        self.stats = HitMissStats()
+
+    def get_home(self, **kwargs) -> Any:
+        return self._cached("get_home", self._ytm.get_home, kwargs)
+
+    def get_playlist(self, **kwargs) -> Any:
+        return self._cached("get_playlist", self._ytm.get_playlist, kwargs)
+
+    def get_watch_playlist(self, **kwargs) -> Any:
+        return self._cached("get_watch_playlist", self._ytm.get_watch_playlist, kwargs)
+
+    def get_artist(self, **kwargs) -> Any:
+        return self._cached("get_artist", self._ytm.get_artist, kwargs)
+
+    def refresh(self, endpoint: str, **kwargs) -> Any:
+        """
+        Calls endpoint bypassing cache, its response replaces cached one,
+        so following calls get it too.
+        """
+        response = getattr(self._ytm, endpoint)(**kwargs)
+        self._store(self._key(endpoint, kwargs), response)
+        return response
+
+    def __getattr__(self, name: str) -> Any:
+        # other endpoints aren't cached
+        return getattr(self._ytm, name)
+
+    def _cached(
+        self, endpoint: str, call: Callable[..., Any], kwargs: dict[str, Any]
+    ) -> Any:
+        key = self._key(endpoint, kwargs)
+        try:
+            response = self._cache.get_response(key, self._ttls[endpoint])
+        except Exception as e:
+            logger.warning(f"Couldn't get response from cache: {e}")
+            response = None
+        if response is not None:
+            self.stats.hit()
+            return response
+        self.stats.miss()
+
+        response = call(**kwargs)
+        self._store(key, response)
+        return response
+
+    @staticmethod
+    def _key(endpoint: str, kwargs: dict[str, Any]) -> str:
+        return f"{endpoint}:{json.dumps(kwargs, sort_keys=True)}"
+
+    def _store(self, key: str, response: Any) -> None:
+        try:
+            self._cache.set_response(key, response)
+        except Exception as e:
+            logger.warning(f"Couldn't put response into cache: {e}")
@@ -0,0 +1,113 @@
+import contextlib
+import logging
+import threading
+from time import monotonic
+from typing import Iterator
+
+import requests
+
+from ytldl2.rate_limiter import is_throttling_error
+
+logger = logging.getLogger(__name__)
+
+
+class AimdConcurrencyLimiter:
+    """
+    Limits amount of concurrent requests. Limit is controlled by AIMD algorithm:
+    it grows additively while requests succeed fast enough and
+    is cut multiplicatively on throttling, network errors and slow requests.
+    Each endpoint can also have own fixed limit.
+    """
+
+    def __init__(
+        self,
+        initial_limit: float = 3,
+        min_limit: float = 1,
+        max_limit: float = 8,
+        increase: float = 0.25,
+        decrease: float = 0.5,
+        slow_latency: float = 10,
+        endpoint_limits: dict[str, int] | None = None,
+    ) -> None:
+        """
+        :param initial_limit: Amount of concurrent requests at start.
+        :param min_limit: Limit won't go below this value.
+        :param max_limit: Limit won't go above this value.
+        :param increase: Added to limit after each fast successful request.
+        :param decrease: Limit is multiplied by it after each failed or slow request.
+        :param slow_latency: Requests, that took longer (in seconds), are slow.
+        :param endpoint_limits: Max amount of concurrent requests of endpoints.
+        """
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError("should be 1 <= min_limit <= initial_limit <= max_limit")
+        if not 0 < decrease < 1:
+            raise ValueError("decrease should be in (0, 1)")
+
+        self._min_limit = min_limit
+        self._max_limit = max_limit
+        self._increase = increase
+        self._decrease = decrease
+        self._slow_latency = slow_latency
+        self._endpoints = {
+            endpoint: threading.BoundedSemaphore(limit)
+            for endpoint, limit in (endpoint_limits or {}).items()
+        }
+
+        self._condition = threading.Condition()
+        self._limit = initial_limit
+        self._in_flight = 0
+
+    @property
+    def limit(self) -> int:
+        """Current amount of concurrent requests."""
+        return int(self._limit)
+
+    @property
+    def max_limit(self) -> int:
+        return int(self._max_limit)
+
+    @contextlib.contextmanager
+    def request(self, endpoint: str) -> Iterator[None]:
+        """Waits for free slot of endpoint and overall, measures request."""
+        endpoint_slots = self._endpoints.get(endpoint)
+        if endpoint_slots is not None:
+            endpoint_slots.acquire()
+        try:
+            with self._condition:
+                self._condition.wait_for(lambda: self._in_flight < int(self._limit))
+                self._in_flight += 1
+            started = monotonic()
+            error: BaseException | None = None
+            try:
+                yield
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                self._on_done(endpoint, monotonic() - started, error)
+        finally:
+            if endpoint_slots is not None:
+                endpoint_slots.release()
+
+    def _on_done(
+        self, endpoint: str, latency: float, error: BaseException | None
+    ) -> None:
+        overloaded = latency >= self._slow_latency or (
+            error is not None
+            and (
+                is_throttling_error(error)
+                or isinstance(error, (requests.Timeout, requests.ConnectionError))
+            )
+        )
+        with self._condition:
+            self._in_flight -= 1
+            if overloaded:
+                self._limit = max(self._min_limit, self._limit * self._decrease)
+            elif error is None:
+                self._limit = min(self._max_limit, self._limit + self._increase)
+            self._condition.notify_all()
+        if overloaded:
+            logger.info(
+                f"{endpoint} is overloaded (latency={latency:.1f}s, error={error}), "
+                f"concurrency decreased to {self.limit}"
+            )
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+from time import monotonic
+from typing import Callable
+
+from ytldl2.cancellation_tokens import CancellationToken
+from ytldl2.util.time import sleep_with_cancel
+
+logger = logging.getLogger(__name__)
+
+
+class Daemon:
+    """
+    Runs cycles (e.g. library updates) until cancel is requested.
+    Between cycles it waits for interval, but starts next cycle early,
+    if check says there is something new (e.g. home page changed).
+    Errors of cycles and checks are logged, daemon keeps running.
+    """
+
+    def __init__(
+        self,
+        cycle: Callable[[], None],
+        cancellation_token: CancellationToken,
+        interval: timedelta,
+        check: Callable[[], bool] | None = None,
+        check_interval: timedelta = timedelta(minutes=15),
+        step: float = 5,
+    ) -> None:
+        """
+        :param interval: Time between starts of cycles.
+        :param check: Returns True, if next cycle should be started now.
+        :param check_interval: How often check is called between cycles.
+        :param step: How often cancellation_token is checked, in seconds.
+        """
+        self._cycle = cycle
+        self._cancellation_token = cancellation_token
+        self._interval = interval.total_seconds()
+        self._check = check
+        self._check_interval = check_interval.total_seconds()
+        self._step = step
+        self.cycles = 0
+        """Amount of started cycles."""
+
+    def run(self) -> None:
+        while not self._cancellation_token.kill_requested:
+            started = monotonic()
+            self.cycles += 1
+            try:
+                self._cycle()
+            except Exception:
+                logger.exception(f"Cycle {self.cycles} failed")
+            self._wait(started + self._interval)
+
+    def _wait(self, until: float) -> None:
+        """Waits until next cycle should be started."""
+        while not self._cancellation_token.kill_requested:
+            left = until - monotonic()
+            if left <= 0:
+                return
+            if self._check is None:
+                sleep_with_cancel(left, self._cancellation_token, self._step)
+                continue
+            sleep_with_cancel(
+                min(self._check_interval, left), self._cancellation_token, self._step
+            )
+            if self._cancellation_token.kill_requested or monotonic() >= until:
+                return
+            try:
+                if self._check():
+                    logger.info("Starting next cycle early: check found changes")
+                    return
+            except Exception as e:
+                logger.warning(f"Check between cycles failed: {e}")
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import json
+import logging
+import pathlib
+import threading
+from datetime import datetime, timedelta
+
+import pydantic
+
+from ytldl2.models.types import VideoId
+
+logger = logging.getLogger(__name__)
+
+
+class JournalEntry(pydantic.BaseModel):
+    started: datetime
+    files: list[str] = pydantic.Field(default_factory=list)
+    """Partly downloaded files."""
+
+
+class Journal(pydantic.BaseModel):
+    entries: dict[VideoId, JournalEntry] = pydantic.Field(default_factory=dict)
+
+
+class DownloadJournal:
+    """
+    Persistent journal of in-flight downloads and their partly downloaded files.
+    Videos, that weren't finished, can be resumed by next batch,
+    their *.part files are kept until they become older than max_age.
+    """
+
+    PART_PATTERNS = ["*.part", "*.part-Frag*", "*.ytdl"]
+
+    def __init__(
+        self, journal_path: pathlib.Path, max_age: timedelta = timedelta(days=3)
+    ) -> None:
+        """
+        :param journal_path: Json file, will be created if doesn't exist.
+        :param max_age: Parts and entries older than it are garbage collected.
+        """
+        self.journal_path = journal_path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._journal = self._load()
+
+    def _load(self) -> Journal:
+        try:
+            return Journal.model_validate_json(self.journal_path.read_bytes())
+        except FileNotFoundError:
+            return Journal()
+        except Exception as e:
+            logger.warning(f"Couldn't load journal {self.journal_path}: {e}")
+            return Journal()
+
+    def _save(self) -> None:
+        """Should be called under lock."""
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.journal_path.with_suffix(".tmp")
+        tmp_path.write_text(self._journal.model_dump_json(indent=4), encoding="utf-8")
+        tmp_path.replace(self.journal_path)
+
+    def pending(self) -> list[VideoId]:
+        """Videos, that were started, but weren't finished, oldest first."""
+        with self._lock:
+            entries = sorted(self._journal.entries.items(), key=lambda e: e[1].started)
+            return [video_id for video_id, _ in entries]
+
+    def files(self, video_id: VideoId) -> list[str]:
+        with self._lock:
+            entry = self._journal.entries.get(video_id)
+            return list(entry.files) if entry else []
+
+    def start(self, video_id: VideoId) -> None:
+        with self._lock:
+            if video_id not in self._journal.entries:
+                self._journal.entries[video_id] = JournalEntry(started=datetime.now())
+                self._save()
+
+    def add_file(self, video_id: VideoId, file: str) -> None:
+        """Is cheap to call on each progress hook, saves only new files."""
+        with self._lock:
+            entry = self._journal.entries.setdefault(
+                video_id, JournalEntry(started=datetime.now())
+            )
+            if file not in entry.files:
+                entry.files.append(file)
+                self._save()
+
+    def finish(self, video_id: VideoId) -> None:
+        """Removes video from journal, it won't be resumed."""
+        with self._lock:
+            if self._journal.entries.pop(video_id, None) is not None:
+                self._save()
+
+    def collect_garbage(self, dirs: list[pathlib.Path]) -> None:
+        """
+        Removes entries and part files in dirs, that are older than max_age.
+        """
+        expired = datetime.now() - self.max_age
+        with self._lock:
+            removed = False
+            for video_id, entry in list(self._journal.entries.items()):
+                if entry.started < expired:
+                    logger.debug(f"Removing expired journal entry {video_id}")
+                    del self._journal.entries[video_id]
+                    removed = True
+            if removed:
+                self._save()
+
+        for dir in dirs:
+            for pattern in self.PART_PATTERNS:
+                for path in dir.glob(pattern):
+                    try:
+                        if datetime.fromtimestamp(path.stat().st_mtime) < expired:
+                            logger.debug(f"Removing stale part {path}")
+                            path.unlink(missing_ok=True)
+                    except FileNotFoundError:
+                        continue
@@ -80,12 +80,15 @@ class Extractor:
                 title=Title(track.title),
                 artist=get_artist(track),
                 video_id=VideoId(track.video_id),
+                video_type=track.video_type,
             )
             for track in tracks
         ]
-        logger.debug(
-            f"Extracted {len(videos)} videos from playlist {playlist}: {videos}"
-        )
+        if logger.isEnabledFor(logging.DEBUG):
+            # formatting whole playlist is costly, when it isn't logged
+            logger.debug(
+                f"Extracted {len(videos)} videos from playlist {playlist}: {videos}"
+            )
         return videos
 
     def extract_playlist_id_from_artist(self, artist: RawArtist) -> PlaylistId:
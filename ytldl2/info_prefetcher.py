@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import collections
+import dataclasses
+import logging
+import threading
+import time
+import urllib.parse
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import timedelta
+from typing import Any, Callable, Iterable, Iterator
+
+from yt_dlp import YoutubeDL
+
+from ytldl2.models.types import VideoId
+from ytldl2.postprocessors import SongFiltered
+from ytldl2.util.stats import HitMissStats
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass(frozen=True)
+class PrefetchedInfo:
+    info: dict[str, Any]
+    """Result of extract_info with download=False."""
+    expires_at: float
+    """Unix time, after which stream urls in info can't be trusted."""
+    proxy: str | None = None
+    """Proxy, via which info was extracted, stream urls are bound to its IP."""
+
+    @property
+    def expired(self) -> bool:
+        return time.time() >= self.expires_at
+
+
+def urls_expire_at(info: dict[str, Any]) -> float | None:
+    """
+    Minimal "expire" parameter of stream urls of info, urls are signed by youtube
+    and stop working after it.
+    """
+    urls = [info.get("url")]
+    urls += [f.get("url") for f in info.get("requested_formats") or []]
+    urls += [f.get("url") for f in info.get("formats") or []]
+    expires: list[float] = []
+    for url in urls:
+        if not url:
+            continue
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(url).query)
+        try:
+            expires.append(float(query["expire"][0]))
+        except (KeyError, ValueError):
+            continue
+    return min(expires, default=None)
+
+
+class InfoPrefetcher:
+    """
+    Thread safe iterator over video ids, that extracts info of next `lookahead`
+    ids in background, while current ones are being downloaded.
+    Pre processors (e.g. FilterSongPP) are run during extraction, so non-songs
+    are rejected before they are downloaded.
+    """
+
+    def __init__(
+        self,
+        video_ids: Iterable[VideoId],
+        build_ydl: Callable[[], YoutubeDL],
+        lookahead: int,
+        ttl: timedelta = timedelta(hours=1),
+        expire_margin: timedelta = timedelta(minutes=10),
+    ) -> None:
+        """
+        :param build_ydl: Builds YoutubeDL for each prefetching thread.
+        :param lookahead: Amount of ids, which info is extracted ahead.
+        :param ttl: How long prefetched info is valid.
+        :param expire_margin: Info expires this much earlier than stream urls,
+        so download has time to finish.
+        """
+        if lookahead < 1:
+            raise ValueError(f"lookahead should be >= 1, got {lookahead}")
+        self._video_ids = iter(video_ids)
+        self._build_ydl = build_ydl
+        self._lookahead = lookahead
+        self._ttl = ttl
+        self._expire_margin = expire_margin
+        self._executor = ThreadPoolExecutor(
+            max_workers=lookahead, thread_name_prefix=self.__class__.__name__
+        )
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._queue: collections.deque[tuple[VideoId, Future[PrefetchedInfo]]] = (
+            collections.deque()
+        )
+        self.stats = HitMissStats()
+        """Hit, if prefetched info was used, miss, if it expired or failed."""
+
+    def __iter__(self) -> Iterator[tuple[VideoId, Future[PrefetchedInfo]]]:
+        return self
+
+    def __next__(self) -> tuple[VideoId, Future[PrefetchedInfo]]:
+        with self._lock:
+            while len(self._queue) <= self._lookahead:
+                if (video_id := next(self._video_ids, None)) is None:
+                    break
+                future = self._executor.submit(self._extract, video_id)
+                self._queue.append((video_id, future))
+            if not self._queue:
+                raise StopIteration
+            return self._queue.popleft()
+
+    def get(self, future: Future[PrefetchedInfo]) -> dict[str, Any] | None:
+        """
+        Waits for prefetched info. Returns None, if it's expired
+        or failed to be extracted, so it should be extracted again.
+        Song filtering errors are reraised.
+        """
+        prefetched = self.get_prefetched(future)
+        return prefetched.info if prefetched is not None else None
+
+    def get_prefetched(self, future: Future[PrefetchedInfo]) -> PrefetchedInfo | None:
+        """Same as get(), but returns info with its proxy."""
+        try:
+            prefetched = future.result()
+        except SongFiltered:
+            raise
+        except Exception as e:
+            logger.debug(f"Info prefetch failed: {e}")
+            self.stats.miss()
+            return None
+        if prefetched.expired:
+            logger.debug(f"Prefetched info of {prefetched.info.get('id')} expired")
+            self.stats.miss()
+            return None
+        self.stats.hit()
+        return prefetched
+
+    def _extract(self, video_id: VideoId) -> PrefetchedInfo:
+        if (ydl := getattr(self._local, "ydl", None)) is None:
+            ydl = self._local.ydl = self._build_ydl()
+        with ydl:
+            info: dict[str, Any] = ydl.extract_info(video_id, download=False)  # type: ignore
+        expires_at = time.time() + self._ttl.total_seconds()
+        if (urls_expire := urls_expire_at(info)) is not None:
+            expires_at = min(
+                expires_at, urls_expire - self._expire_margin.total_seconds()
+            )
+        return PrefetchedInfo(
+            info=info, expires_at=expires_at, proxy=ydl.params.get("proxy")
+        )
+
+    def close(self) -> None:
+        """Cancels prefetches, which weren't started."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
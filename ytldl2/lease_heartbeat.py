@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import logging
+import threading
+from datetime import timedelta
+
+from ytldl2.protocols.coordinator import Coordinator, Lease
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseHeartbeat:
+    """
+    Context manager, that extends lease in background thread,
+    while songs of lease are being downloaded.
+    """
+
+    def __init__(
+        self,
+        coordinator: Coordinator,
+        lease: Lease,
+        duration: timedelta,
+        interval: timedelta | None = None,
+    ) -> None:
+        """
+        :param duration: Lease is extended by it on each heartbeat.
+        :param interval: Time between heartbeats, by default third of duration.
+        """
+        self._coordinator = coordinator
+        self._lease = lease
+        self._duration = duration
+        self._interval = (interval or duration / 3).total_seconds()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name=self.__class__.__name__, daemon=True
+        )
+        self.lost = False
+        """True, if lease expired and was taken by other worker."""
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval):
+            try:
+                if not self._coordinator.heartbeat(self._lease, self._duration):
+                    logger.warning(f"Lease {self._lease.lease_id} was lost")
+                    self.lost = True
+                    return
+            except Exception as e:
+                # lease is still valid for a while, next heartbeat may succeed
+                logger.warning(f"Heartbeat of lease {self._lease.lease_id} failed: {e}")
+
+    def __enter__(self) -> LeaseHeartbeat:
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop.set()
+        self._thread.join()
+        return False
@@ -25,7 +25,12 @@ def write_metadata(filepath: str, metadata: dict):
             )
         if "thumbnail" in metadata:
             thumbnail = metadata["thumbnail"]
-            file["covr"] = [MP4Cover(thumbnail)]
+            imageformat = (
+                MP4Cover.FORMAT_PNG
+                if thumbnail.startswith(b"\x89PNG")
+                else MP4Cover.FORMAT_JPEG
+            )
+            file["covr"] = [MP4Cover(thumbnail, imageformat=imageformat)]
     else:
         raise UnexpectedFileTypeError()
 
@@ -0,0 +1,75 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+from ytldl2.thumbnail_cache import ThumbnailCache
+
+logger = logging.getLogger(__name__)
+
+
+class MetadataPrefetcher:
+    """
+    Fetches lyrics and covers in background, so they are fetched
+    while audio is being downloaded and converted.
+    Is shared between YoutubeDLs, that are built by one YoutubeDlBuilder.
+    """
+
+    def __init__(
+        self,
+        get_lyrics: Callable[[str], str | None],
+        thumbnails: ThumbnailCache,
+        max_workers: int = 4,
+    ) -> None:
+        """
+        :param get_lyrics: Gets lyrics by video id, should be thread safe.
+        :param thumbnails: Cache, which will hold prefetched covers.
+        """
+        self._get_lyrics = get_lyrics
+        self._thumbnails = thumbnails
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=self.__class__.__name__
+        )
+        self._lock = threading.Lock()
+        self._lyrics: dict[str, Future[str | None]] = {}
+
+    def prefetch(self, video_id: str, thumbnail_url: str | None) -> None:
+        """Starts fetching metadata, returns immediately."""
+        with self._lock:
+            if video_id not in self._lyrics:
+                self._lyrics[video_id] = self._executor.submit(
+                    self._get_lyrics, video_id
+                )
+        if thumbnail_url:
+            # cache serializes fetches of one url,
+            # so thumbnail() will just wait for this one
+            self._executor.submit(self._prefetch_thumbnail, thumbnail_url)
+
+    def lyrics(self, video_id: str) -> str | None:
+        """Waits for prefetched lyrics, or gets them now, if they weren't."""
+        with self._lock:
+            future = self._lyrics.pop(video_id, None)
+        if future is None:
+            return self._get_lyrics(video_id)
+        return future.result()
+
+    def thumbnail(self, url: str) -> bytes:
+        """Waits for prefetched cover, or gets it now, if it wasn't."""
+        return self._thumbnails.get(url)
+
+    def discard(self, video_id: str) -> None:
+        """Forgets prefetched metadata of video, which won't be processed."""
+        with self._lock:
+            self._lyrics.pop(video_id, None)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            self._lyrics = {}
+
+    def _prefetch_thumbnail(self, url: str) -> None:
+        try:
+            self._thumbnails.get(url)
+        except Exception as e:
+            # will be retried by thumbnail()
+            logger.debug(f"Couldn't prefetch thumbnail {url}: {e}")
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import dataclasses
+import hashlib
 import re
 from dataclasses import dataclass
 from typing import OrderedDict, TypeVar
@@ -58,6 +59,19 @@ class HomeItems:
             and len(self.channels) == 0
         )
 
+    def fingerprint(self) -> str:
+        """
+        Hash of ids of playlists and channels, which songs are downloaded from,
+        it changes, when they are added or removed. Order of home page and
+        single videos, which are suggested anew on almost each request,
+        aren't taken into account, so they don't trigger update.
+        """
+        ids = sorted(
+            {f"p:{x.playlist_id}" for x in self.playlists}
+            | {f"c:{x.browse_id}" for x in self.channels}
+        )
+        return hashlib.sha256("\n".join(ids).encode()).hexdigest()
+
     def filtered(self, filter: HomeItemsFilterRe) -> HomeItems:
         """
         Filters home items and returns new copy.
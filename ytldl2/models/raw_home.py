@@ -1,49 +1,31 @@
 from __future__ import annotations
 
 import logging
+from functools import cache
 from typing import Iterator, List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
 
 logger = logging.getLogger(__name__)
 
 
-class Thumbnail(BaseModel):
-    url: str
-    width: int
-    height: int
-
-
 class Artist(BaseModel):
     name: str
     id: Optional[str]
 
 
-class AuthorItem(BaseModel):
-    name: str
-    id: str
-
-
-class Album(BaseModel):
-    name: str
-    id: str
-
-
 class Content(BaseModel):
+    """
+    Only fields, read by Extractor, are declared. Others (thumbnails, albums,
+    authors, etc.) are ignored, so they cost nothing to validate.
+    """
+
     title: str
-    playlist_id: Optional[Optional[str]] = Field(None, alias="playlistId")
-    thumbnails: List[Thumbnail]
-    description: Optional[str] = None
+    playlist_id: Optional[str] = Field(None, alias="playlistId")
     browse_id: Optional[str] = Field(None, alias="browseId")
     subscribers: Optional[str] = None
     video_id: Optional[str] = Field(None, alias="videoId")
     artists: Optional[List[Artist]] = None
-    views: Optional[str] = None
-    year: Optional[str] = None
-    is_explicit: Optional[bool] = Field(None, alias="isExplicit")
-    count: Optional[str] = None
-    author: Optional[List[AuthorItem]] = None
-    album: Optional[Album] = None
 
 
 class HomeItem(BaseModel):
@@ -55,6 +37,12 @@ class Home(BaseModel):
     root: List[HomeItem]
 
     def parse_obj(obj: list) -> Home:
+        try:
+            # fast path: whole home is validated by one call
+            return Home(root=_home_items_adapter().validate_python(obj))
+        except ValidationError:
+            pass
+        # some items are broken, they are skipped one by one
         root = []
         for raw_home_item in obj:
             try:
@@ -69,3 +57,8 @@ class Home(BaseModel):
 
     def __getitem__(self, item) -> HomeItem:
         return self.root[item]
+
+
+@cache
+def _home_items_adapter() -> TypeAdapter[List[HomeItem]]:
+    return TypeAdapter(List[HomeItem])
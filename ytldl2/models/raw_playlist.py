@@ -14,12 +14,14 @@ class Track(BaseModel):
     video_id: str = Field(..., alias="videoId")
     title: str
     artists: Optional[List[Artist]] = None
+    video_type: Optional[str] = Field(None, alias="videoType")
 
 
 class RawPlaylist(BaseModel):
     id: str
     title: str
     tracks: List[Track]
+    track_count: Optional[int] = Field(None, alias="trackCount")
 
     def __str__(self) -> str:
         return f"{self.__class__.__name__}(id={self.id}, title={self.title})"
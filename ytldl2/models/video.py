@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from ytldl2.models.types import Artist, WithTitle, WithVideoId
 
@@ -6,3 +6,5 @@ from ytldl2.models.types import Artist, WithTitle, WithVideoId
 @dataclass(frozen=True)
 class Video(WithTitle, WithVideoId):
     artist: Artist | None = None
+    video_type: str | None = field(default=None, compare=False)
+    """Type of video in youtube music, e.g. MUSIC_VIDEO_TYPE_ATV."""
@@ -1,8 +1,19 @@
-import time
-from typing import Generator
+from __future__ import annotations
+
+import dataclasses
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from time import monotonic
+from typing import Any, Callable, Generator, Iterable
 
 from yt_dlp import YoutubeDL
 
+from ytldl2.cancellation_tokens import CancellationToken
+from ytldl2.download_journal import DownloadJournal
+from ytldl2.info_prefetcher import InfoPrefetcher, PrefetchedInfo
+from ytldl2.models.download_hooks import DownloadProgress, is_progress_downloading
 from ytldl2.models.download_result import (
     Downloaded,
     DownloadResult,
@@ -11,14 +22,39 @@ from ytldl2.models.download_result import (
 )
 from ytldl2.models.info import SongInfo, VideoInfo
 from ytldl2.models.types import VideoId
+from ytldl2.postprocessing_stage import (
+    PostprocessJob,
+    PostprocessResult,
+    PostprocessStage,
+)
 from ytldl2.postprocessors import (
     SongFiltered,
 )
+from ytldl2.protocols.rate_limiter import RateLimiter
 from ytldl2.protocols.ui import (
     ProgressBar,
 )
+from ytldl2.rate_limiter import AimdRateLimiter
 from ytldl2.youtube_dl_builder import YoutubeDlBuilder
 
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass(frozen=True)
+class _Postprocessing:
+    """Song, that was downloaded and waits for PostprocessStage."""
+
+    video_id: VideoId
+    info: dict[str, Any]
+    job: PostprocessJob
+
+
+@dataclasses.dataclass(frozen=True)
+class _Postprocessed:
+    """Result of song, post processed by PostprocessStage."""
+
+    result: DownloadResult
+
 
 class MusicDownloader:
     """
@@ -27,53 +63,350 @@ class MusicDownloader:
     Uses MusicYoutubeDlBuilder internally.
     """
 
-    def __init__(self, ytlb: YoutubeDlBuilder) -> None:
+    def __init__(
+        self,
+        ytlb: YoutubeDlBuilder,
+        rate_limiter: RateLimiter | None = None,
+        journal: DownloadJournal | None = None,
+        postprocess_stage: PostprocessStage | None = None,
+    ) -> None:
+        """
+        :param rate_limiter: Paces downloads of all workers.
+        By default AimdRateLimiter is used.
+        :param journal: Keeps track of unfinished downloads, so they can be resumed.
+        By default it's stored in tmp dir of ytlb.
+        :param postprocess_stage: If provided, ffmpeg and metadata writing are
+        run by it, so download workers are busy only with network.
+        Otherwise songs are post processed by download workers.
+        """
         self._ydlb = ytlb
+        self._rate_limiter = rate_limiter or AimdRateLimiter()
+        self._journal = journal or DownloadJournal(ytlb.tmp_dir / "journal.json")
+        self._postprocess_stage = postprocess_stage
+        self._proxy_pool = ytlb.proxy_pool
+        self._local = threading.local()
+
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        return self._rate_limiter
+
+    @property
+    def journal(self) -> DownloadJournal:
+        return self._journal
 
     def download(
         self,
-        videos: list[VideoId],
+        videos: Iterable[VideoId],
         tracker: ProgressBar | None = None,
+        workers: int = 1,
+        cancellation_token: CancellationToken | None = None,
+        lookahead: int = 0,
+        on_abandoned: Callable[[DownloadResult], None] | None = None,
     ) -> Generator[DownloadResult, None, None]:
         """
-        Download songs in best quality in current thread.
+        Download songs in best quality with a pool of worker threads.
         Downloads only songs (e.g skips videos).
+        :param videos: Video ids, are consumed lazily by workers.
+        :param tracker: Progress bar, shared between workers.
+        :param workers: Amount of worker threads, each of them owns YoutubeDL.
+        :param cancellation_token: Interrupts waiting for rate limiter,
+        workers don't start new downloads after kill was requested.
+        :param lookahead: Amount of next videos, which info is extracted
+        in background. Non-songs among them are filtered without downloading.
+        Results are yielded in completion order.
+        :param on_abandoned: Is called with results of downloads, which were
+        finished after consumer stopped iterating, so they aren't lost.
         """
-        ydl = self._ydlb.build()
-        if tracker is not None:
-            ydl.add_progress_hook(tracker.on_download_progress)
-            ydl.add_postprocessor_hook(tracker.on_postprocessor_progress)
+        if workers < 1:
+            raise ValueError(f"workers should be >= 1, got {workers}")
+        cancellation_token = cancellation_token or CancellationToken()
 
-        DELAY_BETWEEN_DOWNLOADED = 10
-        for video_id in videos:
+        video_ids = iter(videos)
+        prefetcher = (
+            InfoPrefetcher(
+                video_ids,
+                build_ydl=lambda: self._ydlb.build(
+                    post_process=False, proxy=self._pick_proxy()
+                ),
+                lookahead=lookahead,
+            )
+            if lookahead
+            else None
+        )
+        lock = threading.Lock()
+        stop = threading.Event()
+        # None marks, that worker has finished
+        results: queue.Queue[DownloadResult | _Postprocessed | None] = queue.Queue()
+        jobs: list[Future] = []
+
+        def next_video() -> tuple[VideoId, Future[PrefetchedInfo] | None] | None:
+            with lock:
+                if prefetcher is not None:
+                    return next(prefetcher, None)
+                video_id = next(video_ids, None)
+                return None if video_id is None else (video_id, None)
+
+        def get_prefetched(
+            video_id: VideoId, future: Future[PrefetchedInfo] | None
+        ) -> PrefetchedInfo | Filtered | None:
+            if prefetcher is None or future is None:
+                return None
             try:
-                if tracker is not None:
-                    tracker.new(video_id)
-                info = self._download_video(ydl, video_id)
-                yield Downloaded(video_id, info)
-                time.sleep(DELAY_BETWEEN_DOWNLOADED)
+                return prefetcher.get_prefetched(future)
             except SongFiltered as e:
-                yield Filtered(video_id, VideoInfo.parse_obj(e.info), str(e))
+                return Filtered(video_id, VideoInfo.parse_obj(e.info), str(e))
+
+        def postprocess(pending: _Postprocessing) -> None:
+            assert self._postprocess_stage is not None
+            try:
+                # blocks, if stage is behind
+                future = self._postprocess_stage.submit(pending.job)
             except Exception as e:
-                yield Error(video_id, e)
+                self._journal.finish(pending.video_id)
+                results.put(Error(pending.video_id, e))
+                return
+            with lock:
+                jobs.append(future)
+            future.add_done_callback(
+                lambda f: results.put(_Postprocessed(self._postprocessed(pending, f)))
+            )
+
+        def work():
+            try:
+                # one YoutubeDL per proxy, proxy is picked for each download
+                ydls: dict[str | None, YoutubeDL] = {}
+                while not stop.is_set():
+                    if (video := next_video()) is None:
+                        break
+                    video_id, future = video
+                    prefetched = get_prefetched(video_id, future)
+                    if isinstance(prefetched, Filtered):
+                        # non-songs don't take download slot
+                        results.put(prefetched)
+                        continue
+                    if not self._rate_limiter.acquire(cancellation_token):
+                        break
+                    # stream urls of prefetched info work only via its proxy
+                    proxy = (
+                        prefetched.proxy
+                        if prefetched is not None
+                        else self._pick_proxy()
+                    )
+                    if (ydl := ydls.get(proxy)) is None:
+                        ydl = ydls[proxy] = self._build_ydl(tracker, proxy)
+                    self._local.received_bytes = 0
+                    started = monotonic()
+                    result = self._download_one(
+                        ydl,
+                        video_id,
+                        tracker,
+                        prefetched.info if prefetched is not None else None,
+                    )
+                    self._on_proxy_used(proxy, result, monotonic() - started)
+                    match result:
+                        case Error():
+                            self._rate_limiter.on_error(result.error)
+                        case _:
+                            self._rate_limiter.on_success()
+                    if isinstance(result, _Postprocessing):
+                        postprocess(result)
+                    else:
+                        results.put(result)
             finally:
-                if tracker is not None:
-                    tracker.close(video_id)
+                results.put(None)
+
+        threads = [
+            threading.Thread(target=work, name=f"MusicDownloader-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        finished = 0
+        postprocessed = 0
+        try:
+            # when all workers are finished, amount of jobs doesn't change
+            while finished < len(threads) or postprocessed < len(jobs):
+                match results.get():
+                    case None:
+                        finished += 1
+                    case _Postprocessed(result):
+                        postprocessed += 1
+                        yield result
+                    case result:
+                        yield result
+        finally:
+            # consumer can stop iterating at any moment, workers are let
+            # to finish their current downloads
+            stop.set()
+            for thread in threads:
+                thread.join()
+            if prefetcher is not None:
+                prefetcher.close()
+                logger.info(f"Info prefetch stats: {prefetcher.stats}")
+            # workers are joined, so jobs don't change and their results
+            # (songs, already downloaded) will be put into queue
+            while finished < len(threads) or postprocessed < len(jobs):
+                match results.get():
+                    case None:
+                        finished += 1
+                    case _Postprocessed(result):
+                        postprocessed += 1
+                        self._abandon(result, on_abandoned)
+                    case result:
+                        self._abandon(result, on_abandoned)
+
+    @staticmethod
+    def _abandon(
+        result: DownloadResult,
+        on_abandoned: Callable[[DownloadResult], None] | None,
+    ) -> None:
+        logger.info(f"Result, got after consumer stopped: {result}")
+        if on_abandoned is None:
+            return
+        try:
+            on_abandoned(result)
+        except Exception:
+            logger.exception(f"Failed to handle abandoned result of {result.video_id}")
+
+    def _pick_proxy(self) -> str | None:
+        """None means proxy of builder."""
+        if self._proxy_pool is None:
+            return None
+        return self._proxy_pool.pick(download=True)
+
+    def _on_proxy_used(
+        self,
+        proxy: str | None,
+        result: DownloadResult | _Postprocessing,
+        seconds: float,
+    ) -> None:
+        if self._proxy_pool is None or proxy is None:
+            return
+        if isinstance(result, Error):
+            self._proxy_pool.on_error(proxy, result.error, seconds)
+        else:
+            received = getattr(self._local, "received_bytes", 0)
+            self._proxy_pool.on_download(proxy, seconds, received)
+
+    def _build_ydl(
+        self, tracker: ProgressBar | None, proxy: str | None = None
+    ) -> YoutubeDL:
+        ydl = self._ydlb.build(
+            post_process=self._postprocess_stage is None, proxy=proxy
+        )
+        ydl.add_progress_hook(self._on_download_progress)
+        if tracker is not None:
+            ydl.add_progress_hook(tracker.on_download_progress)
+            ydl.add_postprocessor_hook(tracker.on_postprocessor_progress)
+        return ydl
 
-    def _download_video(self, ydl: YoutubeDL, video_id: VideoId) -> SongInfo:
+    def _on_download_progress(self, progress: DownloadProgress) -> None:
+        if progress.get("status") == "finished":
+            # hooks are called by worker thread, that downloads
+            self._local.received_bytes = getattr(self._local, "received_bytes", 0) + (
+                progress.get("downloaded_bytes") or progress.get("total_bytes") or 0
+            )
+        if not is_progress_downloading(progress):
+            return
+        tmpfilename: str | None = progress.get("tmpfilename")  # type: ignore
+        if tmpfilename and (video_id := progress["info_dict"].get("id")):
+            self._journal.add_file(video_id, tmpfilename)
+
+    def _download_one(
+        self,
+        ydl: YoutubeDL,
+        video_id: VideoId,
+        tracker: ProgressBar | None,
+        prefetched_info: dict[str, Any] | None = None,
+    ) -> DownloadResult | _Postprocessing:
+        """
+        :param prefetched_info: If provided, info isn't extracted again.
+        """
+        self._journal.start(video_id)
+        try:
+            if tracker is not None:
+                tracker.new(video_id)
+            if self._postprocess_stage is not None:
+                raw_info = self._download_raw_info(ydl, video_id, prefetched_info)
+                job = self._ydlb.make_postprocess_job(raw_info)
+                return _Postprocessing(video_id, raw_info, job)
+            info = self._download_video(ydl, video_id, prefetched_info)
+            self._journal.finish(video_id)
+            return Downloaded(video_id, info)
+        except SongFiltered as e:
+            self._journal.finish(video_id)
+            return Filtered(video_id, VideoInfo.parse_obj(e.info), str(e))
+        except Exception as e:
+            self._ydlb.discard_prefetched(video_id)
+            # partly downloaded videos will be resumed by next batch
+            if not self._journal.files(video_id):
+                self._journal.finish(video_id)
+            return Error(video_id, e)
+        finally:
+            if tracker is not None:
+                tracker.close(video_id)
+
+    def _postprocessed(
+        self, pending: _Postprocessing, future: Future
+    ) -> DownloadResult:
+        """Makes result of song, which was post processed by PostprocessStage."""
+        video_id = pending.video_id
+        self._journal.finish(video_id)
+        try:
+            result: PostprocessResult = future.result()
+        except Exception as e:
+            return Error(video_id, e)
+        if result.converted:
+            self._ydlb.ffmpeg_stats.on_converted(video_id, result.cpu_seconds)
+        else:
+            self._ydlb.ffmpeg_stats.on_skipped(video_id)
+        info = pending.info | {"filepath": result.filepath, "ext": result.ext}
+        try:
+            return Downloaded(video_id, SongInfo.parse_obj(info))
+        except Exception as e:
+            return Error(video_id, e)
+
+    def _download_video(
+        self,
+        ydl: YoutubeDL,
+        video_id: VideoId,
+        prefetched_info: dict[str, Any] | None = None,
+    ) -> SongInfo:
+        return SongInfo.parse_obj(
+            self._download_raw_info(ydl, video_id, prefetched_info)
+        )
+
+    def _download_raw_info(
+        self,
+        ydl: YoutubeDL,
+        video_id: VideoId,
+        prefetched_info: dict[str, Any] | None = None,
+    ) -> dict[str, Any]:
         with ydl:
             # complete_as_* will be operated in progress_hook method after this
-            raw_info = ydl.extract_info(video_id, download=True)
-            return SongInfo.parse_obj(raw_info)
+            if prefetched_info is not None:
+                # the same way, as YoutubeDL.download_with_info_file does
+                info = YoutubeDL.sanitize_info(
+                    prefetched_info, remove_private_keys=True
+                )
+                raw_info = ydl.process_ie_result(info, download=True)
+            else:
+                raw_info = ydl.extract_info(video_id, download=True)
+            return raw_info  # type: ignore
 
-    def _clean_home_dir(self):
-        """Cleans home directory: removes *.part files."""
-        for path in self._ydlb.home_dir.glob("*.part"):
-            path.unlink(missing_ok=True)
+    def _clean_dirs(self):
+        """
+        Cleans home and tmp directories: removes stale *.part files.
+        Fresh ones are kept, so their downloads can be resumed.
+        Thumbnails, that weren't used for long, are removed too.
+        """
+        self._journal.collect_garbage([self._ydlb.home_dir, self._ydlb.tmp_dir])
+        self._ydlb.thumbnail_cache.collect_garbage()
 
     def __enter__(self):
-        self._clean_home_dir()
+        self._clean_dirs()
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self._clean_home_dir()
+        self._clean_dirs()
         return False
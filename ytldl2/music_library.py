@@ -1,28 +1,59 @@
 from __future__ import annotations
 
+import contextlib
+import itertools
 import logging
+import os
+import socket
+from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Callable, Iterable, Iterator
 
 from ytmusicapi import YTMusic
 
 from ytldl2.api import YtMusicApi
+from ytldl2.cached_ytmusic import CachedYTMusic
 from ytldl2.cancellation_tokens import CancellationToken
-from ytldl2.models.download_result import Downloaded, Filtered
+from ytldl2.lease_heartbeat import LeaseHeartbeat
+from ytldl2.models.download_result import (
+    Downloaded,
+    DownloadResult,
+    Error,
+    Filtered,
+)
 from ytldl2.models.home_items import HomeItems
 from ytldl2.models.song import Song
+from ytldl2.models.types import VideoId, WithVideoId, WithVideoIdT
+from ytldl2.models.video import Video
 from ytldl2.music_downloader import MusicDownloader
 from ytldl2.music_library_config import MusicLibraryConfig
+from ytldl2.postprocessing_stage import PostprocessStage
 from ytldl2.protocols.cache import Cache, CachedVideo
+from ytldl2.protocols.coordinator import Coordinator
+from ytldl2.protocols.job_queue import JobQueue
+from ytldl2.protocols.lyrics_cache import LyricsCache
+from ytldl2.protocols.playlist_snapshot_cache import PlaylistSnapshotCache
+from ytldl2.protocols.response_cache import ResponseCache
+from ytldl2.protocols.retry_cache import RetryCache
 from ytldl2.protocols.ui import Ui
-from ytldl2.proxies import to_proxies
+from ytldl2.proxy_pool import ProxyPool
+from ytldl2.retry_policy import RetryPolicy
+from ytldl2.session import session_build
+from ytldl2.song_classifier import SongClassifier
 from ytldl2.terminal.ui import TerminalUi
 from ytldl2.youtube_dl_builder import YoutubeDlBuilder
 
 logger = logging.getLogger(__name__)
 
 
-def ytmusic_build(auth, proxy: str | None) -> YTMusic:
-    return YTMusic(auth=auth, proxies=to_proxies(proxy=proxy))
+def ytmusic_build(
+    auth, proxy: str | None, proxy_pool: ProxyPool | None = None
+) -> YTMusic:
+    # requests time out, so threads of api pool aren't blocked by hung ones
+    return YTMusic(
+        auth=auth,
+        requests_session=session_build(proxy=proxy, proxy_pool=proxy_pool),
+    )
 
 
 class MusicLibrary:
@@ -36,22 +67,111 @@ class MusicLibrary:
         cancellation_token: CancellationToken,
         proxy: str | None,
         ui: Ui | None = None,
+        postprocess_stage: PostprocessStage | None = None,
+        api_cache: bool = True,
+        retry_policy: RetryPolicy | None = None,
+        coordinator: Coordinator | None = None,
+        worker_id: str | None = None,
+        proxy_pool: ProxyPool | None = None,
     ):
+        """
+        :param postprocess_stage: If provided, ffmpeg and metadata writing are
+        moved out of download workers into it.
+        :param api_cache: If True and cache can hold api responses,
+        youtube music api responses and lookups of playlists are cached.
+        :param retry_policy: If cache can hold retries, failed songs are retried
+        by it, instead of being retried by each update.
+        :param coordinator: If provided, songs are shared with other workers
+        (e.g. machines) via it: update() submits songs to it, and they are
+        downloaded by work() of all workers. It replaces job queue of cache.
+        :param worker_id: Name of this worker, by default host name and pid.
+        :param proxy_pool: If provided, each download and api request goes via
+        proxy, picked from it, instead of proxy.
+        """
         self._config = config
         self._cache = cache
         self._cancellation_token = cancellation_token
         self._ui = ui if ui else TerminalUi()
 
-        ytm = ytmusic_build(auth, proxy)
-        ytlb = YoutubeDlBuilder(home_dir=home_dir, tmp_dir=tmp_dir, proxy=proxy)
-        self._downloader = MusicDownloader(ytlb=ytlb)
-        self._api = YtMusicApi(ytm=ytm)
+        self._proxy_pool = proxy_pool
+        ytm = ytmusic_build(auth, proxy, proxy_pool)
+        self._cached_ytm: CachedYTMusic | None = None
+        if api_cache and isinstance(cache, ResponseCache):
+            self._cached_ytm = CachedYTMusic(ytm, cache)
+        ytlb = YoutubeDlBuilder(
+            home_dir=home_dir,
+            tmp_dir=tmp_dir,
+            proxy=proxy,
+            lyrics_cache=cache if isinstance(cache, LyricsCache) else None,
+            thumbnails_dir=tmp_dir / "thumbnails",
+            proxy_pool=proxy_pool,
+        )
+        self._ytlb = ytlb
+        self._downloader = MusicDownloader(
+            ytlb=ytlb, postprocess_stage=postprocess_stage
+        )
+        self._api = YtMusicApi(
+            ytm=self._cached_ytm or ytm,  # type: ignore
+            snapshots=cache if isinstance(cache, PlaylistSnapshotCache) else None,
+            lookups=cache if api_cache and isinstance(cache, ResponseCache) else None,
+        )
+        self._classifier = SongClassifier()
+        self._coordinator = coordinator
+        self._worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self._jobs = (
+            cache if isinstance(cache, JobQueue) and coordinator is None else None
+        )
+        self._retries = cache if isinstance(cache, RetryCache) else None
+        self._retry_policy = retry_policy or RetryPolicy()
+        self._home_fingerprint: str | None = None
 
-    def update(self, each_playlist_limit: int = 200):
+    def update(
+        self,
+        each_playlist_limit: int = 200,
+        workers: int = 1,
+        stream: bool = False,
+        lookahead: int = 0,
+    ):
         """
-        Updates library
+        Updates library. If cache is job queue, songs, left by interrupted
+        update, are downloaded first, before home page is got.
+        :param each_playlist_limit: How much songs to get from each playlist.
+        :param workers: Amount of songs, downloaded concurrently.
+        :param lookahead: Amount of next songs, which info is extracted
+        in background, while current ones are downloaded.
+        :param stream: If True, downloads start as soon as first playlist is got.
+        Songs are extracted by download workers, so cache should be thread safe.
         """
+        completed = False
+        try:
+            self._update(
+                each_playlist_limit=each_playlist_limit,
+                workers=workers,
+                stream=stream,
+                lookahead=lookahead,
+            )
+            completed = not self._cancellation_token.kill_requested
+        finally:
+            # playlists are synced from new snapshots only if their songs
+            # were downloaded, otherwise next update gets them again
+            if completed:
+                self._api.commit_snapshots()
+            else:
+                self._api.discard_snapshots()
+
+    def _update(
+        self,
+        each_playlist_limit: int,
+        workers: int,
+        stream: bool,
+        lookahead: int,
+    ) -> None:
         self._ui.library_update_started()
+        self._resume_jobs(workers=workers, lookahead=lookahead)
+        if self._cancellation_token.kill_requested:
+            self._log_cancel_requested()
+            return
+
         home_items = self._get_home_items()
 
         if self._cancellation_token.kill_requested:
@@ -59,18 +179,88 @@ class MusicLibrary:
             return
 
         self._review_home_items(home_items)
-        songs = self._extract_songs(home_items, each_playlist_limit=each_playlist_limit)
+        songs: Iterable[Song]
+        if stream:
+            songs = self._stream_songs(
+                home_items, each_playlist_limit=each_playlist_limit
+            )
+        else:
+            songs = self._extract_songs(
+                home_items, each_playlist_limit=each_playlist_limit
+            )
 
         if self._cancellation_token.kill_requested:
             self._log_cancel_requested()
             return
 
-        self._batch_download(songs)
+        if self._coordinator is not None:
+            submitted = self._coordinator.submit(songs)
+            logger.info(f"Submitted {submitted} songs to coordinator")
+            # songs are kept by coordinator, even if they aren't downloaded now
+            self._api.commit_snapshots()
+            self.work(workers=workers, lookahead=lookahead)
+            return
+        self._batch_download(songs, workers=workers, lookahead=lookahead)
+
+    def work(
+        self,
+        workers: int = 1,
+        lookahead: int = 0,
+        batch_size: int = 20,
+        lease_duration: timedelta = timedelta(minutes=10),
+    ) -> None:
+        """
+        Downloads songs, leased from coordinator by batches, until there is
+        nothing to lease. Results are reported back to coordinator.
+        :param batch_size: Amount of songs in one lease.
+        :param lease_duration: Lease is extended by heartbeats, while its songs
+        are downloaded. If worker dies, songs are leased by others after it.
+        """
+        if self._coordinator is None:
+            raise ValueError("work() needs coordinator")
+        coordinator = self._coordinator
+        while not self._cancellation_token.kill_requested:
+            lease = coordinator.lease(self._worker_id, batch_size, lease_duration)
+            if lease is None:
+                logger.info("Nothing to lease from coordinator")
+                return
+            logger.info(f"Leased {len(lease.songs)} songs: {lease.lease_id}")
+            leased = {song.video_id for song in lease.songs}
+
+            def report(result: DownloadResult) -> None:
+                # downloads, resumed from journal, aren't leased
+                if result.video_id in leased:
+                    coordinator.report(lease, result)
+
+            with LeaseHeartbeat(coordinator, lease, lease_duration) as heartbeat:
+                try:
+                    self._batch_download(
+                        self._while_leased(lease.songs, heartbeat),
+                        workers=workers,
+                        lookahead=lookahead,
+                        on_result=report,
+                    )
+                finally:
+                    # songs, that weren't downloaded due to cancel
+                    coordinator.release(lease)
+
+    @staticmethod
+    def _while_leased(songs: list[Song], heartbeat: LeaseHeartbeat) -> Iterator[Song]:
+        """
+        Yields songs of lease, until it's lost. Then songs are downloaded
+        by other worker, which leased them, so they aren't downloaded twice.
+        """
+        for i, song in enumerate(songs):
+            if heartbeat.lost:
+                logger.warning(f"Lease is lost, skipping {len(songs) - i} songs")
+                return
+            yield song
 
     def _get_home_items(self) -> HomeItems:
         """Gets home items from api. Filters out cached videos."""
         logger.info("Starting to get home items")
         home_items = self._api.get_home_items()
+        self._home_fingerprint = home_items.fingerprint()
         home_items.videos = self._cache.filter_cached(home_items.videos)
         logger.debug(f"Got home items: {home_items}")
         return home_items
@@ -102,54 +292,247 @@ class MusicLibrary:
             )
         )
         logger.debug(f"Got {len(videos)} videos: {videos}")
-        songs = [
-            Song(video_id=v.video_id, title=v.title, artist=v.artist)
-            for v in videos
-            if v.artist is not None
-        ]
-        logger.info(f"Got {len(songs)} unfiltered songs")
+        uncached = self._filter_due(self._cache.filter_cached(list(videos)))
+        logger.info(f"Got {len(uncached)} uncached videos")
 
-        songs = self._cache.filter_cached(songs)
+        songs = self._classify(uncached)
         logger.info(f"Got {len(songs)} filtered songs")
+        logger.info(f"Song classifier stats: {self._classifier}")
         return songs
 
+    def _stream_songs(
+        self, home_items: HomeItems, each_playlist_limit: int
+    ) -> Iterator[Song]:
+        """
+        Same as _extract_songs(), but yields uncached songs
+        batch by batch, as soon as each playlist is got.
+        """
+        seen: set[VideoId] = set()
+        for videos in self._api.iter_videos(
+            home_items=home_items, each_playlist_limit=each_playlist_limit
+        ):
+            if self._cancellation_token.kill_requested:
+                return
+            unseen = []
+            for v in videos:
+                if v.video_id in seen:
+                    continue
+                seen.add(v.video_id)
+                unseen.append(v)
+            songs = self._classify(self._filter_due(self._cache.filter_cached(unseen)))
+            logger.debug(f"Got {len(songs)} filtered songs from batch")
+            yield from songs
+        logger.info(f"Got {len(seen)} unfiltered videos")
+        logger.info(f"Song classifier stats: {self._classifier}")
+
+    def _classify(self, videos: list[Video]) -> list[Song]:
+        """
+        Rejects obvious non-songs without calling yt-dlp,
+        they are cached as filtered, so they are skipped by next updates too.
+        Videos without artist are skipped, but not cached,
+        artist may be known, when they are got next time.
+        """
+        songs: list[Song] = []
+        filtered: list[CachedVideo] = []
+        for v in videos:
+            if (reason := self._classifier.filtered_reason(v)) is not None:
+                filtered.append(
+                    CachedVideo(video_id=v.video_id, filtered_reason=reason)
+                )
+            elif v.artist is not None:
+                songs.append(Song(video_id=v.video_id, title=v.title, artist=v.artist))
+        if filtered:
+            logger.debug(f"Classified {len(filtered)} videos as non-songs")
+            self._cache.set_many(filtered)
+        return songs
+
+    def _filter_due(self, videos: list[WithVideoIdT]) -> list[WithVideoIdT]:
+        """Filters out failed videos, which are quarantined or not due for retry."""
+        if self._retries is None:
+            return videos
+        due = self._retries.filter_not_due(videos, datetime.now())
+        if skipped := len(videos) - len(due):
+            logger.info(f"Skipped {skipped} failed videos, not due for retry")
+        return due
+
+    def _update_retry(self, result: DownloadResult) -> None:
+        if self._retries is None:
+            return
+        if isinstance(result, Error):
+            previous = self._retries.get_retry(result.video_id)
+            state = self._retry_policy.on_error(
+                result.video_id, result.error, previous, datetime.now()
+            )
+            logger.info(f"Download of {result.video_id} failed: {state}")
+            self._retries.set_retry(state)
+        else:
+            self._retries.remove_retry(result.video_id)
+
     def _batch_download(
         self,
-        songs: list[Song],
+        songs: Iterable[Song],
+        workers: int = 1,
+        lookahead: int = 0,
+        on_result: Callable[[DownloadResult], None] | None = None,
     ):
+        """
+        :param songs: If it isn't list, it's consumed lazily by downloader.
+        If cache is job queue, songs are put into it and claimed from it.
+        :param on_result: Is called with each result, after it's cached.
+        """
+        if self._jobs is not None:
+            songs = self._queued(self._jobs, songs)
         batch_download_tracker = self._ui.batch_download_tracker()
-        batch_download_tracker.start(songs)
+        batch_download_tracker.start(songs if isinstance(songs, list) else None)
 
-        logger.info(f"Starting batch download of {len(songs)} songs")
+        count = f"{len(songs)}" if isinstance(songs, list) else "streamed"
+        logger.info(f"Starting batch download of {count} songs with {workers} workers")
         downloaded = 0
+        rate = self._downloader.rate_limiter.rate
+        batch_download_tracker.on_rate_changed(rate)
         with self._downloader:
-            for result in self._downloader.download(
-                videos=[s.video_id for s in songs],
+            resumed = self._resumed_video_ids()
+            videos = (s.video_id for s in songs if s.video_id not in resumed)
+            results = self._downloader.download(
+                videos=itertools.chain(resumed, videos),
                 tracker=self._ui.progress_bar(),
-            ):
-                logger.info(f"Got download result: {result}")
-                match result:
-                    case Downloaded():
+                workers=workers,
+                cancellation_token=self._cancellation_token,
+                lookahead=lookahead,
+                # downloads, finished after cancel, are saved too
+                on_abandoned=lambda result: self._save_result(result, on_result),
+            )
+            # closed explicitly, so abandoned results are saved before flush
+            with contextlib.closing(results):
+                for result in results:
+                    logger.info(f"Got download result: {result}")
+                    self._save_result(result, on_result)
+                    if isinstance(result, Downloaded):
                         downloaded += 1
-                        self._cache.set_info(result.info)
-                        self._cache.set(
-                            CachedVideo(video_id=result.video_id, filtered_reason=None)
-                        )
-                    case Filtered():
-                        self._cache.set(
-                            CachedVideo(
-                                video_id=result.video_id, filtered_reason=result.reason
-                            )
-                        )
-
-                batch_download_tracker.on_download_result(result)
-
-                if self._cancellation_token.kill_requested:
-                    self._log_cancel_requested()
-                    break
 
+                    batch_download_tracker.on_download_result(result)
+                    if (new_rate := self._downloader.rate_limiter.rate) != rate:
+                        rate = new_rate
+                        batch_download_tracker.on_rate_changed(rate)
+
+                    if self._cancellation_token.kill_requested:
+                        self._log_cancel_requested()
+                        break
+
+        if self._jobs is not None:
+            # songs, claimed but not downloaded due to cancel, stay queued
+            self._jobs.reclaim()
+        self._cache.flush()
         batch_download_tracker.end()
         logger.info(f"Batch download ended, downloaded {downloaded} songs")
+        logger.info(f"Lyrics cache stats: {self._ytlb.lyrics_stats}")
+        logger.info(f"Thumbnail cache stats: {self._ytlb.thumbnail_cache.stats}")
+        logger.info(f"ffmpeg stats: {self._ytlb.ffmpeg_stats}")
+        if self._cached_ytm is not None:
+            logger.info(f"Api cache stats: {self._cached_ytm.stats}")
+        logger.info(f"Api concurrency limit: {self._api.limiter.limit}")
+        if self._proxy_pool is not None:
+            logger.info(f"Proxy stats: {self._proxy_pool}")
+
+    def _save_result(
+        self,
+        result: DownloadResult,
+        on_result: Callable[[DownloadResult], None] | None = None,
+    ) -> None:
+        """Caches download result and marks its job finished."""
+        self._update_retry(result)
+        match result:
+            case Downloaded():
+                self._cache.set_info(result.info)
+                self._cache.set(
+                    CachedVideo(video_id=result.video_id, filtered_reason=None)
+                )
+            case Filtered():
+                self._cache.set(
+                    CachedVideo(video_id=result.video_id, filtered_reason=result.reason)
+                )
+        if self._jobs is not None:
+            state = "failed" if isinstance(result, Error) else "done"
+            self._jobs.finish(result.video_id, state)
+        if on_result is not None:
+            on_result(result)
+
+    def _resume_jobs(self, workers: int, lookahead: int) -> None:
+        """Downloads songs, which were queued, but not downloaded by last update."""
+        if self._jobs is None:
+            return
+        if reclaimed := self._jobs.reclaim():
+            logger.info(f"Reclaimed {reclaimed} jobs, orphaned by last update")
+        if not (pending := self._jobs.count_jobs("pending")):
+            return
+        logger.info(f"Resuming {pending} queued songs")
+        self._batch_download([], workers=workers, lookahead=lookahead)
+
+    def _queued(self, jobs: JobQueue, songs: Iterable[Song]) -> Iterable[Song]:
+        """
+        Enqueues songs and claims pending jobs, left ones go first.
+        Stream is enqueued song by song, as it's consumed.
+        """
+        if isinstance(songs, list):
+            jobs.enqueue(songs)
+            return self._claim_due(jobs)
+
+        def stream() -> Iterator[Song]:
+            yield from self._claim_due(jobs)
+            for song in songs:
+                jobs.enqueue([song])
+                yield from self._claim_due(jobs)
+
+        return stream()
+
+    def _claim_due(self, jobs: JobQueue) -> list[Song]:
+        """
+        Claims pending jobs. Jobs of songs, which failed and aren't due
+        for retry, are failed again, they are enqueued again by next update,
+        which gets them from home page.
+        """
+        claimed = jobs.claim()
+        due = self._filter_due(claimed)
+        if len(due) != len(claimed):
+            due_ids = {song.video_id for song in due}
+            for song in claimed:
+                if song.video_id not in due_ids:
+                    jobs.finish(song.video_id, "failed")
+        return due
+
+    def _resumed_video_ids(self) -> list[VideoId]:
+        """
+        Videos, which downloads were interrupted by previous batches.
+        Failed ones are resumed only when they are due for retry.
+        """
+        pending = [
+            WithVideoId(video_id=video_id)
+            for video_id in self._downloader.journal.pending()
+            if video_id not in self._cache
+        ]
+        resumed = [video.video_id for video in self._filter_due(pending)]
+        if resumed:
+            logger.info(f"Resuming {len(resumed)} interrupted downloads: {resumed}")
+        return resumed
+
+    def home_changed(self) -> bool:
+        """
+        Checks, whether home page changed since last update or check.
+        Home page is requested bypassing cache, so change is noticed
+        on first check after it, fresh response is cached for update.
+        Returns False, if library wasn't updated yet.
+        """
+        fingerprint = self._api.get_home_items(fresh=True).fingerprint()
+        changed = (
+            self._home_fingerprint is not None and fingerprint != self._home_fingerprint
+        )
+        self._home_fingerprint = fingerprint
+        return changed
+
+    def close(self) -> None:
+        """Releases resources, that are kept between updates."""
+        self._api.close()
+        self._ytlb.close()
 
     def _log_cancel_requested(self):
         logger.info("Stopping download: cancel was requested")
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import dataclasses
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from typing import Any
+
+from ytldl2.metadata import write_metadata
+from ytldl2.postprocessors import ExtractAudioPP
+from ytldl2.util.stats import FfmpegStats
+
+
+@dataclasses.dataclass(frozen=True)
+class PostprocessJob:
+    """CPU bound part of song post processing, should be picklable."""
+
+    info: dict[str, Any]
+    """Has at least "id", "filepath", "ext", "acodec", "duration"."""
+    metadata: dict[str, Any]
+    """Is written to file as is, see write_metadata."""
+
+
+@dataclasses.dataclass(frozen=True)
+class PostprocessResult:
+    filepath: str
+    ext: str
+    converted: bool
+    """If False, ffmpeg was skipped."""
+    cpu_seconds: float
+
+
+def postprocess(job: PostprocessJob) -> PostprocessResult:
+    """
+    Extracts audio with ffmpeg (if needed) and writes metadata with mutagen.
+    Is run in process pool, so it shouldn't depend on state of parent process.
+    """
+    stats = FfmpegStats()
+    files_to_delete, info = ExtractAudioPP(stats=stats).run(dict(job.info))
+    for file in files_to_delete:
+        os.remove(file)
+    write_metadata(info["filepath"], job.metadata)
+    return PostprocessResult(
+        filepath=info["filepath"],
+        ext=info["ext"],
+        converted=stats.converted > 0,
+        cpu_seconds=stats.cpu_seconds,
+    )
+
+
+class PostprocessStage:
+    """
+    Runs CPU heavy post processing (ffmpeg, mutagen) in a process pool,
+    separately from downloads, which are network bound.
+    Amount of pending jobs is bounded: if pool can't keep up with downloads,
+    submit blocks, so downloaded but not processed files don't pile up.
+    """
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        max_pending: int | None = None,
+        executor: Executor | None = None,
+    ) -> None:
+        """
+        :param max_workers: Amount of processes, by default amount of CPUs.
+        :param max_pending: Amount of submitted, but not finished jobs,
+        by default twice as much as max_workers.
+        :param executor: Overrides process pool, it's shut down on close.
+        """
+        max_workers = max_workers or os.cpu_count() or 1
+        # spawn doesn't inherit threads and locks of download workers
+        self._executor = executor or ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        self._slots = threading.BoundedSemaphore(max_pending or 2 * max_workers)
+
+    def submit(self, job: PostprocessJob) -> Future[PostprocessResult]:
+        """Blocks, while there are max_pending jobs in progress."""
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(postprocess, job)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def close(self) -> None:
+        """Waits for pending jobs."""
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> PostprocessStage:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
@@ -1,27 +1,73 @@
-from io import BytesIO
+import time
+from datetime import datetime, timedelta
 from typing import Any
 
-import requests
-from PIL import Image
 from yt_dlp.postprocessor import PostProcessor
+from yt_dlp.postprocessor.ffmpeg import FFmpegExtractAudioPP
 from ytmusicapi import YTMusic
 
 from ytldl2.metadata import write_metadata
+from ytldl2.metadata_prefetcher import MetadataPrefetcher
+from ytldl2.models.types import BrowseId, VideoId
+from ytldl2.protocols.lyrics_cache import CachedLyrics, LyricsCache
 from ytldl2.proxies import to_proxies
+from ytldl2.proxy_pool import ProxyPool
+from ytldl2.session import session_build
+from ytldl2.thumbnail_cache import ThumbnailCache
+from ytldl2.util.stats import FfmpegStats, HitMissStats
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
 
 
 class LyricsPP(PostProcessor):
     """
-    Gets lyrics and adds it to info
+    Gets lyrics and adds it to info.
+    If cache is provided, lyrics are read from it before going to network.
     """
 
-    def __init__(self, downloader=None, proxy: str | None = None):
+    def __init__(
+        self,
+        downloader=None,
+        proxy: str | None = None,
+        cache: LyricsCache | None = None,
+        no_lyrics_ttl: timedelta = timedelta(days=7),
+        stats: HitMissStats | None = None,
+        prefetcher: MetadataPrefetcher | None = None,
+        proxy_pool: ProxyPool | None = None,
+        yt: YTMusic | None = None,
+    ):
+        """
+        :param cache: Persistent lyrics cache, it's errors are logged and ignored.
+        :param no_lyrics_ttl: How long "no lyrics" results are kept in cache.
+        :param stats: Cache hit and miss counters, can be shared between instances.
+        :param prefetcher: If provided, lyrics are taken from it.
+        :param proxy_pool: If provided, it's used instead of proxy.
+        :param yt: If provided, it's used instead of proxy and proxy_pool,
+        so its session and open connections can be shared between instances.
+        """
         super().__init__(downloader)
-        self.yt = YTMusic(proxies=to_proxies(proxy=proxy))
+        if yt is not None:
+            self.yt = yt
+        elif proxy_pool is not None:
+            self.yt = YTMusic(
+                requests_session=session_build(proxy=None, proxy_pool=proxy_pool)
+            )
+        else:
+            self.yt = YTMusic(proxies=to_proxies(proxy=proxy))
+        self._cache = cache
+        self._no_lyrics_ttl = no_lyrics_ttl
+        self.stats = stats or HitMissStats()
+        self._prefetcher = prefetcher
 
     def run(self, info):
         video_id = info["id"]
-        lyrics = self.get_lyrics(video_id) or ""
+        if self._prefetcher is not None:
+            lyrics = self._prefetcher.lyrics(video_id) or ""
+        else:
+            lyrics = self.get_lyrics(video_id) or ""
         if lyrics:
             self.to_screen(f"Got lyrics with len={len(lyrics)}")
         else:
@@ -33,15 +79,64 @@ class LyricsPP(PostProcessor):
         """
         Shouldn't throw invalid key exception
         """
+        if (cached := self._get_cached(video_id)) is not None:
+            self.stats.hit()
+            return cached.lyrics
+        self.stats.miss()
 
         # type hints for get_watch_playlist are not very correct
         playlist = self.yt.get_watch_playlist(video_id)
 
         lyrics_browse_id: str | None = playlist.get("lyrics", None)  # type: ignore
-        if not lyrics_browse_id:
+        lyrics: str | None = None
+        if lyrics_browse_id:
+            self.write_debug(f"Got lyrics browseId={lyrics_browse_id}")
+            lyrics = self._get_lyrics_by_browse_id(BrowseId(lyrics_browse_id))
+        self._set_cached(VideoId(video_id), lyrics_browse_id, lyrics)
+        return lyrics
+
+    def _get_lyrics_by_browse_id(self, browse_id: BrowseId) -> str | None:
+        """Lyrics are looked up in cache, because several videos can share them."""
+        if (cached := self._get_cached_by_browse_id(browse_id)) is not None:
+            return cached.lyrics
+        return self.yt.get_lyrics(browse_id).get("lyrics")  # type: ignore
+
+    def _is_fresh(self, cached: CachedLyrics) -> bool:
+        if cached.lyrics is not None:
+            return True
+        return datetime.now() - cached.last_modified < self._no_lyrics_ttl
+
+    def _get_cached(self, video_id: str) -> CachedLyrics | None:
+        if self._cache is None:
+            return None
+        try:
+            cached = self._cache.get_lyrics(VideoId(video_id))
+        except Exception as e:
+            self.report_warning(f"Couldn't get lyrics from cache: {e}")
+            return None
+        return cached if cached is not None and self._is_fresh(cached) else None
+
+    def _get_cached_by_browse_id(self, browse_id: BrowseId) -> CachedLyrics | None:
+        if self._cache is None:
             return None
-        self.write_debug(f"Got lyrics browseId={lyrics_browse_id}")
-        return self.yt.get_lyrics(lyrics_browse_id).get("lyrics")
+        try:
+            cached = self._cache.get_lyrics_by_browse_id(browse_id)
+        except Exception as e:
+            self.report_warning(f"Couldn't get lyrics from cache: {e}")
+            return None
+        return cached if cached is not None and cached.lyrics is not None else None
+
+    def _set_cached(
+        self, video_id: VideoId, browse_id: str | None, lyrics: str | None
+    ) -> None:
+        if self._cache is None:
+            return
+        try:
+            self._cache.set_lyrics(
+                video_id, BrowseId(browse_id) if browse_id else None, lyrics
+            )
+        except Exception as e:
+            self.report_warning(f"Couldn't put lyrics into cache: {e}")
 
 
 class MetadataPP(PostProcessor):
@@ -53,19 +148,39 @@ class MetadataPP(PostProcessor):
     """
 
     def __init__(
-        self, with_lyrics_strict: bool = True, downloader=None, proxy: str | None = None
+        self,
+        with_lyrics_strict: bool = True,
+        downloader=None,
+        proxy: str | None = None,
+        thumbnails: ThumbnailCache | None = None,
+        prefetcher: MetadataPrefetcher | None = None,
     ):
         """
         :param with_lyrics_strict: If set to True, raises KeyError at run() method,
         if "lyrics" not in info.
         Adding LyricsPP as postprocessor before MetadataPP
         will propagate "lyrics" key.
+        :param thumbnails: Cache, that fetches and normalizes covers,
+        can be shared between instances.
+        By default in-memory cache with own session is used.
+        :param prefetcher: If provided, covers are taken from it.
         """
         super().__init__(downloader)
         self._with_lyrics_strict = with_lyrics_strict
-        self._proxy = proxy
+        self._thumbnails = thumbnails or ThumbnailCache(
+            session=session_build(proxy=proxy)
+        )
+        self._prefetcher = prefetcher
 
     def run(self, info: dict[str, Any]):
+        metadata = self.make_metadata(info)
+        filepath = info["filepath"]
+        self.write_metadata(filepath, metadata)
+
+        return [], info
+
+    def make_metadata(self, info: dict[str, Any]) -> dict[str, Any]:
+        """Collects metadata of song, cover is fetched (or taken from cache)."""
         if self._with_lyrics_strict and "lyrics" not in info:
             raise KeyError("'lyrics'")
         lyrics: str = info.get("lyrics", "")
@@ -82,23 +197,84 @@ class MetadataPP(PostProcessor):
         thumbnail = info.get(THUMBNAIL)
         if thumbnail:
             metadata[THUMBNAIL] = self.get_image_bytes(thumbnail)
-
-        filepath = info["filepath"]
-        self.write_metadata(filepath, metadata)
-
-        return [], info
+        return metadata
 
     def write_metadata(self, filepath: str, metadata):
         self.write_debug(f"Starting to write metadata to {filepath}")
         write_metadata(filepath, metadata)
         self.to_screen(f"Wrote metadata to {filepath}")
 
-    def get_image_bytes(self, url: str, format: str = "png") -> bytes:
-        response = requests.get(url, proxies=to_proxies(self._proxy))
-        img = Image.open(BytesIO(response.content))
-        img_jpg = BytesIO()
-        img.save(img_jpg, format=format)
-        return img_jpg.getvalue()
+    def get_image_bytes(self, url: str) -> bytes:
+        if self._prefetcher is not None:
+            return self._prefetcher.thumbnail(url)
+        return self._thumbnails.get(url)
+
+
+def _children_cpu_time() -> float:
+    """CPU time of finished child processes, falls back to wall time."""
+    if resource is None:
+        return time.perf_counter()
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class ExtractAudioPP(FFmpegExtractAudioPP):
+    """
+    FFmpegExtractAudioPP, that trusts audio codec reported by youtube.
+    Streams, which are already AAC in m4a, skip ffprobe,
+    AAC streams in other containers are remuxed without it.
+    """
+
+    AAC_CODECS = ("mp4a", "aac")
+
+    def __init__(
+        self,
+        downloader=None,
+        preferredcodec: str = "m4a",
+        stats: FfmpegStats | None = None,
+    ):
+        """
+        :param stats: ffmpeg CPU time accounting of each song, can be shared
+        between instances. CPU time is measured for child processes of the whole
+        process, so it's exact in PostprocessStage, where each process converts
+        one song at a time. When download workers convert several songs
+        in parallel, time of one song can include ffmpeg runs of others.
+        """
+        super().__init__(downloader, preferredcodec=preferredcodec)
+        self.stats = stats or FfmpegStats()
+        self._known_codec: str | None = None
+
+    def is_aac(self, info: dict[str, Any]) -> bool:
+        acodec = info.get("acodec") or ""
+        return acodec.startswith(self.AAC_CODECS)
+
+    def run(self, information):
+        if self.mapping == "m4a" and self.is_aac(information):
+            if information["ext"] == "m4a":
+                # yt-dlp would skip it too, but only after ffprobe
+                self.to_screen(
+                    f"Not converting audio {information['filepath']}; "
+                    "stream is already AAC in m4a"
+                )
+                self.stats.on_skipped(information["id"])
+                return [], information
+            # only remux, ffprobe isn't needed to find it out
+            self._known_codec = "aac"
+
+        started = _children_cpu_time()
+        try:
+            files_to_delete, information = super().run(information)
+        finally:
+            self._known_codec = None
+        # original file is returned to be deleted only if ffmpeg was run
+        if files_to_delete:
+            self.stats.on_converted(information["id"], _children_cpu_time() - started)
+        else:
+            self.stats.on_skipped(information["id"])
+        return files_to_delete, information
+
+    def get_audio_codec(self, path):
+        return self._known_codec or super().get_audio_codec(path)
 
 
 class SongFiltered(Exception):
@@ -124,6 +300,21 @@ class FilterSongPP(PostProcessor):
         return [], info
 
 
+class PrefetchMetadataPP(PostProcessor):
+    """
+    Starts fetching lyrics and cover in background, as soon as info is extracted.
+    Should be run after FilterSongPP, so videos aren't prefetched.
+    """
+
+    def __init__(self, prefetcher: MetadataPrefetcher, downloader=None):
+        super().__init__(downloader)
+        self._prefetcher = prefetcher
+
+    def run(self, info: dict[str, Any]):
+        self._prefetcher.prefetch(info["id"], info.get("thumbnail"))
+        return [], info
+
+
 class RetainMainArtistPP(PostProcessor):
     """
     Info "artist" tag, in case if there are multiple artists, holds value in format:
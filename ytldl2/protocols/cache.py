@@ -1,4 +1,4 @@
-from typing import Iterator, Protocol
+from typing import Iterable, Iterator, Protocol
 
 import pydantic
 from ytldl2.models.info import SongInfo
@@ -17,12 +17,24 @@ class Cache(Protocol):
         Should force dump data and close resources.
         """
 
+    def flush(self) -> None:
+        """
+        Should write pending data, if cache delays writes.
+        """
+
     def set(self, video: CachedVideo) -> None:
         ...
 
+    def set_many(self, videos: Iterable[CachedVideo]) -> None:
+        for video in videos:
+            self.set(video)
+
     def __getitem__(self, video_id: VideoId) -> CachedVideo | None:
         ...
 
+    def __contains__(self, video_id: object) -> bool:
+        return self[video_id] is not None  # type: ignore
+
     def __len__(self) -> int:
         ...
 
@@ -32,6 +44,10 @@ class Cache(Protocol):
     def set_info(self, video_info: SongInfo):
         ...
 
+    def set_infos(self, video_infos: Iterable[SongInfo]):
+        for video_info in video_infos:
+            self.set_info(video_info)
+
     def get_info(self, video_id: VideoId) -> SongInfo | None:
         ...
 
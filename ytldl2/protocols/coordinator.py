@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+from typing import Iterable, Protocol, runtime_checkable
+
+import pydantic
+from ytldl2.models.download_result import DownloadResult
+from ytldl2.models.song import Song
+
+
+class Lease(pydantic.BaseModel):
+    lease_id: str
+
+    worker_id: str
+
+    songs: list[Song]
+
+    expires_at: datetime
+    """After it, songs can be leased by other workers, unless heartbeat is sent."""
+
+
+@runtime_checkable
+class Coordinator(Protocol):
+    """
+    Distributes songs between workers (e.g. machines with own IPs),
+    which fill one library, so each song is downloaded once.
+    One worker submits songs, all of them lease songs by batches
+    and report download results back.
+    """
+
+    def submit(self, songs: Iterable[Song]) -> int:
+        """
+        Adds songs to be downloaded, songs, that were submitted before,
+        are skipped, unless they failed. Returns amount of new songs.
+        """
+        ...
+
+    def lease(self, worker_id: str, limit: int, duration: timedelta) -> Lease | None:
+        """
+        Leases up to limit songs, that aren't leased by other workers
+        or which leases are expired. Returns None, if there is nothing to lease.
+        """
+        ...
+
+    def heartbeat(self, lease: Lease, duration: timedelta) -> bool:
+        """
+        Extends lease by duration from now.
+        Returns False, if lease expired and songs were leased by other worker.
+        """
+        ...
+
+    def report(self, lease: Lease, result: DownloadResult) -> None:
+        """Reports result of leased song, it isn't leased anymore."""
+        ...
+
+    def release(self, lease: Lease) -> None:
+        """Returns songs of lease without results, so they can be leased again."""
+        ...
@@ -0,0 +1,39 @@
+from typing import Iterable, Literal, Protocol, runtime_checkable
+
+from ytldl2.models.song import Song
+from ytldl2.models.types import VideoId
+
+JobState = Literal["pending", "in_progress", "done", "failed"]
+
+
+@runtime_checkable
+class JobQueue(Protocol):
+    """
+    Durable queue of songs to download, so interrupted updates can be resumed
+    without crawling home page and playlists again.
+    Job of each song moves pending -> in_progress -> done or failed.
+    Done jobs are removed, failed ones are kept until they are enqueued again.
+    """
+
+    def enqueue(self, songs: Iterable[Song]) -> int:
+        """
+        Adds songs as pending jobs, songs, that are pending or in progress, are
+        skipped. Done and failed jobs are pending again.
+        Returns amount of new pending jobs.
+        """
+        ...
+
+    def claim(self, limit: int | None = None) -> list[Song]:
+        """Marks up to limit oldest pending jobs as in progress, returns them."""
+        ...
+
+    def finish(self, video_id: VideoId, state: Literal["done", "failed"]) -> None: ...
+
+    def reclaim(self) -> int:
+        """
+        Returns jobs in progress to pending, e.g. ones orphaned by crash.
+        Returns amount of reclaimed jobs.
+        """
+        ...
+
+    def count_jobs(self, state: JobState) -> int: ...
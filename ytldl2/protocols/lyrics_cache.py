@@ -0,0 +1,30 @@
+from datetime import datetime
+from typing import Protocol, runtime_checkable
+
+import pydantic
+from ytldl2.models.types import BrowseId, VideoId
+
+
+class CachedLyrics(pydantic.BaseModel):
+    video_id: VideoId
+
+    browse_id: BrowseId | None
+    """Lyrics browseId, None if video has no lyrics."""
+
+    lyrics: str | None
+    """None if video has no lyrics or browseId has no lyrics."""
+
+    last_modified: datetime
+
+
+@runtime_checkable
+class LyricsCache(Protocol):
+    def get_lyrics(self, video_id: VideoId) -> CachedLyrics | None: ...
+
+    def get_lyrics_by_browse_id(self, browse_id: BrowseId) -> CachedLyrics | None:
+        """Returns lyrics, cached for any video with this browseId."""
+        ...
+
+    def set_lyrics(
+        self, video_id: VideoId, browse_id: BrowseId | None, lyrics: str | None
+    ) -> None: ...
@@ -0,0 +1,96 @@
+import hashlib
+from datetime import datetime
+from typing import Protocol, runtime_checkable
+
+import pydantic
+from ytldl2.models.types import PlaylistId, VideoId
+
+
+class PlaylistSnapshot(pydantic.BaseModel):
+    playlist_id: PlaylistId
+
+    video_ids: list[VideoId]
+    """Ordered as in playlist, can be limited."""
+
+    track_count: int | None
+    """Amount of tracks in whole playlist, if it's known."""
+
+    hash: str
+    """Hash of video_ids, see hash_of()."""
+
+    last_modified: datetime
+
+    last_full_sync: datetime
+    """When whole playlist was fetched last time, incremental syncs keep it."""
+
+    @staticmethod
+    def hash_of(video_ids: list[VideoId]) -> str:
+        return hashlib.sha256("\n".join(video_ids).encode()).hexdigest()
+
+    @classmethod
+    def of(
+        cls,
+        playlist_id: PlaylistId,
+        video_ids: list[VideoId],
+        track_count: int | None,
+        last_full_sync: datetime | None = None,
+    ) -> "PlaylistSnapshot":
+        """
+        :param last_full_sync: None means, that snapshot is taken by full sync.
+        """
+        now = datetime.now()
+        return cls(
+            playlist_id=playlist_id,
+            video_ids=video_ids,
+            track_count=track_count,
+            hash=cls.hash_of(video_ids),
+            last_modified=now,
+            last_full_sync=last_full_sync or now,
+        )
+
+    def new_video_ids(
+        self, page: list[VideoId], track_count: int | None, complete: bool
+    ) -> list[VideoId] | None:
+        """
+        Finds videos, added to playlist since snapshot was taken,
+        by first page of playlist.
+        :param page: Video ids from the beginning of playlist.
+        :param track_count: Amount of tracks in whole playlist, if it's known.
+        :param complete: If True, page holds whole playlist.
+        :return: New video ids, or None, if page isn't enough to find them out,
+        so whole playlist should be fetched.
+        """
+        known = set(self.video_ids)
+        if complete:
+            return [id for id in page if id not in known]
+        if (
+            track_count == self.track_count
+            and len(page) >= len(self.video_ids)
+            and self.hash_of(page[: len(self.video_ids)]) == self.hash
+        ):
+            return []
+        # new tracks are prepended, e.g. to "Your Likes"
+        if not self.video_ids or self.video_ids[0] not in page:
+            return None
+        head = page.index(self.video_ids[0])
+        rest = page[head:]
+        if rest != self.video_ids[: len(rest)]:
+            # tracks were reordered or removed
+            return None
+        if (
+            track_count is not None
+            and self.track_count is not None
+            and track_count != self.track_count + head
+        ):
+            # tracks were also added after first page
+            return None
+        return [id for id in page[:head] if id not in known]
+
+
+@runtime_checkable
+class PlaylistSnapshotCache(Protocol):
+    def get_playlist_snapshot(
+        self, playlist_id: PlaylistId
+    ) -> PlaylistSnapshot | None: ...
+
+    def set_playlist_snapshot(self, snapshot: PlaylistSnapshot) -> None: ...
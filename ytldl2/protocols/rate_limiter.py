@@ -0,0 +1,25 @@
+from typing import Protocol
+
+from ytldl2.cancellation_tokens import CancellationToken
+
+
+class RateLimiter(Protocol):
+    """Paces downloads, is shared between download workers."""
+
+    @property
+    def rate(self) -> float:
+        """Current rate, in downloads per second."""
+        ...
+
+    def acquire(self, cancellation_token: CancellationToken) -> bool:
+        """
+        Blocks until next download is allowed.
+        Returns False, if kill was requested while waiting.
+        """
+        ...
+
+    def on_success(self) -> None:
+        """Called after a download was processed without errors."""
+
+    def on_error(self, error: Exception) -> None:
+        """Called after a download failed."""
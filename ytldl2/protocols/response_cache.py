@@ -0,0 +1,13 @@
+from datetime import timedelta
+from typing import Any, Protocol, runtime_checkable
+
+
+@runtime_checkable
+class ResponseCache(Protocol):
+    """Cache of api responses, which can be serialized to json."""
+
+    def get_response(self, key: str, max_age: timedelta) -> Any | None:
+        """Returns None, if response isn't cached or it's older than max_age."""
+        ...
+
+    def set_response(self, key: str, response: Any) -> None: ...
@@ -0,0 +1,45 @@
+from datetime import datetime
+from typing import Literal, Protocol, runtime_checkable
+
+import pydantic
+from ytldl2.models.types import VideoId, WithVideoIdT
+
+ErrorKind = Literal["transient", "rate_limited", "permanent"]
+
+
+class RetryState(pydantic.BaseModel):
+    video_id: VideoId
+
+    kind: ErrorKind
+    """Kind of last error."""
+
+    error: str
+
+    attempts: int
+    """Amount of failed attempts, rate limited ones aren't counted."""
+
+    next_attempt: datetime | None
+    """Video isn't downloaded until then. None, if video is quarantined."""
+
+    @property
+    def quarantined(self) -> bool:
+        return self.next_attempt is None
+
+
+@runtime_checkable
+class RetryCache(Protocol):
+    """Failed downloads, which are retried later."""
+
+    def get_retry(self, video_id: VideoId) -> RetryState | None: ...
+
+    def set_retry(self, state: RetryState) -> None: ...
+
+    def remove_retry(self, video_id: VideoId) -> None:
+        """Should be called, when download finally succeeded."""
+        ...
+
+    def filter_not_due(
+        self, videos: list[WithVideoIdT], now: datetime
+    ) -> list[WithVideoIdT]:
+        """Filters out videos, which are quarantined or not due for retry yet."""
+        ...
@@ -33,13 +33,23 @@ class HomeItemsReviewer(Protocol):
 
 
 class BatchDownloadTracker(Protocol):
-    def start(self, songs: list[Song]):
-        """Called by library before batch starts."""
+    def start(self, songs: list[Song] | None):
+        """
+        Called by library before batch starts.
+        :param songs: None, if songs are streamed and aren't known beforehand.
+        """
 
     def on_download_result(self, result: DownloadResult):
         """Called by library on each download result."""
         ...
 
+    def on_rate_changed(self, rate: float):
+        """
+        Called by library, when downloads rate limiter changed it's rate.
+        :param rate: Downloads per second.
+        """
+        ...
+
     def end(self):
         """Called by library after batch ends."""
         ...
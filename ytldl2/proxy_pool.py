@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import json
+import logging
+import pathlib
+import random
+import threading
+import urllib.parse
+from datetime import timedelta
+from time import monotonic
+from typing import Any
+
+import requests
+
+from ytldl2.rate_limiter import is_throttling_error
+
+logger = logging.getLogger(__name__)
+
+DIRECT = ""
+"""Proxy, that means direct connection, the same way as in yt-dlp."""
+
+
+def redact(proxy: str) -> str:
+    """Hides credentials of proxy, so it can be logged."""
+    if proxy == DIRECT:
+        return "direct"
+    parsed = urllib.parse.urlsplit(proxy)
+    if parsed.password is None and parsed.username is None:
+        return proxy
+    netloc = f"***@{parsed.hostname}" + (f":{parsed.port}" if parsed.port else "")
+    return urllib.parse.urlunsplit(parsed._replace(netloc=netloc))
+
+
+class ProxyStats:
+    """Counters of one proxy. Should be used under lock of pool."""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.latency: float | None = None
+        """Exponentially smoothed duration of api requests."""
+        self.throughput: float | None = None
+        """Exponentially smoothed bytes per second of downloads."""
+        self.error_rate = 0.0
+        """Exponentially smoothed rate of errors."""
+        self.consecutive_throttled = 0
+        self.quarantined_until: float | None = None
+        """Monotonic time, until which proxy is out of rotation."""
+
+    def __str__(self) -> str:
+        return (
+            f"requests={self.requests}, errors={self.errors}, "
+            f"throttled={self.throttled}, "
+            f"error_rate={self.errors / self.requests if self.requests else 0:.2f}, "
+            f"bytes_per_second={self.throughput or 0:.0f}, "
+            f"latency={self.latency or 0:.2f}s"
+        )
+
+
+class ProxyPool:
+    """
+    Picks proxy for each download by its health and throughput,
+    and for each api request by its health and latency.
+    Proxy, which was throttled (HTTP 429) several times in a row,
+    is taken out of rotation for a while and is tried again after it.
+    """
+
+    def __init__(
+        self,
+        proxies: list[str | None],
+        quarantine_after: int = 3,
+        quarantine: timedelta = timedelta(minutes=15),
+        smoothing: float = 0.3,
+    ) -> None:
+        """
+        :param proxies: Proxy urls, None or "" means direct connection.
+        :param quarantine_after: Amount of throttling errors in a row,
+        after which proxy is quarantined.
+        :param quarantine: How long quarantined proxy isn't picked.
+        :param smoothing: Weight of last request in latency, throughput
+        and error rate.
+        """
+        if not proxies:
+            raise ValueError("proxy pool should have at least one proxy")
+        self._proxies = list(dict.fromkeys(proxy or DIRECT for proxy in proxies))
+        self._quarantine_after = quarantine_after
+        self._quarantine = quarantine.total_seconds()
+        self._smoothing = smoothing
+        self._lock = threading.Lock()
+        self._stats = {proxy: ProxyStats() for proxy in self._proxies}
+
+    @classmethod
+    def load(cls, path: pathlib.Path, **kwargs) -> ProxyPool:
+        """Loads pool from json file with list of proxy urls."""
+        proxies = json.loads(path.read_text(encoding="utf-8"))
+        if not isinstance(proxies, list):
+            raise ValueError(f"{path} should contain json list of proxies")
+        return cls(proxies, **kwargs)
+
+    @property
+    def proxies(self) -> list[str]:
+        return list(self._proxies)
+
+    def pick(self, download: bool = False) -> str:
+        """
+        Picks proxy randomly, healthy and fast proxies are picked more often.
+        If all proxies are quarantined, the one, released first, is picked.
+        :param download: Whether proxy is picked for download, then it's scored
+        by throughput, otherwise by latency.
+        """
+        now = monotonic()
+        with self._lock:
+            available = [
+                proxy
+                for proxy in self._proxies
+                if (until := self._stats[proxy].quarantined_until) is None
+                or until <= now
+            ]
+            if not available:
+                return min(
+                    self._proxies,
+                    key=lambda proxy: self._stats[proxy].quarantined_until or 0,
+                )
+            stats = [self._stats[proxy] for proxy in available]
+            weights = (
+                self._throughput_weights(stats)
+                if download
+                else [self._latency_weight(s) for s in stats]
+            )
+        return random.choices(available, weights)[0]
+
+    @staticmethod
+    def _latency_weight(stats: ProxyStats) -> float:
+        # unknown proxies are tried as if they were average
+        latency = stats.latency if stats.latency is not None else 1.0
+        return max(1 - stats.error_rate, 0.05) / max(latency, 0.05)
+
+    @staticmethod
+    def _throughput_weights(stats: list[ProxyStats]) -> list[float]:
+        known = [s.throughput for s in stats if s.throughput is not None]
+        # unknown proxies are tried as if they were average
+        average = sum(known) / len(known) if known else 1.0
+        return [
+            max(1 - s.error_rate, 0.05)
+            * max(s.throughput if s.throughput is not None else average, 1.0)
+            for s in stats
+        ]
+
+    def on_success(self, proxy: str, seconds: float, size: int = 0) -> None:
+        """
+        Records successful api request.
+        :param seconds: Duration of request.
+        :param size: Amount of received bytes.
+        """
+        with self._lock:
+            stats = self._succeeded(proxy, seconds, size)
+            if stats is not None:
+                stats.latency = self._smooth(stats.latency, seconds)
+
+    def on_download(self, proxy: str, seconds: float, size: int) -> None:
+        """
+        Records successful download.
+        :param seconds: Duration of download.
+        :param size: Amount of received bytes, if nothing was received,
+        throughput isn't changed.
+        """
+        with self._lock:
+            stats = self._succeeded(proxy, seconds, size)
+            if stats is not None and size and seconds > 0:
+                stats.throughput = self._smooth(stats.throughput, size / seconds)
+
+    def _succeeded(self, proxy: str, seconds: float, size: int) -> ProxyStats | None:
+        """Updates counters and health of proxy. Should be called under lock."""
+        stats = self._stats.get(proxy)
+        if stats is None:
+            return None
+        stats.requests += 1
+        stats.bytes += size
+        stats.seconds += seconds
+        stats.error_rate = self._smooth(stats.error_rate, 0.0)
+        stats.consecutive_throttled = 0
+        stats.quarantined_until = None
+        return stats
+
+    def on_error(self, proxy: str, error: BaseException, seconds: float = 0) -> None:
+        throttled = is_throttling_error(error)
+        with self._lock:
+            stats = self._stats.get(proxy)
+            if stats is None:
+                return
+            stats.requests += 1
+            stats.errors += 1
+            stats.seconds += seconds
+            stats.error_rate = self._smooth(stats.error_rate, 1.0)
+            if not throttled:
+                return
+            stats.throttled += 1
+            stats.consecutive_throttled += 1
+            if stats.consecutive_throttled < self._quarantine_after:
+                return
+            stats.consecutive_throttled = 0
+            stats.quarantined_until = monotonic() + self._quarantine
+        logger.warning(
+            f"Proxy {redact(proxy)} is throttled, "
+            f"it's quarantined for {self._quarantine:.0f}s"
+        )
+
+    def _smooth(self, value: float | None, sample: float) -> float:
+        if value is None:
+            return sample
+        return (1 - self._smoothing) * value + self._smoothing * sample
+
+    def __str__(self) -> str:
+        with self._lock:
+            return "; ".join(
+                f"{redact(proxy)}: {stats}" for proxy, stats in self._stats.items()
+            )
+
+
+class ProxyPoolSession(requests.Session):
+    """
+    Session, that sends each request via proxy, picked from pool.
+    Only throttling, server and connection errors are counted against proxy,
+    other errors, like 404, are caused by request itself.
+    """
+
+    def __init__(self, pool: ProxyPool) -> None:
+        super().__init__()
+        self.pool = pool
+
+    def request(self, method, url, *args, **kwargs) -> Any:  # type: ignore[override]
+        proxy = self.pool.pick()
+        if proxy != DIRECT:
+            kwargs["proxies"] = {"http": proxy, "https": proxy}
+        started = monotonic()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            self.pool.on_error(proxy, e, monotonic() - started)
+            raise
+        seconds = monotonic() - started
+        if response.status_code == 429 or response.status_code >= 500:
+            error = requests.HTTPError(
+                f"HTTP Error {response.status_code}: {response.reason}"
+            )
+            self.pool.on_error(proxy, error, seconds)
+        else:
+            size = int(response.headers.get("Content-Length") or 0)
+            if not kwargs.get("stream"):
+                size = len(response.content)
+            self.pool.on_success(proxy, seconds, size)
+        return response
@@ -0,0 +1,102 @@
+import logging
+import re
+import threading
+from time import monotonic
+
+from ytldl2.cancellation_tokens import CancellationToken
+from ytldl2.protocols.rate_limiter import RateLimiter
+from ytldl2.util.time import sleep_with_cancel
+
+logger = logging.getLogger(__name__)
+
+_THROTTLING_RE = re.compile(
+    r"HTTP Error (429|403)|Too Many Requests|rate[- ]limit", re.IGNORECASE
+)
+
+
+def is_throttling_error(error: BaseException) -> bool:
+    """Checks, if error (or any of it's causes) looks like YouTube throttling."""
+    e: BaseException | None = error
+    while e is not None:
+        if _THROTTLING_RE.search(str(e)):
+            return True
+        e = e.__cause__ or e.__context__
+    return False
+
+
+class AimdRateLimiter(RateLimiter):
+    """
+    Token bucket, which rate is controlled by AIMD algorithm:
+    rate grows additively while downloads succeed and
+    is cut multiplicatively on throttling errors.
+    """
+
+    def __init__(
+        self,
+        initial_rate: float = 0.1,
+        min_rate: float = 1 / 300,
+        max_rate: float = 0.5,
+        increase: float = 0.01,
+        decrease: float = 0.5,
+        burst: float = 1,
+    ) -> None:
+        """
+        :param initial_rate: Downloads per second at start.
+        :param min_rate: Rate won't go below this value.
+        :param max_rate: Rate won't go above this value.
+        :param increase: Added to rate after each successful download.
+        :param decrease: Rate is multiplied by it after each throttling error.
+        :param burst: Max amount of downloads, that can start without waiting.
+        """
+        if not 0 < min_rate <= initial_rate <= max_rate:
+            raise ValueError("should be 0 < min_rate <= initial_rate <= max_rate")
+        if not 0 < decrease < 1:
+            raise ValueError("decrease should be in (0, 1)")
+
+        self._min_rate = min_rate
+        self._max_rate = max_rate
+        self._increase = increase
+        self._decrease = decrease
+        self._burst = burst
+
+        self._lock = threading.Lock()
+        self._rate = initial_rate
+        self._tokens = burst
+        self._updated = monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    def acquire(self, cancellation_token: CancellationToken) -> bool:
+        while not cancellation_token.kill_requested:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self._rate
+            sleep_with_cancel(wait, cancellation_token, step=0.5)
+        return False
+
+    def on_success(self) -> None:
+        with self._lock:
+            self._refill()
+            self._rate = min(self._max_rate, self._rate + self._increase)
+
+    def on_error(self, error: Exception) -> None:
+        if not is_throttling_error(error):
+            return
+        with self._lock:
+            self._refill()
+            self._rate = max(self._min_rate, self._rate * self._decrease)
+            self._tokens = 0
+        logger.info(f"Throttling detected, rate decreased to {self._rate:.4f}/s")
+
+    def _refill(self) -> None:
+        """Should be called under lock."""
+        now = monotonic()
+        self._tokens = min(
+            self._burst, self._tokens + (now - self._updated) * self._rate
+        )
+        self._updated = now
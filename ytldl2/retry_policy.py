@@ -0,0 +1,110 @@
+import logging
+import re
+from datetime import datetime, timedelta
+from typing import Iterator
+
+from yt_dlp.utils import DownloadError, GeoRestrictedError, UnavailableVideoError
+
+from ytldl2.models.types import VideoId
+from ytldl2.protocols.retry_cache import ErrorKind, RetryState
+from ytldl2.rate_limiter import is_throttling_error
+
+logger = logging.getLogger(__name__)
+
+_PERMANENT_RE = re.compile(
+    r"Video unavailable|Private video|not available in your country"
+    r"|blocked it in your country|has been removed|account .* terminated"
+    r"|copyright claim|members-only|Join this channel|confirm your age",
+    re.IGNORECASE,
+)
+
+
+def _causes(error: BaseException) -> Iterator[BaseException]:
+    e: BaseException | None = error
+    while e is not None:
+        yield e
+        if isinstance(e, DownloadError) and e.exc_info and e.exc_info[1] is not e:
+            e = e.exc_info[1]
+        else:
+            e = e.__cause__ or e.__context__
+
+
+def classify_error(error: BaseException) -> ErrorKind:
+    """
+    Classifies download error: permanent errors (e.g. unavailable
+    or region locked video) won't go away by retrying, other ones may.
+    """
+    if is_throttling_error(error):
+        return "rate_limited"
+    for e in _causes(error):
+        if isinstance(e, (GeoRestrictedError, UnavailableVideoError)):
+            return "permanent"
+        if _PERMANENT_RE.search(str(e)):
+            return "permanent"
+    return "transient"
+
+
+class RetryPolicy:
+    """
+    Exponential backoff of failed downloads. Videos, that fail too many times,
+    are quarantined, so they don't cost extractor calls on each update.
+    """
+
+    def __init__(
+        self,
+        base_delay: timedelta = timedelta(hours=1),
+        max_delay: timedelta = timedelta(days=7),
+        max_attempts: int = 6,
+        max_permanent_attempts: int = 2,
+        rate_limited_delay: timedelta = timedelta(minutes=30),
+    ) -> None:
+        """
+        :param base_delay: Delay after first failure, it's doubled by each next one.
+        :param max_delay: Delay won't exceed it.
+        :param max_attempts: Video is quarantined after this amount of failures.
+        :param max_permanent_attempts: Same, but for permanent errors, they are
+        retried a bit anyway, in case they were classified wrong.
+        :param rate_limited_delay: Rate limited attempts aren't counted,
+        video is just retried after this delay.
+        """
+        if max_attempts < 1 or max_permanent_attempts < 1:
+            raise ValueError("max attempts should be >= 1")
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._max_attempts = max_attempts
+        self._max_permanent_attempts = max_permanent_attempts
+        self._rate_limited_delay = rate_limited_delay
+
+    def on_error(
+        self,
+        video_id: VideoId,
+        error: BaseException,
+        previous: RetryState | None,
+        now: datetime,
+    ) -> RetryState:
+        """Returns retry state of video after it failed with error."""
+        kind = classify_error(error)
+        attempts = previous.attempts if previous is not None else 0
+        next_attempt: datetime | None
+        if kind == "rate_limited":
+            next_attempt = now + self._rate_limited_delay
+        else:
+            attempts += 1
+            max_attempts = (
+                self._max_permanent_attempts
+                if kind == "permanent"
+                else self._max_attempts
+            )
+            if attempts >= max_attempts:
+                logger.info(f"Quarantining {video_id} after {attempts} attempts")
+                next_attempt = None
+            else:
+                delay = min(self._base_delay * 2 ** (attempts - 1), self._max_delay)
+                next_attempt = now + delay
+        return RetryState(
+            video_id=video_id,
+            kind=kind,
+            error=str(error),
+            attempts=attempts,
+            next_attempt=next_attempt,
+        )
@@ -0,0 +1,46 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+from ytldl2.proxies import to_proxies
+from ytldl2.proxy_pool import ProxyPool, ProxyPoolSession
+
+
+class _TimeoutHTTPAdapter(HTTPAdapter):
+    """Applies default timeout to requests, which don't set own one."""
+
+    def __init__(self, *args, timeout: float | None = None, **kwargs) -> None:
+        self._timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, timeout=None, **kwargs):  # type: ignore[override]
+        if timeout is None:
+            timeout = self._timeout
+        return super().send(request, timeout=timeout, **kwargs)
+
+
+def session_build(
+    proxy: str | None,
+    pool_maxsize: int = 16,
+    proxy_pool: ProxyPool | None = None,
+    timeout: float | None = 30,
+) -> requests.Session:
+    """
+    Builds session with keep-alive connection pool, that can be shared
+    between threads.
+    :param pool_maxsize: Max amount of kept connections per host.
+    :param proxy_pool: If provided, each request is sent via proxy, picked
+    from it, instead of proxy.
+    :param timeout: Default connect and read timeout of requests in seconds,
+    so hung request doesn't block its thread forever.
+    """
+    session = (
+        ProxyPoolSession(proxy_pool) if proxy_pool is not None else requests.Session()
+    )
+    adapter = _TimeoutHTTPAdapter(
+        pool_connections=pool_maxsize, pool_maxsize=pool_maxsize, timeout=timeout
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if proxy_pool is None and (proxies := to_proxies(proxy=proxy)):
+        session.proxies.update(proxies)
+    return session
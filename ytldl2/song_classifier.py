@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import collections
+import threading
+
+from ytldl2.models.video import Video
+
+
+class SongClassifier:
+    """
+    Classifies videos by metadata, got from youtube music api, before yt-dlp
+    is called. Only obvious non-songs (by video type) are rejected, the rest
+    is left for FilterSongPP. Every rejected video is one avoided extractor call.
+    """
+
+    NOT_SONG_VIDEO_TYPES = {
+        "MUSIC_VIDEO_TYPE_UGC": "it's user generated video, not a song",
+        "MUSIC_VIDEO_TYPE_PODCAST_EPISODE": "it's podcast episode, not a song",
+    }
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._avoided_calls: collections.Counter[str] = collections.Counter()
+
+    @property
+    def avoided_calls(self) -> int:
+        """Amount of videos, rejected without calling yt-dlp."""
+        return sum(self._avoided_calls.values())
+
+    def filtered_reason(self, video: Video) -> str | None:
+        """Returns reason, why video isn't a song, or None, if it may be a song."""
+        if video.video_type not in self.NOT_SONG_VIDEO_TYPES:
+            return None
+        reason = self.NOT_SONG_VIDEO_TYPES[video.video_type]
+        with self._lock:
+            self._avoided_calls[reason] += 1
+        return reason
+
+    def __str__(self) -> str:
+        with self._lock:
+            return (
+                f"avoided_calls={sum(self._avoided_calls.values())}, "
+                f"reasons={dict(self._avoided_calls)}"
+            )
@@ -1,55 +1,183 @@
+from __future__ import annotations
+
+import json
 import pathlib
 import sqlite3
-from datetime import datetime
-from typing import Iterator, Literal
+import threading
+import uuid
+import zlib
+from datetime import datetime, timedelta
+from time import monotonic
+from typing import Any, Iterable, Iterator, Literal
 
 from ytldl2.models.info import SongInfo
-from ytldl2.models.types import VideoId
+from ytldl2.models.song import Song
+from ytldl2.models.types import (
+    Artist,
+    BrowseId,
+    PlaylistId,
+    Title,
+    VideoId,
+    WithVideoIdT,
+)
 from ytldl2.protocols.cache import Cache, CachedVideo
+from ytldl2.protocols.job_queue import JobQueue, JobState
+from ytldl2.protocols.lyrics_cache import CachedLyrics, LyricsCache
+from ytldl2.protocols.playlist_snapshot_cache import (
+    PlaylistSnapshot,
+    PlaylistSnapshotCache,
+)
+from ytldl2.protocols.response_cache import ResponseCache
+from ytldl2.protocols.retry_cache import RetryCache, RetryState
 from ytldl2.sqlite_cache_migrations import migrations
+from ytldl2.util.itertools import batched
 
 
 class MigrationError(Exception):
     pass
 
 
-class SqliteCache(Cache):
+class SqliteCache(
+    Cache,
+    LyricsCache,
+    PlaylistSnapshotCache,
+    ResponseCache,
+    JobQueue,
+    RetryCache,
+):
+    MAX_SQL_VARIABLES = 900
+    """Max amount of "?" in one query, sqlite limit can be as low as 999."""
+
     def __init__(
-        self, db_path: pathlib.Path | Literal[":memory:"] = ":memory:"
+        self,
+        db_path: pathlib.Path | Literal[":memory:"] = ":memory:",
+        write_behind: bool = False,
+        flush_every: int = 100,
+        flush_interval: float = 5.0,
+        thread_safe: bool = False,
+        max_responses_size: int = 64 * 2**20,
+        response_access_resolution: timedelta = timedelta(minutes=10),
     ) -> None:
         """
         :param db_path: Can be also ":memory:" for RAM usage.
+        :param write_behind: If True, writes are grouped into transactions,
+        which are committed by flush_every writes or by flush_interval seconds,
+        checked on each write. Pending writes are committed by flush() and close().
+        :param flush_every: Amount of pending writes, that triggers flush.
+        :param flush_interval: Max age of pending writes in seconds.
+        :param thread_safe: If True, cache can be used from any thread.
+        Writes are serialized on one connection, reads are done on per-thread
+        connections, so they don't wait for writers. Reads from other connections
+        don't see writes, that are pending due to write_behind.
+        :param max_responses_size: Max size of compressed api responses in bytes,
+        least recently used ones are evicted.
+        :param response_access_resolution: Access time of response is updated
+        on read only if it's older than this, so most reads don't write.
         """
         self.db_path: pathlib.Path | Literal[":memory:"] = db_path
-        self.conn = self._init_connection(self.db_path)
+        self.write_behind = write_behind
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.max_responses_size = max_responses_size
+        self.response_access_resolution = response_access_resolution
+        self._responses_size: int | None = None
+        """Total size of responses, is counted on first write."""
+        self._pending_writes = 0
+        self._last_flush = monotonic()
+
+        self.thread_safe = thread_safe
+        self._write_lock = threading.RLock()
+        self._readers_lock = threading.Lock()
+        self._readers: dict[int, sqlite3.Connection] = {}
+
+        self._database = self._init_database(self.db_path, thread_safe)
+        self.conn = self._init_connection()
         self._apply_migrations_if_needed()
         len(self)  # calling to ensure that db is valid
 
     @staticmethod
-    def _init_connection(
-        db_path: pathlib.Path | Literal[":memory:"],
-    ) -> sqlite3.Connection:
-        db_path_str: str
-
+    def _init_database(
+        db_path: pathlib.Path | Literal[":memory:"], thread_safe: bool
+    ) -> str:
+        """Returns database name, that can be passed to sqlite3.connect()."""
         match db_path:
             case pathlib.Path():
                 if not db_path.exists():
                     db_path.touch()
-                db_path_str = str(db_path)
+                return str(db_path)
+            case ":memory:" if thread_safe:
+                # all connections of this cache should share one in-memory db
+                return f"file:ytldl2-{uuid.uuid4()}?mode=memory&cache=shared"
             case ":memory:":
-                db_path_str = db_path
+                return db_path
             case _:
                 raise ValueError(f"db path {db_path} is nor file path, nor ':memory:'")
 
-        conn = sqlite3.connect(db_path_str)
+    def _init_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self._database,
+            uri=self._database.startswith("file:"),
+            check_same_thread=not self.thread_safe,
+        )
+        if isinstance(self.db_path, pathlib.Path):
+            # readers don't block writer and vice versa,
+            # NORMAL is durable enough in WAL mode and doesn't fsync each commit
+            conn.execute("PRAGMA journal_mode = WAL;")
+            conn.execute("PRAGMA synchronous = NORMAL;")
+        elif self.thread_safe:
+            # shared in-memory db uses table locks instead of WAL
+            conn.execute("PRAGMA read_uncommitted = 1;")
         return conn
 
+    @property
+    def _reader(self) -> sqlite3.Connection:
+        """Connection for reads, it's per-thread in thread safe mode."""
+        if not self.thread_safe:
+            return self.conn
+        thread_id = threading.get_ident()
+        with self._readers_lock:
+            if (conn := self._readers.get(thread_id)) is None:
+                self._close_dead_readers()
+                conn = self._readers[thread_id] = self._init_connection()
+            return conn
+
+    def _close_dead_readers(self) -> None:
+        """Should be called under readers lock."""
+        alive = {thread.ident for thread in threading.enumerate()}
+        for thread_id in [id for id in self._readers if id not in alive]:
+            self._readers.pop(thread_id).close()
+
     def close(self) -> None:
-        self.conn.commit()
-        self.conn.close()
+        with self._write_lock:
+            self.flush()
+            self.conn.close()
+        with self._readers_lock:
+            for conn in self._readers.values():
+                conn.close()
+            self._readers = {}
 
-    def set(self, video: CachedVideo) -> None:
-        sql = r"""
+    def flush(self) -> None:
+        with self._write_lock:
+            self.conn.commit()
+            self._pending_writes = 0
+            self._last_flush = monotonic()
+
+    def _commit(self, writes: int = 1) -> None:
+        """
+        Commits writes now, or later, if write behind is enabled.
+        Should be called under write lock.
+        """
+        if not self.write_behind:
+            self.conn.commit()
+            return
+        self._pending_writes += writes
+        if (
+            self._pending_writes >= self.flush_every
+            or monotonic() - self._last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    _SET_SQL = r"""
 INSERT INTO cache (
                       video_id,
                       filtered_reason,
@@ -61,15 +189,16 @@ INSERT INTO cache (
                       ?
                   )
         """
-        self.conn.cursor().execute(
-            sql,
-            (
-                video.video_id,
-                video.filtered_reason,
-                str(datetime.now()),
-            ),
-        )
-        self.conn.commit()
+
+    def set(self, video: CachedVideo) -> None:
+        self.set_many([video])
+
+    def set_many(self, videos: Iterable[CachedVideo]) -> None:
+        now = str(datetime.now())
+        rows = [(video.video_id, video.filtered_reason, now) for video in videos]
+        with self._write_lock:
+            self.conn.executemany(self._SET_SQL, rows)
+            self._commit(len(rows))
 
     def __getitem__(self, video_id: VideoId) -> CachedVideo | None:
         sql = r"""
@@ -78,32 +207,47 @@ SELECT video_id,
   FROM cache
  WHERE video_id = ?;
         """
-        cur = self.conn.cursor().execute(sql, (video_id,))
+        cur = self._reader.execute(sql, (video_id,))
         if not (video := cur.fetchone()):
             return None
         return CachedVideo(video_id=VideoId(video[0]), filtered_reason=video[1])
 
+    def __contains__(self, video_id: object) -> bool:
+        sql = r"""SELECT 1 FROM cache WHERE video_id = ?;"""
+        return self._reader.execute(sql, (video_id,)).fetchone() is not None
+
     def __len__(self) -> int:
-        return len(list(self.__iter__()))
+        return self._reader.execute("SELECT COUNT(*) FROM cache;").fetchone()[0]
 
     def __iter__(self) -> Iterator[VideoId]:
         sql = r"""select video_id from cache"""
-        fetched = self.conn.cursor().execute(sql).fetchall()
+        fetched = self._reader.execute(sql).fetchall()
         video_ids = [item[0] for item in fetched]
         return video_ids.__iter__()
 
+    def filter_cached(self, videos: list[WithVideoIdT]) -> list[WithVideoIdT]:
+        """Filters out cached videos with one query per MAX_SQL_VARIABLES videos."""
+        cached = self._cached_video_ids([video.video_id for video in videos])
+        return [video for video in videos if video.video_id not in cached]
+
+    def _cached_video_ids(self, video_ids: list[VideoId]) -> set[VideoId]:
+        """Returns subset of video_ids, that are present in cache."""
+        cached: set[VideoId] = set()
+        for chunk in batched(dict.fromkeys(video_ids), self.MAX_SQL_VARIABLES):
+            placeholders = ", ".join("?" * len(chunk))
+            sql = f"SELECT video_id FROM cache WHERE video_id IN ({placeholders});"
+            cached.update(VideoId(row[0]) for row in self._reader.execute(sql, chunk))
+        return cached
+
     def last_modified(self, video_id: VideoId) -> datetime:
-        fetched = (
-            self.conn.cursor()
-            .execute("SELECT last_modified FROM cache WHERE video_id = ?;", (video_id,))
-            .fetchone()
-        )
+        fetched = self._reader.execute(
+            "SELECT last_modified FROM cache WHERE video_id = ?;", (video_id,)
+        ).fetchone()
         if not fetched:
             raise LookupError()
         return datetime.fromisoformat(fetched[0])
 
-    def set_info(self, song_info: SongInfo):
-        sql = r"""
+    _SET_INFO_SQL = r"""
 INSERT INTO song_info (
                           id,
                           title,
@@ -113,38 +257,392 @@ INSERT INTO song_info (
                       )
                       VALUES (?, ?, ?, ?, ?);
             """
-        self.conn.execute(
-            sql,
-            [
+
+    def set_info(self, song_info: SongInfo):
+        self.set_infos([song_info])
+
+    def set_infos(self, song_infos: Iterable[SongInfo]):
+        rows = [
+            (
                 song_info.id,
                 song_info.title,
                 song_info.duration,
                 song_info.channel,
                 song_info.artist,
-            ],
-        )
-        self.conn.commit()
+            )
+            for song_info in song_infos
+        ]
+        with self._write_lock:
+            self.conn.executemany(self._SET_INFO_SQL, rows)
+            self._commit(len(rows))
 
-    def get_info(self, video_id: VideoId) -> SongInfo | None:
-        sql = r"""
+    _SELECT_INFO_SQL = r"""
 SELECT id,
        title,
        duration,
        channel,
        artist
   FROM song_info
-  WHERE id = ?
         """
-        if not (info := self.conn.execute(sql, [video_id]).fetchone()):
+
+    def get_info(self, video_id: VideoId) -> SongInfo | None:
+        sql = self._SELECT_INFO_SQL + " WHERE id = ?"
+        if not (info := self._reader.execute(sql, [video_id]).fetchone()):
             return None
+        return self._to_song_info(info)
+
+    def get_infos(self, video_ids: list[VideoId]) -> dict[VideoId, SongInfo | None]:
+        """Gets infos with one query per MAX_SQL_VARIABLES video ids."""
+        infos: dict[VideoId, SongInfo | None] = dict.fromkeys(video_ids)
+        for chunk in batched(infos, self.MAX_SQL_VARIABLES):
+            placeholders = ", ".join("?" * len(chunk))
+            sql = self._SELECT_INFO_SQL + f" WHERE id IN ({placeholders})"
+            for row in self._reader.execute(sql, chunk):
+                info = self._to_song_info(row)
+                infos[info.id] = info
+        return infos
+
+    def iter_infos(self, page_size: int = 1000) -> Iterator[SongInfo]:
+        """
+        Iterates over all song infos ordered by id.
+        Infos are fetched by pages of page_size, so memory usage is constant.
+        """
+        last_id: str | None = None
+        while True:
+            if last_id is None:
+                sql = self._SELECT_INFO_SQL + " ORDER BY id LIMIT ?"
+                params: list = [page_size]
+            else:
+                sql = self._SELECT_INFO_SQL + " WHERE id > ? ORDER BY id LIMIT ?"
+                params = [last_id, page_size]
+            rows = self._reader.execute(sql, params).fetchall()
+            for row in rows:
+                yield self._to_song_info(row)
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1][0]
+
+    @staticmethod
+    def _to_song_info(row: tuple) -> SongInfo:
         return SongInfo(
-            id=info[0],
-            title=info[1],
-            duration=info[2],
-            channel=info[3],
-            artist=info[4],
+            id=row[0],
+            title=row[1],
+            duration=row[2],
+            channel=row[3],
+            artist=row[4],
+        )
+
+    _SELECT_LYRICS_SQL = r"""
+SELECT video_id,
+       browse_id,
+       lyrics,
+       last_modified
+  FROM lyrics
+        """
+
+    def get_lyrics(self, video_id: VideoId) -> CachedLyrics | None:
+        sql = self._SELECT_LYRICS_SQL + " WHERE video_id = ?"
+        if not (row := self._reader.execute(sql, [video_id]).fetchone()):
+            return None
+        return self._to_cached_lyrics(row)
+
+    def get_lyrics_by_browse_id(self, browse_id: BrowseId) -> CachedLyrics | None:
+        sql = (
+            self._SELECT_LYRICS_SQL
+            + " WHERE browse_id = ? ORDER BY last_modified DESC LIMIT 1"
+        )
+        if not (row := self._reader.execute(sql, [browse_id]).fetchone()):
+            return None
+        return self._to_cached_lyrics(row)
+
+    def set_lyrics(
+        self, video_id: VideoId, browse_id: BrowseId | None, lyrics: str | None
+    ) -> None:
+        sql = r"""
+INSERT INTO lyrics (
+                       video_id,
+                       browse_id,
+                       lyrics,
+                       last_modified
+                   )
+                   VALUES (?, ?, ?, ?);
+        """
+        with self._write_lock:
+            self.conn.execute(sql, [video_id, browse_id, lyrics, str(datetime.now())])
+            self._commit()
+
+    @staticmethod
+    def _to_cached_lyrics(row: tuple) -> CachedLyrics:
+        return CachedLyrics(
+            video_id=row[0],
+            browse_id=row[1],
+            lyrics=row[2],
+            last_modified=datetime.fromisoformat(row[3]),
+        )
+
+    def get_playlist_snapshot(self, playlist_id: PlaylistId) -> PlaylistSnapshot | None:
+        sql = r"""
+SELECT playlist_id,
+       video_ids,
+       track_count,
+       hash,
+       last_modified,
+       last_full_sync
+  FROM playlist_snapshots
+ WHERE playlist_id = ?
+        """
+        if not (row := self._reader.execute(sql, [playlist_id]).fetchone()):
+            return None
+        return PlaylistSnapshot(
+            playlist_id=row[0],
+            video_ids=json.loads(row[1]),
+            track_count=row[2],
+            hash=row[3],
+            last_modified=datetime.fromisoformat(row[4]),
+            last_full_sync=datetime.fromisoformat(row[5]),
+        )
+
+    def set_playlist_snapshot(self, snapshot: PlaylistSnapshot) -> None:
+        sql = r"""
+INSERT INTO playlist_snapshots (
+                                   playlist_id,
+                                   video_ids,
+                                   track_count,
+                                   hash,
+                                   last_modified,
+                                   last_full_sync
+                               )
+                               VALUES (?, ?, ?, ?, ?, ?);
+        """
+        row = [
+            snapshot.playlist_id,
+            json.dumps(snapshot.video_ids),
+            snapshot.track_count,
+            snapshot.hash,
+            str(snapshot.last_modified),
+            str(snapshot.last_full_sync),
+        ]
+        with self._write_lock:
+            self.conn.execute(sql, row)
+            self._commit()
+
+    def get_response(self, key: str, max_age: timedelta) -> Any | None:
+        sql = "SELECT response, created, last_access FROM api_responses WHERE [key] = ?"
+        if not (row := self._reader.execute(sql, [key]).fetchone()):
+            return None
+        now = datetime.now()
+        if now - datetime.fromisoformat(row[1]) > max_age:
+            return None
+        if now - datetime.fromisoformat(row[2]) >= self.response_access_resolution:
+            with self._write_lock:
+                self.conn.execute(
+                    "UPDATE api_responses SET last_access = ? WHERE [key] = ?",
+                    [str(now), key],
+                )
+                self._commit()
+        return json.loads(zlib.decompress(row[0]))
+
+    def set_response(self, key: str, response: Any) -> None:
+        sql = r"""
+INSERT INTO api_responses (
+                              [key],
+                              response,
+                              size,
+                              created,
+                              last_access
+                          )
+                          VALUES (?, ?, ?, ?, ?);
+        """
+        data = zlib.compress(json.dumps(response).encode("utf-8"))
+        now = str(datetime.now())
+        with self._write_lock:
+            total = self._get_responses_size()
+            replaced = self.conn.execute(
+                "SELECT size FROM api_responses WHERE [key] = ?", [key]
+            ).fetchone()
+            self.conn.execute(sql, [key, data, len(data), now, now])
+            self._responses_size = total + len(data) - (replaced[0] if replaced else 0)
+            self._evict_responses()
+            self._commit()
+
+    def _get_responses_size(self) -> int:
+        """Should be called under write lock."""
+        if self._responses_size is None:
+            sql = "SELECT COALESCE(SUM(size), 0) FROM api_responses"
+            self._responses_size = self.conn.execute(sql).fetchone()[0]
+        return self._responses_size
+
+    def _evict_responses(self) -> None:
+        """
+        Removes least recently used responses, while their size exceeds max.
+        Should be called under write lock.
+        """
+        total = self._get_responses_size()
+        if total <= self.max_responses_size:
+            return
+        evicted: list[tuple[str]] = []
+        sql = "SELECT [key], size FROM api_responses ORDER BY last_access"
+        for key, size in self.conn.execute(sql):
+            if total <= self.max_responses_size:
+                break
+            evicted.append((key,))
+            total -= size
+        self.conn.executemany("DELETE FROM api_responses WHERE [key] = ?", evicted)
+        self._responses_size = total
+
+    # job queue is read and written on writer connection,
+    # so it sees writes, which are pending due to write behind
+
+    def enqueue(self, songs: Iterable[Song]) -> int:
+        sql = r"""
+INSERT INTO jobs (
+                     video_id,
+                     title,
+                     artist,
+                     state,
+                     created,
+                     last_modified
+                 )
+                 VALUES (?, ?, ?, 'pending', ?, ?)
+    ON CONFLICT (video_id) DO UPDATE
+                 SET state = 'pending',
+                     created = excluded.created,
+                     last_modified = excluded.last_modified
+               WHERE state = 'failed';
+        """
+        now = str(datetime.now())
+        rows = [(song.video_id, song.title, song.artist, now, now) for song in songs]
+        with self._write_lock:
+            before = self.conn.total_changes
+            self.conn.executemany(sql, rows)
+            enqueued = self.conn.total_changes - before
+            self._commit(len(rows))
+        return enqueued
+
+    def claim(self, limit: int | None = None) -> list[Song]:
+        sql = r"""
+UPDATE jobs
+   SET state = 'in_progress',
+       last_modified = ?
+ WHERE video_id IN (
+           SELECT video_id
+             FROM jobs
+            WHERE state = 'pending'
+            ORDER BY created,
+                     rowid
+            LIMIT ?
+       )
+RETURNING video_id,
+          title,
+          artist,
+          created,
+          rowid;
+        """
+        with self._write_lock:
+            rows = self.conn.execute(
+                sql, [str(datetime.now()), -1 if limit is None else limit]
+            ).fetchall()
+            self._commit(len(rows))
+        # RETURNING doesn't keep order
+        rows.sort(key=lambda row: (row[3], row[4]))
+        return [
+            Song(video_id=VideoId(row[0]), title=Title(row[1]), artist=Artist(row[2]))
+            for row in rows
+        ]
+
+    def finish(self, video_id: VideoId, state: Literal["done", "failed"]) -> None:
+        with self._write_lock:
+            if state == "done":
+                # done songs are cached, so table doesn't grow
+                self.conn.execute("DELETE FROM jobs WHERE video_id = ?", [video_id])
+            else:
+                sql = "UPDATE jobs SET state = ?, last_modified = ? WHERE video_id = ?"
+                self.conn.execute(sql, [state, str(datetime.now()), video_id])
+            self._commit()
+
+    def reclaim(self) -> int:
+        sql = r"""
+UPDATE jobs
+   SET state = 'pending',
+       last_modified = ?
+ WHERE state = 'in_progress';
+        """
+        with self._write_lock:
+            reclaimed = self.conn.execute(sql, [str(datetime.now())]).rowcount
+            self._commit(reclaimed)
+        return reclaimed
+
+    def count_jobs(self, state: JobState) -> int:
+        with self._write_lock:
+            sql = "SELECT COUNT(*) FROM jobs WHERE state = ?"
+            return self.conn.execute(sql, [state]).fetchone()[0]
+
+    def get_retry(self, video_id: VideoId) -> RetryState | None:
+        sql = r"""
+SELECT video_id,
+       kind,
+       error,
+       attempts,
+       next_attempt
+  FROM retries
+ WHERE video_id = ?
+        """
+        if not (row := self._reader.execute(sql, [video_id]).fetchone()):
+            return None
+        return RetryState(
+            video_id=row[0],
+            kind=row[1],
+            error=row[2],
+            attempts=row[3],
+            next_attempt=datetime.fromisoformat(row[4]) if row[4] else None,
         )
 
+    def set_retry(self, state: RetryState) -> None:
+        sql = r"""
+INSERT INTO retries (
+                        video_id,
+                        kind,
+                        error,
+                        attempts,
+                        next_attempt,
+                        last_modified
+                    )
+                    VALUES (?, ?, ?, ?, ?, ?);
+        """
+        row = [
+            state.video_id,
+            state.kind,
+            state.error,
+            state.attempts,
+            str(state.next_attempt) if state.next_attempt is not None else None,
+            str(datetime.now()),
+        ]
+        with self._write_lock:
+            self.conn.execute(sql, row)
+            self._commit()
+
+    def remove_retry(self, video_id: VideoId) -> None:
+        with self._write_lock:
+            self.conn.execute("DELETE FROM retries WHERE video_id = ?", [video_id])
+            self._commit()
+
+    def filter_not_due(
+        self, videos: list[WithVideoIdT], now: datetime
+    ) -> list[WithVideoIdT]:
+        """Filters with one query per MAX_SQL_VARIABLES videos."""
+        not_due: set[VideoId] = set()
+        video_ids = dict.fromkeys(video.video_id for video in videos)
+        for chunk in batched(video_ids, self.MAX_SQL_VARIABLES - 1):
+            placeholders = ", ".join("?" * len(chunk))
+            sql = (
+                "SELECT video_id FROM retries"
+                f" WHERE video_id IN ({placeholders})"
+                " AND (next_attempt IS NULL OR next_attempt > ?)"
+            )
+            rows = self._reader.execute(sql, [*chunk, str(now)])
+            not_due.update(VideoId(row[0]) for row in rows)
+        return [video for video in videos if video.video_id not in not_due]
+
     def _apply_migrations_if_needed(self):
         if (db_version := self.db_version) < 0:
             raise MigrationError("db version is < 0")
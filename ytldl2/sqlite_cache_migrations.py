@@ -118,3 +118,91 @@ PRAGMA foreign_keys = 1;
         ";"
     )
 )
+migrations.append(
+    [
+        r"""
+CREATE TABLE lyrics (
+    video_id      TEXT PRIMARY KEY ON CONFLICT REPLACE
+                       NOT NULL,
+    browse_id     TEXT,
+    lyrics        TEXT,
+    last_modified TEXT NOT NULL
+);
+        """,
+        r"""
+CREATE INDEX lyrics_browse_id ON lyrics (
+    browse_id
+);
+        """,
+    ]
+)
+migrations.append(
+    [
+        r"""
+CREATE TABLE playlist_snapshots (
+    playlist_id    TEXT    PRIMARY KEY ON CONFLICT REPLACE
+                           NOT NULL,
+    video_ids      TEXT    NOT NULL,
+    track_count    INTEGER,
+    hash           TEXT    NOT NULL,
+    last_modified  TEXT    NOT NULL,
+    last_full_sync TEXT    NOT NULL
+);
+        """,
+    ]
+)
+migrations.append(
+    [
+        r"""
+CREATE TABLE api_responses (
+    [key]       TEXT    PRIMARY KEY ON CONFLICT REPLACE
+                        NOT NULL,
+    response    BLOB    NOT NULL,
+    size        INTEGER NOT NULL,
+    created     TEXT    NOT NULL,
+    last_access TEXT    NOT NULL
+);
+        """,
+        r"""
+CREATE INDEX api_responses_last_access ON api_responses (
+    last_access
+);
+        """,
+    ]
+)
+migrations.append(
+    [
+        r"""
+CREATE TABLE jobs (
+    video_id      TEXT    PRIMARY KEY
+                          NOT NULL,
+    title         TEXT    NOT NULL,
+    artist        TEXT    NOT NULL,
+    state         TEXT    NOT NULL,
+    created       TEXT    NOT NULL,
+    last_modified TEXT    NOT NULL
+);
+        """,
+        r"""
+CREATE INDEX jobs_state_created ON jobs (
+    state,
+    created
+);
+        """,
+    ]
+)
+migrations.append(
+    [
+        r"""
+CREATE TABLE retries (
+    video_id      TEXT    PRIMARY KEY ON CONFLICT REPLACE
+                          NOT NULL,
+    kind          TEXT    NOT NULL,
+    error         TEXT    NOT NULL,
+    attempts      INTEGER NOT NULL,
+    next_attempt  TEXT,
+    last_modified TEXT    NOT NULL
+);
+        """,
+    ]
+)
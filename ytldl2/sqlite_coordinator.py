@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import contextlib
+import logging
+import pathlib
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator
+
+from ytldl2.models.download_result import DownloadResult, Downloaded, Error, Filtered
+from ytldl2.models.song import Song
+from ytldl2.models.types import Artist, Title, VideoId
+from ytldl2.protocols.coordinator import Coordinator, Lease
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = [
+    r"""
+CREATE TABLE IF NOT EXISTS songs (
+    video_id      TEXT    PRIMARY KEY
+                          NOT NULL,
+    title         TEXT    NOT NULL,
+    artist        TEXT    NOT NULL,
+    state         TEXT    NOT NULL,
+    lease_id      TEXT,
+    worker_id     TEXT,
+    lease_expires REAL,
+    result        TEXT,
+    last_modified REAL    NOT NULL
+);
+    """,
+    r"""
+CREATE INDEX IF NOT EXISTS songs_state ON songs (
+    state,
+    lease_expires
+);
+    """,
+]
+
+
+class SqliteCoordinator(Coordinator):
+    """
+    Coordinator, which stores songs and leases in SQLite db. Workers on other
+    machines can share it, if db is on filesystem with working file locks.
+    Leases are expired by wall clock, so clocks of machines should be synced.
+    """
+
+    def __init__(self, db_path: pathlib.Path, timeout: float = 30) -> None:
+        """
+        :param timeout: How long to wait for lock of db, held by other worker.
+        """
+        self.db_path = db_path
+        # rollback journal, WAL doesn't work on network filesystems
+        self.conn = sqlite3.connect(
+            str(db_path),
+            timeout=timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._lock = threading.Lock()
+        with self._transaction() as conn:
+            for sql in _SCHEMA:
+                conn.execute(sql)
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Takes write lock of db at once, so workers don't lease same songs."""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def submit(self, songs: Iterable[Song]) -> int:
+        sql = r"""
+INSERT INTO songs (
+                      video_id,
+                      title,
+                      artist,
+                      state,
+                      last_modified
+                  )
+                  VALUES (?, ?, ?, 'pending', ?)
+    ON CONFLICT (video_id) DO UPDATE
+                  SET state = 'pending',
+                      result = NULL,
+                      last_modified = excluded.last_modified
+                WHERE state = 'failed';
+        """
+        now = time.time()
+        rows = [(song.video_id, song.title, song.artist, now) for song in songs]
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(sql, rows)
+            return conn.total_changes - before
+
+    def lease(self, worker_id: str, limit: int, duration: timedelta) -> Lease | None:
+        sql = r"""
+UPDATE songs
+   SET state = 'leased',
+       lease_id = ?,
+       worker_id = ?,
+       lease_expires = ?,
+       last_modified = ?
+ WHERE video_id IN (
+           SELECT video_id
+             FROM songs
+            WHERE state = 'pending'
+               OR (state = 'leased' AND lease_expires < ?)
+            ORDER BY last_modified,
+                     rowid
+            LIMIT ?
+       )
+RETURNING video_id,
+          title,
+          artist;
+        """
+        lease_id = str(uuid.uuid4())
+        now = time.time()
+        expires = now + duration.total_seconds()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                sql, [lease_id, worker_id, expires, now, now, limit]
+            ).fetchall()
+        if not rows:
+            return None
+        songs = [
+            Song(video_id=VideoId(row[0]), title=Title(row[1]), artist=Artist(row[2]))
+            for row in rows
+        ]
+        logger.debug(f"Worker {worker_id} leased {len(songs)} songs")
+        return Lease(
+            lease_id=lease_id,
+            worker_id=worker_id,
+            songs=songs,
+            expires_at=datetime.fromtimestamp(expires),
+        )
+
+    def heartbeat(self, lease: Lease, duration: timedelta) -> bool:
+        sql = r"""
+UPDATE songs
+   SET lease_expires = ?
+ WHERE lease_id = ?
+   AND state = 'leased';
+        """
+        kept_sql = r"""
+SELECT count(*)
+  FROM songs
+ WHERE lease_id = ?
+   AND state IN ('leased', 'done', 'failed');
+        """
+        with self._transaction() as conn:
+            conn.execute(sql, [time.time() + duration.total_seconds(), lease.lease_id])
+            (kept,) = conn.execute(kept_sql, [lease.lease_id]).fetchone()
+        # lease is lost, once any of its songs was leased by other worker,
+        # reported songs are still kept by it
+        return kept == len(lease.songs)
+
+    def report(self, lease: Lease, result: DownloadResult) -> None:
+        match result:
+            case Downloaded():
+                state, text = "done", "downloaded"
+            case Filtered():
+                state, text = "done", f"filtered: {result.reason}"
+            case Error():
+                state, text = "failed", f"error: {result.error}"
+            case _:
+                raise TypeError(f"Unknown download result: {result!r}")
+        sql = r"""
+UPDATE songs
+   SET state = ?,
+       result = ?,
+       last_modified = ?
+ WHERE video_id = ?
+   AND lease_id = ?;
+        """
+        with self._transaction() as conn:
+            reported = conn.execute(
+                sql, [state, text, time.time(), result.video_id, lease.lease_id]
+            ).rowcount
+        if not reported:
+            logger.warning(
+                f"Result of {result.video_id} isn't reported, "
+                f"lease {lease.lease_id} was lost"
+            )
+
+    def release(self, lease: Lease) -> None:
+        sql = r"""
+UPDATE songs
+   SET state = 'pending',
+       lease_id = NULL,
+       worker_id = NULL,
+       lease_expires = NULL
+ WHERE lease_id = ?
+   AND state = 'leased';
+        """
+        with self._transaction() as conn:
+            conn.execute(sql, [lease.lease_id])
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
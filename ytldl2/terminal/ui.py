@@ -1,3 +1,4 @@
+import threading
 import typing
 
 from rich import box
@@ -25,52 +26,65 @@ console = Console()
 
 
 class TerminalProgressBar(ProgressBar):
+    """
+    Progress bar, that can track several videos, downloaded concurrently.
+    Videos are distinguished by "id" key of hooks info_dict.
+    """
+
     def __init__(
         self,
     ) -> None:
         self._progress = Progress(expand=True)
-        self._dl: TaskID | None = None
-        self._pp: dict[str, TaskID] = {}
+        self._lock = threading.RLock()
+        self._dl: dict[VideoId, TaskID] = {}
+        self._pp: dict[VideoId, dict[str, TaskID]] = {}
 
     @override
     def new(self, video: VideoId) -> None:
-        self._clean()
-        self._progress.start()
-        self._dl = self._progress.add_task(video, total=None)
+        with self._lock:
+            self._clean(video)
+            if not self._dl:
+                self._progress.start()
+            self._dl[video] = self._progress.add_task(video, total=None)
 
     @override
     def close(self, video: VideoId) -> None:
-        self._clean()
-        self._progress.stop()
-        clear_last_line()
-
-    def _clean(self) -> None:
-        if self._dl is not None:
-            self._progress.remove_task(self._dl)
-            self._dl = None
-        if self._pp:
-            for pp in self._pp.values():
-                self._progress.remove_task(pp)
-            self._pp = {}
+        with self._lock:
+            self._clean(video)
+            self._dl.pop(video, None)
+            if not self._dl:
+                self._progress.stop()
+                clear_last_line()
+
+    def _clean(self, video: VideoId) -> None:
+        if (dl := self._dl.get(video)) is not None:
+            self._progress.remove_task(dl)
+        for pp in self._pp.pop(video, {}).values():
+            self._progress.remove_task(pp)
 
     @override
     def on_download_progress(self, progress: DownloadProgress) -> None:
         if is_progress_downloading(progress) or is_progress_finished(progress):
-            self._progress.update(
-                self._dl,  # type: ignore
-                description=progress["filename"],
-                total=progress["total_bytes"],
-                completed=progress["downloaded_bytes"],
-            )
+            with self._lock:
+                if (dl := self._dl.get(progress["info_dict"].get("id"))) is None:
+                    return
+                self._progress.update(
+                    dl,
+                    description=progress["filename"],
+                    total=progress["total_bytes"],
+                    completed=progress["downloaded_bytes"],
+                )
 
     @override
     def on_postprocessor_progress(self, progress: PostprocessorProgress) -> None:
         pp = progress["postprocessor"]
-        if is_postprocessor_started(progress):
-            self._pp[pp] = self._progress.add_task(f"\t{pp}", total=None)
-        if is_postprocessor_finished(progress):
-            self._progress.remove_task(self._pp[pp])
-            del self._pp[pp]
+        video = progress["info_dict"].get("id")
+        with self._lock:
+            pps = self._pp.setdefault(video, {})
+            if is_postprocessor_started(progress):
+                pps[pp] = self._progress.add_task(f"\t{pp}", total=None)
+            if is_postprocessor_finished(progress) and pp in pps:
+                self._progress.remove_task(pps.pop(pp))
 
 
 class TerminalHomeItemsReviewer(HomeItemsReviewer):
@@ -94,10 +108,14 @@ class TerminalBatchDownloadTracker(BatchDownloadTracker):
         self._downloaded: list[Downloaded] = []
         self._filtered: list[Filtered] = []
         self._errors: list[Error] = []
+        self._rate: float | None = None
 
     @override
-    def start(self, songs: list[Song]):
-        print(f"\nStarting to download batch of {len(songs)} songs:")
+    def start(self, songs: list[Song] | None):
+        if songs is None:
+            print("\nStarting to download songs as soon as they are found:")
+        else:
+            print(f"\nStarting to download batch of {len(songs)} songs:")
 
     @override
     def on_download_result(self, result: DownloadResult):
@@ -119,6 +137,12 @@ class TerminalBatchDownloadTracker(BatchDownloadTracker):
             case _:
                 typing.assert_never(result)
 
+    @override
+    def on_rate_changed(self, rate: float):
+        if self._rate is not None and rate < self._rate:
+            print(f"Throttled, download rate lowered to {rate * 60:.1f} songs/min.")
+        self._rate = rate
+
     @override
     def end(self):
         print()
@@ -136,6 +160,8 @@ class TerminalBatchDownloadTracker(BatchDownloadTracker):
         table.add_row("Downloaded", str(d))
         table.add_row("Filtered", str(f))
         table.add_row("Errors", str(e))
+        if self._rate is not None:
+            table.add_row("Rate, songs/min", f"{self._rate * 60:.1f}")
 
         console.print(table)
 
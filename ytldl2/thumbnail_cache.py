@@ -0,0 +1,175 @@
+import hashlib
+import logging
+import os
+import pathlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from io import BytesIO
+
+import requests
+from PIL import Image
+
+from ytldl2.session import session_build
+from ytldl2.util.stats import HitMissStats
+
+logger = logging.getLogger(__name__)
+
+
+class ThumbnailCache:
+    """
+    Content-addressed cache of cover images, normalized to one format and size.
+    Urls are mapped to digests of normalized images, so songs of one album
+    fetch and encode their cover once, even if they are downloaded concurrently.
+    """
+
+    def __init__(
+        self,
+        cache_dir: pathlib.Path | None = None,
+        session: requests.Session | None = None,
+        format: str = "JPEG",
+        max_size: int | None = 544,
+        quality: int = 90,
+        memory_entries: int = 64,
+        memory_urls: int = 4096,
+        max_age: timedelta = timedelta(days=30),
+        lock_stripes: int = 32,
+    ) -> None:
+        """
+        :param cache_dir: Directory for images. If None, images are kept in memory.
+        :param session: Session for downloads, by default new one is created.
+        :param format: Pillow format of images, e.g. "JPEG" or "PNG".
+        :param max_size: Max width and height, images are resized keeping aspect.
+        None means no resize.
+        :param quality: Quality of lossy formats.
+        :param memory_entries: Max amount of images, kept in memory.
+        :param memory_urls: Max amount of url to digest mappings, kept in memory.
+        :param max_age: Images, which urls weren't used for it,
+        are removed from disk by collect_garbage().
+        :param lock_stripes: Amount of locks, urls are spread between them,
+        so one url isn't fetched concurrently.
+        """
+        self._dir = cache_dir
+        if self._dir is not None:
+            (self._dir / "urls").mkdir(parents=True, exist_ok=True)
+        self._session = session or session_build(proxy=None)
+        self._format = format.upper()
+        self._max_size = max_size
+        self._quality = quality
+        self._memory_entries = memory_entries
+        self._memory_urls = memory_urls
+        self._max_age = max_age
+        self.stats = HitMissStats()
+
+        self._lock = threading.Lock()
+        self._url_locks = [threading.Lock() for _ in range(lock_stripes)]
+        self._digests: OrderedDict[str, str] = OrderedDict()
+        """Url to digest, LRU."""
+        self._images: OrderedDict[str, bytes] = OrderedDict()
+        """Digest to image, LRU."""
+
+    @property
+    def extension(self) -> str:
+        return "jpg" if self._format == "JPEG" else self._format.lower()
+
+    def get(self, url: str) -> bytes:
+        """Returns normalized image, downloads it only if it isn't cached."""
+        with self._url_lock(url):
+            if (image := self._get_cached(url)) is not None:
+                self.stats.hit()
+                return image
+            self.stats.miss()
+            response = self._session.get(url, timeout=30)
+            response.raise_for_status()
+            image = self.normalize(response.content)
+            self._set_cached(url, image)
+            return image
+
+    def normalize(self, image_bytes: bytes) -> bytes:
+        img = Image.open(BytesIO(image_bytes))
+        if self._format == "JPEG" and img.mode != "RGB":
+            img = img.convert("RGB")
+        if self._max_size is not None:
+            img.thumbnail((self._max_size, self._max_size))
+        res = BytesIO()
+        img.save(res, format=self._format, quality=self._quality)
+        return res.getvalue()
+
+    def collect_garbage(self) -> int:
+        """
+        Removes images from disk, which urls weren't used for max_age.
+        Shouldn't be called concurrently with get().
+        Returns amount of removed images.
+        """
+        if self._dir is None:
+            return 0
+        expired = time.time() - self._max_age.total_seconds()
+        alive: set[str] = set()
+        for url_path in (self._dir / "urls").iterdir():
+            if url_path.stat().st_mtime < expired:
+                url_path.unlink(missing_ok=True)
+            else:
+                alive.add(url_path.read_text())
+        removed = 0
+        for path in self._dir.glob(f"*.{self.extension}"):
+            if path.stem not in alive and path.stat().st_mtime < expired:
+                path.unlink(missing_ok=True)
+                removed += 1
+        with self._lock:
+            self._digests.clear()
+        if removed:
+            logger.info(f"Removed {removed} expired thumbnails")
+        return removed
+
+    def _url_lock(self, url: str) -> threading.Lock:
+        return self._url_locks[hash(url) % len(self._url_locks)]
+
+    def _get_cached(self, url: str) -> bytes | None:
+        with self._lock:
+            digest = self._digests.get(url)
+        if digest is None:
+            if self._dir is None:
+                return None
+            url_path = self._url_path(url)
+            if not url_path.exists():
+                return None
+            digest = url_path.read_text()
+            # url is used, so its image isn't collected as garbage
+            os.utime(url_path)
+        with self._lock:
+            if (image := self._images.get(digest)) is not None:
+                self._images.move_to_end(digest)
+                return image
+        if self._dir is None or not (path := self._image_path(digest)).exists():
+            return None
+        image = path.read_bytes()
+        self._remember(url, digest, image)
+        return image
+
+    def _set_cached(self, url: str, image: bytes) -> None:
+        digest = hashlib.sha256(image).hexdigest()
+        if self._dir is not None:
+            if not (path := self._image_path(digest)).exists():
+                path.write_bytes(image)
+            self._url_path(url).write_text(digest)
+        self._remember(url, digest, image)
+
+    def _remember(self, url: str, digest: str, image: bytes) -> None:
+        with self._lock:
+            self._digests[url] = digest
+            self._digests.move_to_end(url)
+            while len(self._digests) > self._memory_urls:
+                self._digests.popitem(last=False)
+            self._images[digest] = image
+            self._images.move_to_end(digest)
+            while len(self._images) > self._memory_entries:
+                self._images.popitem(last=False)
+
+    def _url_path(self, url: str) -> pathlib.Path:
+        assert self._dir is not None
+        return self._dir / "urls" / hashlib.sha256(url.encode()).hexdigest()
+
+    def _image_path(self, digest: str) -> pathlib.Path:
+        assert self._dir is not None
+        return self._dir / f"{digest}.{self.extension}"
@@ -0,0 +1,17 @@
+from collections.abc import Iterable, Iterator
+from itertools import islice
+from typing import TypeVar
+
+T = TypeVar("T")
+
+
+def batched(iterable: Iterable[T], n: int) -> Iterator[list[T]]:
+    """
+    Splits iterable into lists of length n, last list can be shorter.
+    Backport of itertools.batched from python 3.12.
+    """
+    if n < 1:
+        raise ValueError("n must be at least one")
+    it = iter(iterable)
+    while batch := list(islice(it, n)):
+        yield batch
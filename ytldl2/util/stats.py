@@ -0,0 +1,90 @@
+import threading
+
+from ytldl2.models.types import VideoId
+
+
+class HitMissStats:
+    """Thread safe hit and miss counters of some cache."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self._hits + self._misses
+        return self._hits / total if total else 0.0
+
+    def hit(self) -> None:
+        with self._lock:
+            self._hits += 1
+
+    def miss(self) -> None:
+        with self._lock:
+            self._misses += 1
+
+    def __str__(self) -> str:
+        return (
+            f"hits={self._hits}, misses={self._misses}, "
+            f"hit_ratio={self.hit_ratio:.2f}"
+        )
+
+
+class FfmpegStats:
+    """
+    Thread safe accounting of ffmpeg work: songs, which were converted
+    (or remuxed) by ffmpeg, and songs, which were left as is.
+    CPU time is kept for each song, so it's known, what skipped songs saved.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._skipped = 0
+        self._converted = 0
+        self._cpu_seconds = 0.0
+        self._songs: dict[VideoId, float] = {}
+
+    @property
+    def skipped(self) -> int:
+        return self._skipped
+
+    @property
+    def converted(self) -> int:
+        return self._converted
+
+    @property
+    def cpu_seconds(self) -> float:
+        """CPU time, spent by ffmpeg on converted songs."""
+        return self._cpu_seconds
+
+    @property
+    def songs(self) -> dict[VideoId, float]:
+        """CPU time, spent by ffmpeg on each song, it's 0 for skipped ones."""
+        with self._lock:
+            return dict(self._songs)
+
+    def on_skipped(self, video_id: VideoId) -> None:
+        with self._lock:
+            self._skipped += 1
+            self._songs[video_id] = 0.0
+
+    def on_converted(self, video_id: VideoId, cpu_seconds: float) -> None:
+        with self._lock:
+            self._converted += 1
+            self._cpu_seconds += cpu_seconds
+            self._songs[video_id] = cpu_seconds
+
+    def __str__(self) -> str:
+        return (
+            f"skipped={self._skipped}, converted={self._converted}, "
+            f"cpu_seconds={self._cpu_seconds:.1f}"
+        )
@@ -3,14 +3,17 @@ from time import sleep, time
 from ytldl2.cancellation_tokens import CancellationToken
 
 
-def sleep_with_cancel(delay: int, cancellation_token: CancellationToken):
+def sleep_with_cancel(
+    delay: float, cancellation_token: CancellationToken, step: float = 5
+):
     """
     delay: in seconds
+    step: how often cancellation_token is checked, in seconds
     """
 
     until = time() + delay
-    while time() < until and not cancellation_token.kill_requested:
-        sleep(5)
+    while (left := until - time()) > 0 and not cancellation_token.kill_requested:
+        sleep(min(step, left))
 
 
 if __name__ == "__main__":
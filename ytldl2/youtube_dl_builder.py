@@ -1,9 +1,25 @@
 import logging
 import pathlib
+from typing import Any
 
 from yt_dlp import YoutubeDL
+from ytmusicapi import YTMusic
 
-from ytldl2.postprocessors import FilterSongPP, LyricsPP, MetadataPP, RetainMainArtistPP
+from ytldl2.metadata_prefetcher import MetadataPrefetcher
+from ytldl2.postprocessing_stage import PostprocessJob
+from ytldl2.postprocessors import (
+    ExtractAudioPP,
+    FilterSongPP,
+    LyricsPP,
+    MetadataPP,
+    PrefetchMetadataPP,
+    RetainMainArtistPP,
+)
+from ytldl2.protocols.lyrics_cache import LyricsCache
+from ytldl2.proxy_pool import ProxyPool
+from ytldl2.session import session_build
+from ytldl2.thumbnail_cache import ThumbnailCache
+from ytldl2.util.stats import FfmpegStats, HitMissStats
 
 
 class YoutubeDlBuilder:
@@ -17,32 +33,123 @@ class YoutubeDlBuilder:
         home_dir: pathlib.Path,
         tmp_dir: pathlib.Path,
         proxy: str | None = None,
+        lyrics_cache: LyricsCache | None = None,
+        thumbnails_dir: pathlib.Path | None = None,
+        prefetch_metadata: bool = True,
+        proxy_pool: ProxyPool | None = None,
     ) -> None:
+        """
+        :param lyrics_cache: Is shared between built YoutubeDLs,
+        so it should be thread safe.
+        :param thumbnails_dir: Directory for normalized covers.
+        If None, covers are cached in memory.
+        :param prefetch_metadata: If True, lyrics and cover are fetched in
+        background, while audio is being downloaded.
+        :param proxy_pool: If provided, lyrics and covers are got via proxies,
+        picked from it. Proxy of YoutubeDL is picked by caller, see build().
+        """
         self.home_dir = home_dir
         self.tmp_dir = tmp_dir
         self.proxy = proxy
+        self.proxy_pool = proxy_pool
+        self.lyrics_cache = lyrics_cache
+        self.lyrics_stats = HitMissStats()
+        """Lyrics cache stats of all built YoutubeDLs."""
+        self.ffmpeg_stats = FfmpegStats()
+        """ffmpeg CPU time stats of all built YoutubeDLs."""
+        self.thumbnail_cache = ThumbnailCache(
+            cache_dir=thumbnails_dir,
+            session=session_build(proxy=proxy, proxy_pool=proxy_pool),
+        )
+        """Is shared between all built YoutubeDLs."""
+        self._lyrics_yt: YTMusic | None = None
+        self.metadata_prefetcher: MetadataPrefetcher | None = None
+        if prefetch_metadata:
+            lyrics_pp = self._make_lyrics_pp()
+            self.metadata_prefetcher = MetadataPrefetcher(
+                get_lyrics=lyrics_pp.get_lyrics, thumbnails=self.thumbnail_cache
+            )
+        # are used for jobs of PostprocessStage, are thread safe
+        self._lyrics_pp = self._make_lyrics_pp()
+        self._metadata_pp = self._make_metadata_pp()
 
-    def build(self) -> YoutubeDL:
+    def discard_prefetched(self, video_id: str) -> None:
+        """Should be called for videos, which weren't post processed."""
+        if self.metadata_prefetcher is not None:
+            self.metadata_prefetcher.discard(video_id)
+
+    def close(self) -> None:
+        """Stops background threads, that are shared between built YoutubeDLs."""
+        if self.metadata_prefetcher is not None:
+            self.metadata_prefetcher.close()
+
+    def build(self, post_process: bool = True, proxy: str | None = None) -> YoutubeDL:
+        """
+        :param post_process: If False, built YoutubeDL only downloads songs,
+        see make_postprocess_job.
+        :param proxy: Overrides proxy of builder, "" means direct connection.
+        """
         ydl_opts = self._make_youtube_dl_opts()
+        if proxy is not None:
+            ydl_opts["proxy"] = proxy
         ydl = YoutubeDL(ydl_opts)  # type: ignore
         # pre processors
         ydl.add_post_processor(FilterSongPP(), when="pre_process")
         ydl.add_post_processor(RetainMainArtistPP(), when="pre_process")
+        if self.metadata_prefetcher is not None:
+            ydl.add_post_processor(
+                PrefetchMetadataPP(self.metadata_prefetcher), when="pre_process"
+            )
+        if not post_process:
+            return ydl
         # post processors
-        ydl.add_post_processor(LyricsPP(proxy=self.proxy), when="post_process")
-        ydl.add_post_processor(MetadataPP(proxy=self.proxy), when="post_process")
+        # Extract audio using ffmpeg, if stream isn't m4a already
+        ydl.add_post_processor(
+            ExtractAudioPP(preferredcodec="m4a", stats=self.ffmpeg_stats),
+            when="post_process",
+        )
+        ydl.add_post_processor(self._make_lyrics_pp(), when="post_process")
+        ydl.add_post_processor(self._make_metadata_pp(), when="post_process")
         return ydl
 
+    def make_postprocess_job(self, info: dict[str, Any]) -> PostprocessJob:
+        """
+        Does network bound part of post processing for song, downloaded by
+        YoutubeDL built with post_process=False: gets lyrics and cover.
+        CPU bound part is left for PostprocessStage.
+        """
+        info = dict(info)
+        _, info = self._lyrics_pp.run(info)
+        metadata = self._metadata_pp.make_metadata(info)
+        return PostprocessJob(
+            info={
+                key: info.get(key)
+                for key in ("id", "filepath", "ext", "acodec", "duration")
+            },
+            metadata=metadata,
+        )
+
+    def _make_lyrics_pp(self) -> LyricsPP:
+        lyrics_pp = LyricsPP(
+            proxy=self.proxy,
+            cache=self.lyrics_cache,
+            stats=self.lyrics_stats,
+            prefetcher=self.metadata_prefetcher,
+            proxy_pool=self.proxy_pool,
+            yt=self._lyrics_yt,
+        )
+        # YTMusic is shared, so each build doesn't open new connections
+        self._lyrics_yt = lyrics_pp.yt
+        return lyrics_pp
+
+    def _make_metadata_pp(self) -> MetadataPP:
+        return MetadataPP(
+            thumbnails=self.thumbnail_cache, prefetcher=self.metadata_prefetcher
+        )
+
     def _make_youtube_dl_opts(self):
         ydl_opts = {
             "format": "m4a/bestaudio/best",
-            # See help(yt_dlp.postprocessor) for a list of available Postprocessors
-            "postprocessors": [
-                {  # Extract audio using ffmpeg
-                    "key": "FFmpegExtractAudio",
-                    "preferredcodec": "m4a",
-                },
-            ],
             "outtmpl": "%(artist)s - %(title)s [%(id)s].%(ext)s",
             "paths": {},
             "windowsfilenames": True,